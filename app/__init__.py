@@ -1,7 +1,13 @@
+import os
 from flask import Flask
 
 app = Flask(__name__)
 
-from app import routes
+from app import routes, commands
 from app.errors.handlers import errors
-app.register_blueprint(errors)
\ No newline at end of file
+app.register_blueprint(errors)
+
+# build shared data before a pre-forking server (i.e. gunicorn --preload) starts its workers
+if os.environ.get("SCHEDULER_PRELOAD"):
+    from app.middleware.preload import preload_app
+    preload_app(app)
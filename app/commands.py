@@ -0,0 +1,277 @@
+import json
+import click
+from app import app
+
+
+@app.cli.command("loadtest")
+@click.option("--sessions", "num_sessions", default=20, help="Number of synthesized sessions.")
+@click.option("--concurrency", default=4, help="Number of sessions replayed at once.")
+@click.option("--next-semesters", default=4, help="\"Continue Schedule\" posts per session.")
+@click.option("--seed", default=0, help="Seed for synthesized sessions.")
+@click.option("--url", default=None, help="Replay against a running server instead of the test client.")
+@click.option("--record", default=None, type=click.Path(), help="Save the synthesized sessions to a file.")
+@click.option("--replay", default=None, type=click.Path(exists=True), help="Replay sessions from a file.")
+@click.option("--json", "as_json", is_flag=True, help="Print the report as JSON.")
+def loadtest(num_sessions, concurrency, next_semesters, seed, url, record, replay, as_json):
+    """Replay multi-step /schedule sessions concurrently and report latency."""
+    from app.middleware.load_test import (synthesize_sessions, save_sessions, load_sessions,
+                                          run_load_test, format_report)
+    if replay:
+        sessions = load_sessions(replay)
+    else:
+        sessions = synthesize_sessions(num_sessions, next_semesters, seed)
+    if record:
+        save_sessions(sessions, record)
+
+    report = run_load_test(sessions, concurrency, app=app, base_url=url)
+    if as_json:
+        click.echo(json.dumps(report, indent=2))
+    else:
+        click.echo(format_report(report))
+
+
+@app.cli.command("forecast")
+@click.option("--cohort", default=None, type=click.Path(exists=True), help="Cohort description, a .json or .csv file.")
+@click.option("--students", "num_students", default=1000, help="Number of random students when no cohort is given.")
+@click.option("--seed", default=0, help="Seed for the cohort and the scheduler's choices.")
+@click.option("--workers", default=None, type=int, help="Number of worker processes, defaults to the number of CPUs.")
+@click.option("--max-terms", default=24, help="Terms after which a student is counted as unfinished.")
+@click.option("--engine", default="greedy", type=click.Choice(["greedy", "constraint"]), help="Scheduling engine.")
+@click.option("--output", default=None, type=click.Path(), help="Write the demand matrix to a .csv or .json file.")
+def forecast(cohort, num_students, seed, workers, max_terms, engine, output):
+    """Simulate a cohort of students and forecast seat demand per course and term."""
+    from app.middleware.forecast import (read_cohort, expand_cohort, forecast_demand, write_forecast_csv,
+                                         write_forecast_json, format_forecast)
+    groups = read_cohort(cohort) if cohort else [{"count": num_students}]
+    profiles = expand_cohort(groups, seed)
+    result = forecast_demand(profiles, seed, workers, max_terms, engine)
+    if output:
+        with open(output, "w", newline="") as fd:
+            if output.lower().endswith(".json"):
+                write_forecast_json(result, fd)
+            else:
+                write_forecast_csv(result, fd)
+    click.echo(format_forecast(result))
+
+
+@app.cli.command("allocate")
+@click.option("--capacity", required=True, type=click.Path(exists=True), help="Seats per course and term, a .csv file.")
+@click.option("--cohort", default=None, type=click.Path(exists=True), help="Cohort description, a .json or .csv file.")
+@click.option("--students", "num_students", default=1000, help="Number of random students when no cohort is given.")
+@click.option("--priority", default="graduation", type=click.Choice(["graduation", "lottery"]),
+              help="Who gets a seat first when a course is full.")
+@click.option("--seed", default=0, help="Seed for the cohort, the scheduler's choices, and the lottery.")
+@click.option("--max-terms", default=24, help="Terms after which a student is counted as unfinished.")
+@click.option("--output", default=None, type=click.Path(), help="Write the allocations to a .csv or .json file.")
+def allocate(capacity, cohort, num_students, priority, seed, max_terms, output):
+    """Schedule a cohort term by term within course capacities and report unmet demand."""
+    from app.middleware.forecast import read_cohort, expand_cohort
+    from app.middleware.capacity import read_capacity, allocate_seats, write_allocations_csv, format_allocation_report
+    groups = read_cohort(cohort) if cohort else [{"count": num_students}]
+    profiles = expand_cohort(groups, seed)
+    report = allocate_seats(profiles, read_capacity(capacity), priority, seed, max_terms)
+    if output:
+        with open(output, "w", newline="") as fd:
+            if output.lower().endswith(".json"):
+                json.dump(report, fd, indent=2)
+            else:
+                write_allocations_csv(report, fd)
+    click.echo(format_allocation_report(report))
+
+
+@app.cli.command("membench")
+@click.option("--workers", default=4, help="Workers forked per mode.")
+@click.option("--sessions", "num_sessions", default=4, help="Sessions each worker replays.")
+@click.option("--next-semesters", default=4, help="\"Continue Schedule\" posts per session.")
+@click.option("--seed", default=0, help="Seed for synthesized sessions.")
+@click.option("--json", "as_json", is_flag=True, help="Print the report as JSON.")
+def membench(workers, num_sessions, next_semesters, seed, as_json):
+    """Compare per-worker USS/PSS with and without preloading before fork."""
+    from app.middleware.preload import run_memory_benchmark, format_memory_report
+    report = run_memory_benchmark(app, workers, num_sessions, next_semesters, seed)
+    if as_json:
+        click.echo(json.dumps(report, indent=2))
+    else:
+        click.echo(format_memory_report(report))
+
+
+@app.cli.command("warmup")
+@click.option("--url", default=None, help="Warm a running server instead of this process.")
+@click.option("--requests", "requests_per_path", default=1, help="Requests per path, to reach each worker of a server.")
+def warmup(url, requests_per_path):
+    """Load the scheduler modules, the catalog and the templates ahead of the first request."""
+    from app.middleware.startup import warmup as warmup_app
+    timings = warmup_app(app, url, requests_per_path)
+    for step, milliseconds in timings.items():
+        click.echo(f"{step:<20}{milliseconds:>10.1f} ms")
+
+
+@app.cli.command("importtime")
+@click.option("--runs", default=5, help="Fresh interpreters started per measurement.")
+@click.option("--top", default=10, help="Number of slowest imports listed.")
+@click.option("--json", "as_json", is_flag=True, help="Print the report as JSON.")
+def importtime(runs, top, as_json):
+    """Measure import and cold-start time in fresh interpreters using -X importtime."""
+    from app.middleware.startup import run_import_benchmark, format_import_report
+    report = run_import_benchmark("app", runs, top)
+    if as_json:
+        click.echo(json.dumps(report, indent=2))
+    else:
+        click.echo(format_import_report(report))
+
+
+@app.cli.command("schedbench")
+@click.option("--students", "num_students", default=200, help="Students planned per profile kind.")
+@click.option("--seed", default=0, help="Seed for the profiles and the scheduler's choices.")
+@click.option("--runs", default=3, help="Times each plan is generated; the fastest is reported.")
+@click.option("--json", "as_json", is_flag=True, help="Print the report as JSON.")
+def schedbench(num_students, seed, runs, as_json):
+    """Time full greedy plans of elective-heavy and random student profiles."""
+    from app.middleware.schedule_benchmark import run_schedule_benchmark, format_schedule_benchmark
+    report = run_schedule_benchmark(num_students, seed, runs)
+    if as_json:
+        click.echo(json.dumps(report, indent=2))
+    else:
+        click.echo(format_schedule_benchmark(report))
+
+
+@app.cli.command("golden")
+@click.argument("corpus_file", type=click.Path(dir_okay=False))
+@click.option("--record", is_flag=True, help="Record the corpus, replacing CORPUS_FILE, instead of checking against it.")
+@click.option("--students", "num_students", default=2000, help="Seeded random profiles in a recorded corpus.")
+@click.option("--seed", default=0, help="Seed for the profiles and the scheduler's choices of a recorded corpus.")
+@click.option("--engine", default="greedy", type=click.Choice(["greedy", "constraint"]), help="Scheduling engine of a recorded corpus.")
+@click.option("--workers", default=None, type=int, help="Number of worker processes, defaults to the number of CPUs.")
+@click.option("--runs", default=1, help="Times each plan is generated; the fastest is timed.")
+@click.option("--json", "as_json", is_flag=True, help="Print the comparison as JSON.")
+def golden(corpus_file, record, num_students, seed, engine, workers, runs, as_json):
+    """Check scheduler plans and timings against a golden corpus, or record one if CORPUS_FILE does not exist."""
+    import os
+    from app.middleware.golden_corpus import run_corpus, write_corpus, read_corpus, compare_corpus, format_comparison
+    if record or not os.path.exists(corpus_file):
+        corpus = run_corpus(num_students, seed, workers, runs, scheduler_engine=engine)
+        with open(corpus_file, "w") as fd:
+            write_corpus(corpus, fd)
+        header = corpus["header"]
+        click.echo(f"Recorded {len(corpus['plans'])} plans of {header['students']} students to {corpus_file} "
+                   f"in {header['elapsed_s']:.1f}s")
+        return
+
+    with open(corpus_file) as fd:
+        golden_corpus = read_corpus(fd)
+    header = golden_corpus["header"]
+    current = run_corpus(header["students"], header["seed"], workers, runs, header["max_terms"], header["scheduler_engine"])
+    comparison = compare_corpus(golden_corpus, current)
+    if as_json:
+        click.echo(json.dumps(comparison, indent=2))
+    else:
+        click.echo(format_comparison(comparison))
+    if comparison["diverged"]:
+        raise click.ClickException(f"{comparison['diverged']} plans diverged from {corpus_file}")
+
+
+@app.cli.command("allocbudget")
+@click.option("--update", is_flag=True, help="Record the measured peaks, with headroom, as the new budget.")
+@click.option("--budget-file", default=None, type=click.Path(dir_okay=False), help="Defaults to app/alloc_budget.json.")
+@click.option("--next-semesters", default=2, help="Continue Schedule requests profiled per semester-by-semester plan.")
+@click.option("--json", "as_json", is_flag=True, help="Print the measurements as JSON.")
+def allocbudget(update, budget_file, next_semesters, as_json):
+    """Profile the allocations of the standard student profiles' requests and check them against the budget."""
+    from app.middleware.alloc_profile import BUDGET_FILE, measure_standard_profiles, build_budget, check_budget
+    budget_file = budget_file or BUDGET_FILE
+    measurements = measure_standard_profiles(app, next_semesters)
+    if as_json:
+        click.echo(json.dumps(measurements, indent=2))
+    else:
+        for request, measurement in measurements.items():
+            click.echo(f"{request:<56}{measurement['peak_kb']:>10.1f} KB peak")
+    if update:
+        with open(budget_file, "w") as fd:
+            json.dump(build_budget(measurements), fd, indent=2, sort_keys=True)
+            fd.write("\n")
+        click.echo(f"Recorded the budget of {len(measurements)} requests to {budget_file}")
+        return
+
+    with open(budget_file) as fd:
+        budget = json.load(fd)
+    failures = check_budget(measurements, budget)
+    for failure in failures:
+        click.echo(failure, err=True)
+    if failures:
+        raise click.ClickException(f"{len(failures)} allocation peaks over the budget in {budget_file}")
+    click.echo(f"All {len(measurements)} requests within the budget in {budget_file}")
+
+
+@app.cli.command("plan")
+@click.argument("input_file", type=click.File("r"))
+@click.argument("output_file", type=click.File("w"))
+@click.option("--input-format", default=None, type=click.Choice(["csv", "jsonl"]), help="Defaults to the input's extension.")
+@click.option("--output-format", default=None, type=click.Choice(["csv", "jsonl"]), help="Defaults to the output's extension.")
+@click.option("--seed", default=0, help="Seed for the scheduler's choices.")
+@click.option("--workers", default=None, type=int, help="Number of worker processes, defaults to the number of CPUs.")
+@click.option("--chunk-size", default=200, help="Rows per task sent to a worker.")
+@click.option("--max-terms", default=24, help="Terms after which a student is reported as unfinished.")
+@click.option("--engine", default="greedy", type=click.Choice(["greedy", "constraint"]), help="Scheduling engine.")
+@click.option("--progress-every", default=1000, help="Rows between progress lines.")
+@click.option("--catalog-year", default=None, help="Catalog to plan with, see app/xml/catalogs (default: current).")
+def plan(input_file, output_file, input_format, output_format, seed, workers, chunk_size, max_terms, engine,
+         progress_every, catalog_year):
+    """Plan every student in a CSV or JSONL file, streaming one result per row to OUTPUT_FILE ("-" for stdin/stdout)."""
+    from app.middleware.bulk_planner import file_format, read_rows, result_writer, run_bulk_plan, format_progress
+    from app.middleware.catalog import catalog_years
+    if catalog_year is not None and catalog_year not in catalog_years():
+        raise click.BadParameter(f"choose from {', '.join(catalog_years())}", param_hint="--catalog-year")
+    input_format = file_format(input_file.name, input_format)
+    output_format = file_format(output_file.name, output_format)
+    totals = run_bulk_plan(read_rows(input_file, input_format), result_writer(output_file, output_format),
+                           lambda totals: click.echo(format_progress(totals), err=True), progress_every,
+                           seed=seed, workers=workers, chunk_size=chunk_size, max_terms=max_terms,
+                           scheduler_engine=engine, catalog_year=catalog_year)
+    if totals["failed"]:
+        click.echo(f"{totals['failed']} rows could not be planned, see the reason column", err=True)
+
+
+@app.cli.command("export")
+@click.argument("input_file", type=click.File("r"))
+@click.argument("output_file", type=click.File("w"))
+@click.option("--format", "export_format", default=None, type=click.Choice(["csv", "jsonl", "ics"]),
+              help="Defaults to the output's extension.")
+@click.option("--profiles", is_flag=True, help="INPUT_FILE holds student profiles (.csv or .jsonl) to plan first.")
+@click.option("--seed", default=0, help="Seed for the scheduler's choices when planning profiles.")
+@click.option("--workers", default=None, type=int, help="Number of worker processes when planning profiles.")
+@click.option("--engine", default="greedy", type=click.Choice(["greedy", "constraint"]), help="Scheduling engine.")
+def export(input_file, output_file, export_format, profiles, seed, workers, engine):
+    """Stream plans from a JSONL file (i.e. the output of flask plan) to CSV, JSONL or .ics ("-" for stdin/stdout)."""
+    import os
+    from app.middleware.plan_export import EXPORT_FORMATS, export_plans, read_plans
+    export_format = export_format or os.path.splitext(output_file.name)[1].lstrip(".").lower()
+    if export_format not in EXPORT_FORMATS:
+        raise click.BadParameter(f"use --format for {output_file.name}", param_hint="--format")
+    if profiles:
+        from app.middleware.bulk_planner import file_format, read_rows, plan_rows
+        plans = plan_rows(read_rows(input_file, file_format(input_file.name)), seed, workers, scheduler_engine=engine)
+    else:
+        plans = read_plans(input_file)
+    for chunk in export_plans(plans, export_format):
+        output_file.write(chunk)
+
+
+@app.cli.command("analytics")
+@click.option("--db", "path", default=None, help="Analytics database (default: $SCHEDULER_ANALYTICS_DB).")
+@click.option("--top", default=10, help="Courses listed per ranking.")
+@click.option("--days", default=None, type=int, help="Only the last N days (default: all).")
+@click.option("--json", "as_json", is_flag=True, help="Print the report as JSON.")
+def analytics(path, top, days, as_json):
+    """Report bottleneck courses, semesters to graduation and latency by degree from the analytics log."""
+    from app.middleware.analytics import analytics_report, database_path, format_analytics_report
+    path = path or database_path()
+    if not path:
+        raise click.UsageError("set SCHEDULER_ANALYTICS_DB or pass --db")
+    try:
+        report = analytics_report(path, top, days)
+    except FileNotFoundError as e:
+        raise click.ClickException(str(e))
+    if as_json:
+        click.echo(json.dumps(report, indent=2))
+    else:
+        click.echo(format_analytics_report(report))
@@ -0,0 +1,273 @@
+import contextlib
+import io
+import json
+import linecache
+import os
+import random
+import threading
+import time
+import tracemalloc
+from app.middleware.student_profiles import random_profile, build_first_semester_form
+
+# profiles every request when set, i.e. SCHEDULER_ALLOC_PROFILE=1; a single request is profiled with the header,
+# which is ignored unless SCHEDULER_ALLOC_PROFILE_HEADER=1, so clients cannot turn tracing on in production
+PROFILE_ENV = "SCHEDULER_ALLOC_PROFILE"
+PROFILE_HEADER_ENV = "SCHEDULER_ALLOC_PROFILE_HEADER"
+PROFILE_HEADER = "X-Alloc-Profile"
+# frames kept per allocation; 1 attributes each allocation to the line that made it
+TRACEBACK_FRAMES = 1
+# allocation sites reported per phase
+TOP_SITES = 5
+# allocations the profiler makes itself are left out of the sites
+IGNORED_FILES = (tracemalloc.__file__, linecache.__file__, "<frozen importlib._bootstrap>",
+                 "<frozen importlib._bootstrap_external>")
+
+# the budget file checked by `flask allocbudget`, and the headroom above the measured peaks it records
+BUDGET_FILE = os.path.join(os.path.dirname(os.path.dirname(__file__)), "alloc_budget.json")
+BUDGET_HEADROOM = 1.25
+# the standard profiles: name -> the fields set on a seeded `random_profile`
+STANDARD_PROFILES = {
+    "computer-science": {"degree_choice": "BSComputerScience", "certificates": [], "courses_taken": []},
+    "data-science-two-certificates": {"degree_choice": "BSDataScience", "courses_taken": [],
+                                      "certificates": ["Data Science,DATACERTReq", "Artificial Intelligence,AICERTReq"]},
+    "cybersecurity-summer": {"degree_choice": "BSCyberSecurity", "certificates": ["Cybersecurity,CYBERCERTReq"],
+                             "include_summer": True, "courses_taken": []},
+    "computing-technology-transfer": {"degree_choice": "BSComputingTechnology", "certificates": [],
+                                      "courses_taken": ["ENGLISH 1100", "MATH 1030", "MATH 1035", "CMP SCI 1250"],
+                                      "total_credits": 12}
+}
+
+# the profile and phase timings of the request being handled by this thread, if any
+_local = threading.local()
+# tracemalloc traces the whole process, so it is started by the first profiled request and only stopped
+# when the last one running finishes; a request stopping it under another would break that one's snapshots
+_tracing_lock = threading.Lock()
+_tracing = {"profiles": 0, "started": False}
+
+
+def is_requested(headers) -> bool:
+    # profiling is on for every request with the environment variable, or for one request with the header
+    # when the header is allowed
+    if os.environ.get(PROFILE_ENV):
+        return True
+    return bool(os.environ.get(PROFILE_HEADER_ENV)) and headers.get(PROFILE_HEADER, "") not in ("", "0")
+
+
+def start_profile() -> None:
+    """
+    starts recording allocations for the current request.
+
+    tracemalloc traces the whole process, so with several threads serving requests at once, each
+    profile also counts the others' allocations; profile with a single-threaded worker.
+    """
+    with _tracing_lock:
+        if _tracing["profiles"] == 0 and not tracemalloc.is_tracing():
+            tracemalloc.start(TRACEBACK_FRAMES)
+            _tracing["started"] = True
+        _tracing["profiles"] += 1
+    tracemalloc.reset_peak()
+    _local.profile = {
+        "baseline": tracemalloc.get_traced_memory()[0],
+        "peak": 0,
+        "phases": {}
+    }
+
+
+def allocation_sites(before, after) -> list:
+    filters = [tracemalloc.Filter(False, filename) for filename in IGNORED_FILES]
+    differences = after.filter_traces(filters).compare_to(before.filter_traces(filters), "lineno")
+    return [{
+        "site": f"{difference.traceback[0].filename}:{difference.traceback[0].lineno}",
+        "kb": round(difference.size_diff / 1024, 1),
+        "blocks": difference.count_diff
+    } for difference in differences[:TOP_SITES] if difference.size_diff > 0]
+
+
+def start_timings() -> None:
+    # times the phases of the current request, whether or not its allocations are profiled
+    _local.timings = {}
+
+
+def finish_timings() -> dict:
+    # phase name -> milliseconds for the current request, or None when it was not timed
+    timings = getattr(_local, "timings", None)
+    _local.timings = None
+    return timings
+
+
+@contextlib.contextmanager
+def phase(name: str):
+    """
+    records the peak and the top allocation sites of one phase of a request, when it is profiled, and
+    its duration, when it is timed.
+
+    The peak is the most memory the phase held above what was allocated when it started; the sites are
+    the lines whose allocations grew most over the phase. Without a profile or timings this does nothing.
+    """
+    profile = getattr(_local, "profile", None)
+    timings = getattr(_local, "timings", None)
+    if profile is None:
+        if timings is None:
+            yield
+            return
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            timings[name] = (time.perf_counter() - start_time) * 1000
+        return
+    # snapshots are traced too: the peaks are read before taking one, and the one held over the phase is left out
+    previous_current, previous_peak = tracemalloc.get_traced_memory()
+    profile["peak"] = max(profile["peak"], previous_peak - profile["baseline"])
+    before = tracemalloc.take_snapshot()
+    start_current = tracemalloc.get_traced_memory()[0]
+    snapshot_size = start_current - previous_current
+    tracemalloc.reset_peak()
+    start_time = time.perf_counter()
+    try:
+        yield
+    finally:
+        if timings is not None:
+            timings[name] = (time.perf_counter() - start_time) * 1000
+        current, peak = tracemalloc.get_traced_memory()
+        profile["peak"] = max(profile["peak"], peak - snapshot_size - profile["baseline"])
+        profile["phases"][name] = {
+            "peak_kb": round((peak - start_current) / 1024, 1),
+            "retained_kb": round((current - start_current) / 1024, 1),
+            "sites": allocation_sites(before, tracemalloc.take_snapshot())
+        }
+        del before
+        tracemalloc.reset_peak()
+
+
+def finish_profile() -> dict:
+    """
+    stops recording the current request's allocations.
+
+    Returns
+    ----------
+    dict
+                peak_kb:    the most memory held above what was allocated when the request started
+                phases:     phase name -> peak_kb, retained_kb and sites, see `phase`
+                or None when the request was not profiled
+    """
+    profile = getattr(_local, "profile", None)
+    if profile is None:
+        return None
+    _local.profile = None
+    peak = max(profile["peak"], tracemalloc.get_traced_memory()[1] - profile["baseline"])
+    with _tracing_lock:
+        _tracing["profiles"] -= 1
+        # tracing started outside the app, i.e. with PYTHONTRACEMALLOC, is left on
+        if _tracing["profiles"] == 0 and _tracing["started"]:
+            tracemalloc.stop()
+            _tracing["started"] = False
+    return {"peak_kb": round(peak / 1024, 1), "phases": profile["phases"]}
+
+
+def profile_header(report: dict) -> str:
+    # the peaks only, as compact JSON; the sites are printed to the console
+    return json.dumps({"peak_kb": report["peak_kb"],
+                       "phases": {name: result["peak_kb"] for name, result in report["phases"].items()}},
+                      separators=(",", ":"))
+
+
+def format_profile(report: dict, title="") -> str:
+    out = io.StringIO()
+    out.write(f"{'Allocations ' + title + ':':<40}{report['peak_kb']:>10.1f} KB peak\n")
+    for name, result in report["phases"].items():
+        out.write(f"\t{name:<32}{result['peak_kb']:>10.1f} KB peak{result['retained_kb']:>10.1f} KB retained\n")
+        for site in result["sites"]:
+            out.write(f"\t\t{site['site']:<60}{site['kb']:>10.1f} KB{site['blocks']:>8} blocks\n")
+    return out.getvalue()
+
+
+def standard_forms(required_courses_dict: str) -> dict:
+    # name -> (first-semester form for "Generate Full Schedule", form for "Start Schedule by Semester")
+    forms = {}
+    for name, fields in STANDARD_PROFILES.items():
+        profile = random_profile(random.Random(name), 0)
+        profile.update(fields)
+        forms[name] = (build_first_semester_form(profile, required_courses_dict, True),
+                       build_first_semester_form(profile, required_courses_dict, False))
+    return forms
+
+
+@contextlib.contextmanager
+def header_allowed():
+    # honours `PROFILE_HEADER` while measuring, whatever the environment says
+    allowed = os.environ.get(PROFILE_HEADER_ENV)
+    os.environ[PROFILE_HEADER_ENV] = "1"
+    try:
+        yield
+    finally:
+        if allowed is None:
+            del os.environ[PROFILE_HEADER_ENV]
+        else:
+            os.environ[PROFILE_HEADER_ENV] = allowed
+
+
+def measure_standard_profiles(app, next_semesters=2) -> dict:
+    """
+    profiles the requests a student makes with each standard profile: a full schedule, and a schedule
+    started by semester and continued `next_semesters` times.
+
+    Returns
+    ----------
+    dict
+                "profile/request" -> {"peak_kb": ..., "phases": {phase: peak_kb}}, with the request being
+                "full", "first_semester" or "next_semester_N"
+    """
+    from app.middleware.catalog import get_catalog
+    from app.middleware.load_test import parse_form_state
+    client = app.test_client()
+    headers = {PROFILE_HEADER: "1"}
+    measurements = {}
+    with header_allowed(), contextlib.redirect_stdout(io.StringIO()):
+        forms = standard_forms(get_catalog()["courses_json"])
+        # the first requests build the shared requirement tables, which are not part of any one request
+        for full_form, semester_form in forms.values():
+            client.post("/schedule", data=full_form)
+            client.post("/schedule", data=semester_form)
+        for name, (full_form, semester_form) in forms.items():
+            requests = [("full", full_form), ("first_semester", semester_form)]
+            for request_name, form in requests:
+                random.seed(name)
+                response = client.post("/schedule", data=form, headers=headers)
+                measurements[f"{name}/{request_name}"] = json.loads(response.headers[PROFILE_HEADER])
+            for semester in range(1, next_semesters + 1):
+                form = parse_form_state(response.data)
+                form["single_semester"] = "Continue Schedule"
+                response = client.post("/schedule", data=form, headers=headers)
+                measurements[f"{name}/next_semester_{semester}"] = json.loads(response.headers[PROFILE_HEADER])
+    return measurements
+
+
+def build_budget(measurements: dict) -> dict:
+    # the measured peaks with `BUDGET_HEADROOM`, rounded up to whole KB
+    return {request: {"peak_kb": -(-measurement["peak_kb"] * BUDGET_HEADROOM // 1),
+                      "phases": {name: -(-peak * BUDGET_HEADROOM // 1) for name, peak in measurement["phases"].items()}}
+            for request, measurement in measurements.items()}
+
+
+def check_budget(measurements: dict, budget: dict) -> list:
+    """
+    compares measured peaks with the stored budget.
+
+    Returns
+    ----------
+    list
+                one message per request or phase over its budget, or missing from the budget
+    """
+    failures = []
+    for request, measurement in measurements.items():
+        allowed = budget.get(request)
+        if allowed is None:
+            failures.append(f"{request}: not in the budget, record it with --update")
+            continue
+        if measurement["peak_kb"] > allowed["peak_kb"]:
+            failures.append(f"{request}: {measurement['peak_kb']:.1f} KB peak, budget {allowed['peak_kb']:.0f} KB")
+        for name, peak in measurement["phases"].items():
+            if name in allowed["phases"] and peak > allowed["phases"][name]:
+                failures.append(f"{request} {name}: {peak:.1f} KB peak, budget {allowed['phases'][name]:.0f} KB")
+    return failures
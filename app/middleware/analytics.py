@@ -0,0 +1,389 @@
+import atexit
+import io
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+
+# generations are logged to this SQLite file when set, i.e. SCHEDULER_ANALYTICS_DB=instance/analytics.db
+ANALYTICS_ENV = "SCHEDULER_ANALYTICS_DB"
+# the admin report is only served when this is set, to requests sending it in the header
+ADMIN_TOKEN_ENV = "SCHEDULER_ADMIN_TOKEN"
+ADMIN_TOKEN_HEADER = "X-Admin-Token"
+# events written per transaction, and the longest an event waits for its batch to fill
+BATCH_SIZE = 100
+FLUSH_INTERVAL_SECONDS = 2
+# events waiting to be written; past this they are dropped rather than held up or kept in memory
+MAX_PENDING_EVENTS = 10000
+# how long a write waits for another worker process holding the database's write lock
+BUSY_TIMEOUT_MS = 5000
+# recorded times are truncated to the hour, so an event cannot be matched to a request in the server logs
+TIME_RESOLUTION_SECONDS = 3600
+
+# the log is append-only: the triggers reject updates and deletes
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS generations (
+    id INTEGER PRIMARY KEY,
+    recorded_at INTEGER NOT NULL,
+    degree TEXT NOT NULL,
+    certificates TEXT NOT NULL,
+    catalog_year TEXT NOT NULL,
+    engine TEXT NOT NULL,
+    full_schedule INTEGER NOT NULL,
+    start_term TEXT NOT NULL,
+    include_summer INTEGER NOT NULL,
+    semester_credits INTEGER NOT NULL,
+    transfer_courses INTEGER NOT NULL,
+    semesters INTEGER NOT NULL,
+    is_graduated INTEGER NOT NULL,
+    unschedulable INTEGER NOT NULL,
+    gen_ed_credits_needed INTEGER NOT NULL,
+    cert_electives_needed INTEGER NOT NULL,
+    upper_level_courses_needed INTEGER NOT NULL,
+    phases TEXT NOT NULL,
+    latency_ms REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS generation_courses (
+    generation_id INTEGER NOT NULL REFERENCES generations (id),
+    role TEXT NOT NULL,
+    course TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS generation_courses_by_role ON generation_courses (role, course);
+CREATE TRIGGER IF NOT EXISTS generations_append_only_update BEFORE UPDATE ON generations
+    BEGIN SELECT RAISE(ABORT, 'the analytics log is append-only'); END;
+CREATE TRIGGER IF NOT EXISTS generations_append_only_delete BEFORE DELETE ON generations
+    BEGIN SELECT RAISE(ABORT, 'the analytics log is append-only'); END;
+CREATE TRIGGER IF NOT EXISTS generation_courses_append_only_update BEFORE UPDATE ON generation_courses
+    BEGIN SELECT RAISE(ABORT, 'the analytics log is append-only'); END;
+CREATE TRIGGER IF NOT EXISTS generation_courses_append_only_delete BEFORE DELETE ON generation_courses
+    BEGIN SELECT RAISE(ABORT, 'the analytics log is append-only'); END;
+"""
+
+# the fields of `course_parsing.build_render_info` an event keeps; all are strings, numbers or None, so
+# the event stays as it was when the request finished while the writer catches up
+EVENT_FIELDS = (
+    "degree_choice",
+    "certificate_choices",
+    "catalog_year",
+    "scheduler_engine",
+    "full_schedule_generation",
+    "first_semester",
+    "include_summer",
+    "saved_minimum_credits_selection",
+    "semester_number",
+    "is_graduated",
+    "gen_ed_credits_still_needed",
+    "cert_elective_courses_still_needed",
+    "min_3000_course",
+    "courses_taken",
+    "course_schedule",
+    "required_courses_tuple"
+)
+
+# events of this process waiting for the writer; the writer is started by the first event a process records,
+# so each worker of a pre-forking server has its own
+_pending = queue.Queue(MAX_PENDING_EVENTS)
+_writer = None
+_writer_pid = None
+_lock = threading.Lock()
+_dropped = 0
+
+
+def database_path() -> str:
+    return os.environ.get(ANALYTICS_ENV, "")
+
+
+def is_enabled() -> bool:
+    return bool(database_path())
+
+
+def connect(path: str) -> sqlite3.Connection:
+    """
+    opens the analytics database for writing, creating it if needed.
+
+    WAL mode lets the admin report read while the workers write, and NORMAL synchronous commits only
+    wait for the log to be written, not for it to be copied into the database.
+
+    Parameters
+    ----------
+    path:       str
+                the SQLite file, see `ANALYTICS_ENV`
+    Returns
+    ----------
+    sqlite3.Connection
+    """
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    connection = sqlite3.connect(path, timeout=BUSY_TIMEOUT_MS / 1000, check_same_thread=False)
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.execute("PRAGMA synchronous=NORMAL")
+    connection.executescript(SCHEMA)
+    return connection
+
+
+def record_generation(render_info: dict, phases: dict, latency_ms: float) -> None:
+    """
+    queues one schedule generation to be logged, without waiting for the database.
+
+    Parameters
+    ----------
+    render_info:    dict
+                    the generated semester or schedule, see `course_parsing.build_render_info`
+    phases:         dict
+                    phase name -> milliseconds, see `alloc_profile.phase`
+    latency_ms:     float
+                    the time taken by the whole request
+    """
+    global _dropped
+    event = {field: render_info.get(field) for field in EVENT_FIELDS}
+    unschedulable = render_info.get("unschedulable")
+    event["blocking_courses"] = [course["course"] for course in unschedulable["blocking_courses"]] if unschedulable else None
+    event["phases"] = dict(phases or {})
+    event["latency_ms"] = latency_ms
+    event["recorded_at"] = time.time()
+    start_writer()
+    try:
+        _pending.put_nowait(event)
+    except queue.Full:
+        _dropped += 1
+        if _dropped % 1000 == 1:
+            print(f"Analytics: {_dropped} events dropped, the writer is behind")
+
+
+def start_writer() -> None:
+    global _pending, _writer, _writer_pid
+    with _lock:
+        if _writer_pid == os.getpid() and _writer.is_alive():
+            return
+        if _writer_pid != os.getpid():
+            # a forked worker inherits the queue but not the thread draining it
+            _pending = queue.Queue(MAX_PENDING_EVENTS)
+            atexit.register(flush)
+        _writer = threading.Thread(target=write_events, args=(database_path(), _pending), name="analytics-writer",
+                                   daemon=True)
+        _writer_pid = os.getpid()
+        _writer.start()
+
+
+def write_events(path: str, pending: queue.Queue) -> None:
+    # runs in the writer thread: waits for an event, then writes it with whatever else arrives in the meantime
+    try:
+        connection = connect(path)
+    except (OSError, sqlite3.Error) as error:
+        # the next event starts another writer, so a fixed path is picked up without a restart
+        print(f"Analytics: cannot open {path}: {type(error).__name__}: {error}")
+        return
+    while True:
+        batch = [pending.get()]
+        deadline = time.monotonic() + FLUSH_INTERVAL_SECONDS
+        while len(batch) < BATCH_SIZE:
+            try:
+                batch.append(pending.get(timeout=max(deadline - time.monotonic(), 0)))
+            except queue.Empty:
+                break
+        try:
+            write_batch(connection, batch)
+        except Exception as error:
+            print(f"Analytics: {len(batch)} events not written: {type(error).__name__}: {error}")
+        finally:
+            for _ in batch:
+                pending.task_done()
+
+
+def write_batch(connection: sqlite3.Connection, events: list) -> None:
+    # one transaction per batch; the anonymizing and the bottleneck search happen here, off the request,
+    # and before the transaction, so other workers are not kept waiting for the write lock
+    rows = [event_row(event) for event in events]
+    with connection:
+        for row, courses in rows:
+            generation_id = connection.execute(
+                f"INSERT INTO generations ({', '.join(row)}) VALUES ({', '.join('?' * len(row))})",
+                tuple(row.values())).lastrowid
+            connection.executemany("INSERT INTO generation_courses (generation_id, role, course) VALUES (?, ?, ?)",
+                                   [(generation_id, role, course) for role, course in courses])
+
+
+def event_row(event: dict) -> tuple:
+    """
+    converts a queued event into its anonymized row and course rows.
+
+    Only the choices shared by many students are kept: no name, and the number of courses transferred in
+    rather than which ones. The bottleneck of a finished plan is the prerequisite chain that set its
+    earliest graduation, from the courses taken before the plan started, see `critical_path.earliest_graduation`.
+
+    Returns
+    ----------
+    tuple
+                the `generations` row as a dict, and a list of (role, course) where role is "bottleneck",
+                "unmet" (still needed when the plan was stopped) or "blocking" (why it was stopped)
+    """
+    courses_taken = json.loads(event["courses_taken"] or "[]")
+    course_schedule = json.loads(event["course_schedule"] or "[]")
+    required = list(dict.fromkeys(json.loads(event["required_courses_tuple"] or "[]")))
+    scheduled = {course["course"] for semester in course_schedule for course in semester["schedule"]}
+    taken_before = [course for course in courses_taken if course not in scheduled]
+    row = {
+        "recorded_at": int(event["recorded_at"] // TIME_RESOLUTION_SECONDS * TIME_RESOLUTION_SECONDS),
+        "degree": event["degree_choice"] or "",
+        "certificates": json.dumps(sorted(name for name, _ in json.loads(event["certificate_choices"] or "[]"))),
+        "catalog_year": event["catalog_year"] or "",
+        "engine": event["scheduler_engine"] or "greedy",
+        "full_schedule": int(bool(event["full_schedule_generation"])),
+        "start_term": event["first_semester"] or "",
+        "include_summer": int(bool(event["include_summer"])),
+        "semester_credits": int(event["saved_minimum_credits_selection"] or 0),
+        "transfer_courses": len(taken_before),
+        "semesters": int(event["semester_number"] or 0),
+        "is_graduated": int(bool(event["is_graduated"])),
+        "unschedulable": int(event["blocking_courses"] is not None),
+        "gen_ed_credits_needed": int(event["gen_ed_credits_still_needed"] or 0),
+        "cert_electives_needed": int(event["cert_elective_courses_still_needed"] or 0),
+        "upper_level_courses_needed": int(event["min_3000_course"] or 0),
+        "phases": json.dumps({name: round(ms, 2) for name, ms in event["phases"].items()}, sort_keys=True),
+        "latency_ms": round(event["latency_ms"], 2)
+    }
+
+    courses = []
+    if event["is_graduated"]:
+        # imported here so that recording an event does not load the scheduler
+        from app.middleware.catalog import get_catalog
+        from app.middleware.critical_path import earliest_graduation
+        try:
+            catalog = get_catalog(event["catalog_year"])
+        except ValueError:
+            # the catalog year was removed since the plan was made
+            catalog = None
+        if catalog is not None:
+            bound = earliest_graduation(catalog, required, taken_before, row["start_term"], bool(row["include_summer"]))
+            courses += [("bottleneck", step["course"]) for step in bound["bottleneck"]]
+    if event["blocking_courses"] is not None:
+        courses += [("unmet", course) for course in required if course not in courses_taken]
+        courses += [("blocking", course) for course in event["blocking_courses"]]
+    return row, courses
+
+
+def flush(timeout=FLUSH_INTERVAL_SECONDS * 2) -> bool:
+    """
+    waits for the queued events to be written, i.e. before the process exits.
+
+    Returns
+    ----------
+    bool
+                False if events were still waiting after `timeout` seconds
+    """
+    if _writer_pid != os.getpid():
+        return True
+    deadline = time.monotonic() + timeout
+    with _pending.all_tasks_done:
+        while _pending.unfinished_tasks:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            _pending.all_tasks_done.wait(remaining)
+    return True
+
+
+def analytics_report(path: str, top=10, days=None) -> dict:
+    """
+    aggregates the analytics log.
+
+    Parameters
+    ----------
+    path:       str
+                the SQLite file, see `ANALYTICS_ENV`
+    top:        int
+                courses listed per ranking
+    days:       int
+                only the generations of the last `days` days, or all of them if None
+    Returns
+    ----------
+    dict
+                generations:                the number logged
+                plans:                      the number of finished plans (graduated)
+                unschedulable:              the number of plans stopped before graduating
+                bottleneck_courses:         [{"course", "plans", "share"}], the courses most often on the chain
+                                            that set a finished plan's graduation
+                blocking_courses:           [{"course", "plans"}], the courses most often blocking a stopped plan
+                semesters_to_graduation:    semesters -> finished plans
+                latency_by_degree:          degree -> "full" or "semester" -> generations, p50_ms, p95_ms and
+                                            phase -> p95 ms
+    """
+    # imported here since it is only needed for the percentiles
+    from app.middleware.load_test import percentile
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"No analytics recorded at {path}")
+    since = 0 if days is None else time.time() - days * 86400
+    connection = sqlite3.connect(f"file:{path}?mode=ro", uri=True, timeout=BUSY_TIMEOUT_MS / 1000)
+    try:
+        generations, plans, unschedulable = connection.execute(
+            "SELECT COUNT(*), COALESCE(SUM(is_graduated), 0), COALESCE(SUM(unschedulable), 0) "
+            "FROM generations WHERE recorded_at >= ?", (since,)).fetchone()
+
+        def ranking(role):
+            return connection.execute(
+                "SELECT course, COUNT(DISTINCT generation_id) AS plans FROM generation_courses "
+                "JOIN generations ON generations.id = generation_id "
+                "WHERE role = ? AND recorded_at >= ? GROUP BY course ORDER BY plans DESC, course LIMIT ?",
+                (role, since, top)).fetchall()
+
+        bottlenecks = ranking("bottleneck")
+        blocking = ranking("blocking")
+        semesters = connection.execute(
+            "SELECT semesters, COUNT(*) FROM generations WHERE is_graduated AND recorded_at >= ? "
+            "GROUP BY semesters ORDER BY semesters", (since,)).fetchall()
+
+        latencies = {}
+        for degree, full_schedule, latency_ms, phases in connection.execute(
+                "SELECT degree, full_schedule, latency_ms, phases FROM generations WHERE recorded_at >= ?", (since,)):
+            group = latencies.setdefault(degree, {}).setdefault("full" if full_schedule else "semester", [])
+            group.append((latency_ms, json.loads(phases)))
+    finally:
+        connection.close()
+
+    latency_by_degree = {}
+    for degree, modes in sorted(latencies.items()):
+        for mode, samples in sorted(modes.items()):
+            ordered = sorted(latency_ms for latency_ms, _ in samples)
+            phase_names = sorted({name for _, phases in samples for name in phases})
+            latency_by_degree.setdefault(degree, {})[mode] = {
+                "generations": len(samples),
+                "p50_ms": percentile(ordered, 50),
+                "p95_ms": percentile(ordered, 95),
+                "phases_p95_ms": {name: percentile(sorted(phases[name] for _, phases in samples if name in phases), 95)
+                                  for name in phase_names}
+            }
+
+    return {
+        "generations": generations,
+        "plans": plans,
+        "unschedulable": unschedulable,
+        "bottleneck_courses": [{"course": course, "plans": count, "share": count / plans if plans else 0.0}
+                               for course, count in bottlenecks],
+        "blocking_courses": [{"course": course, "plans": count} for course, count in blocking],
+        "semesters_to_graduation": {semester_count: count for semester_count, count in semesters},
+        "latency_by_degree": latency_by_degree
+    }
+
+
+def format_analytics_report(report: dict) -> str:
+    out = io.StringIO()
+    out.write(f"{'Generations:':<20}{report['generations']}\n")
+    out.write(f"{'Finished plans:':<20}{report['plans']} ({report['unschedulable']} unschedulable)\n")
+    out.write("Bottleneck courses:\n")
+    for course in report["bottleneck_courses"]:
+        out.write(f"\t{course['course']:<20}{course['plans']:>8} plans{course['share']:>8.0%}\n")
+    if report["blocking_courses"]:
+        out.write("Blocking courses:\n")
+        for course in report["blocking_courses"]:
+            out.write(f"\t{course['course']:<20}{course['plans']:>8} plans\n")
+    out.write("Semesters to graduate:\n")
+    for semester_count, plans in report["semesters_to_graduation"].items():
+        out.write(f"\t{semester_count:>3} semesters{plans:>8}\n")
+    out.write(f"{'Degree':<28}{'Mode':<10}{'Count':>7}{'p50 ms':>10}{'p95 ms':>10}\n")
+    for degree, modes in report["latency_by_degree"].items():
+        for mode, stats in modes.items():
+            out.write(f"{degree:<28}{mode:<10}{stats['generations']:>7}{stats['p50_ms']:>10.1f}{stats['p95_ms']:>10.1f}\n")
+    return out.getvalue()
@@ -0,0 +1,272 @@
+import contextlib
+import csv
+import io
+import itertools
+import json
+import os
+import random
+import time
+from collections import deque
+from app.middleware import course_parsing
+from app.middleware.catalog import get_catalog
+from app.middleware.forecast import DEFAULT_MAX_TERMS
+from app.middleware.student_profiles import DEGREES, build_first_semester_form
+from app.middleware.what_if import read_profile
+
+# rows planned per task sent to a worker process
+DEFAULT_CHUNK_SIZE = 200
+# chunks queued per worker; bounds how many rows are held in memory at once
+CHUNKS_IN_FLIGHT = 2
+FILE_FORMATS = ("csv", "jsonl")
+# one row per student in CSV output; the schedule is flattened into a single column
+CSV_FIELDS = ["row", "user_name", "degree_choice", "status", "reason", "semesters", "graduation_term",
+              "total_credits", "schedule"]
+
+# set in each worker process by `init_worker`
+worker_settings = {}
+
+
+def file_format(path: str, file_format=None) -> str:
+    # the format given, or the one the file extension implies
+    file_format = file_format or os.path.splitext(path)[1].lstrip(".").lower()
+    if not file_format and path in ("<stdin>", "<stdout>"):
+        file_format = "jsonl"
+    if file_format == "json":
+        file_format = "jsonl"
+    if file_format not in FILE_FORMATS:
+        raise ValueError(f"Unknown file format: {file_format or path}, expected one of {', '.join(FILE_FORMATS)}")
+    return file_format
+
+
+def read_rows(fd, file_format: str):
+    """
+    streams student rows from a CSV or JSONL file, one at a time.
+
+    CSV rows have a column per profile field, with ";" between the items of list fields, as for
+    `forecast.read_cohort`. JSONL has one JSON object per line. Blank lines are skipped.
+
+    Parameters
+    ----------
+    fd:             file
+                    the open file
+    file_format:    str
+                    "csv" or "jsonl"
+    Yields
+    ----------
+    tuple
+                    the row number (the line number for JSONL), the row's fields, and the reason the
+                    row could not be read, or None
+    """
+    if file_format == "csv":
+        reader = csv.DictReader(fd)
+        for number, row in enumerate(reader, 1):
+            yield number, {field: value for field, value in row.items() if field is not None and value != ""}, None
+        return
+    for number, line in enumerate(fd, 1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as error:
+            yield number, {}, f"Invalid JSON: {error}"
+            continue
+        if not isinstance(row, dict):
+            yield number, {}, "Invalid JSON: expected an object"
+            continue
+        yield number, row, None
+
+
+def init_worker(settings: dict) -> None:
+    # runs once per worker process, so the catalog is compiled once per process instead of once per student
+    worker_settings.update(settings)
+    with contextlib.redirect_stdout(io.StringIO()):
+        worker_settings["required_courses_dict"] = get_catalog(settings.get("catalog_year"))["courses_json"]
+
+
+def plan_row(number: int, row: dict, error=None, settings=None) -> dict:
+    """
+    generates the full plan for one row, or the reason it could not be planned.
+
+    The scheduler's random choices are seeded from the run's seed and the row number, so a row's plan
+    does not depend on how rows are split between processes. `settings` defaults to the worker's, see
+    `init_worker`.
+
+    Returns
+    ----------
+    dict
+                status is "planned", "unfinished" (not graduated within the term limit) or "failed"
+    """
+    settings = settings or worker_settings
+    result = {
+        "row": number,
+        "user_name": row.get("user_name"),
+        "degree_choice": row.get("degree_choice"),
+        "status": "failed",
+        "reason": error,
+        "semesters": 0,
+        "graduation_term": None,
+        "total_credits": None,
+        "schedule": []
+    }
+    if error:
+        return result
+    if not row.get("degree_choice"):
+        result["reason"] = "Missing field: degree_choice"
+        return result
+    try:
+        profile = read_profile(row)
+        if profile["degree_choice"] not in DEGREES:
+            raise ValueError(f"Unknown degree: {profile['degree_choice']}")
+        if profile["current_semester"] not in course_parsing.OFFERING_TERMS:
+            raise ValueError(f"Unknown semester: {profile['current_semester']}")
+        result["user_name"] = profile["user_name"]
+        form = build_first_semester_form(profile, settings["required_courses_dict"], True)
+        form.add("scheduler_engine", settings["scheduler_engine"])
+        if settings.get("catalog_year"):
+            form.add("catalog_year", settings["catalog_year"])
+        # a generator per row, so planning in a web request leaves the process-wide random state alone
+        state = course_parsing.read_scheduler_state(form, rng=random.Random(f"{settings['seed']}:{number}"))
+        if not state["is_graduated"]:
+            for semester_info in course_parsing.semester_generator(state):
+                result["schedule"].append({
+                    "term": f"{semester_info['semester']} {semester_info['year']}",
+                    "credits": semester_info["credits"],
+                    "courses": [course["course"] for course in semester_info["schedule"]]
+                })
+                state["course_schedule"].clear()
+                if len(result["schedule"]) >= settings["max_terms"]:
+                    break
+    except Exception as error:
+        result["reason"] = f"{type(error).__name__}: {error}"
+        return result
+
+    result["semesters"] = len(result["schedule"])
+    result["total_credits"] = state["total_credits_accumulated"]
+    if state["is_graduated"]:
+        result["status"] = "planned"
+        result["graduation_term"] = result["schedule"][-1]["term"] if result["schedule"] else None
+    else:
+        result["status"] = "unfinished"
+        result["reason"] = course_parsing.unschedulable_result(state, f"not graduated after {settings['max_terms']} terms")["reason"]
+    return result
+
+
+def plan_chunk(chunk: list) -> list:
+    with open(os.devnull, "w") as output, contextlib.redirect_stdout(output):
+        return [plan_row(number, row, error) for number, row, error in chunk]
+
+
+def plan_rows(rows, seed=0, workers=None, chunk_size=DEFAULT_CHUNK_SIZE, max_terms=DEFAULT_MAX_TERMS,
+              scheduler_engine="greedy", catalog_year=None):
+    """
+    plans a stream of rows in parallel chunks, yielding the results in input order.
+
+    Only `CHUNKS_IN_FLIGHT` chunks per worker are read ahead of the results written, so memory stays
+    flat however long the input is.
+
+    Parameters
+    ----------
+    rows:               iterable
+                        rows as `read_rows` yields them
+    seed:               int
+                        seed for the scheduler's random choices
+    workers:            int
+                        number of worker processes, defaults to the number of CPUs; 1 plans in this process
+    chunk_size:         int
+                        rows per task sent to a worker
+    max_terms:          int
+                        terms after which a student who has not graduated is reported as unfinished
+    scheduler_engine:   str
+                        see `course_parsing.SCHEDULER_ENGINES`
+    catalog_year:       str
+                        the catalog every row is planned with, see `catalog.catalog_years`
+    Yields
+    ----------
+    dict
+                        one result per row, see `plan_row`
+    """
+    if scheduler_engine not in course_parsing.SCHEDULER_ENGINES:
+        raise ValueError(f"Unknown scheduler engine: {scheduler_engine}")
+    settings = {"seed": seed, "max_terms": max_terms, "scheduler_engine": scheduler_engine, "catalog_year": catalog_year}
+    # build the catalog before any worker is started, so forked workers share it
+    init_worker(settings)
+
+    rows = iter(rows)
+    chunks = iter(lambda: list(itertools.islice(rows, chunk_size)), [])
+    workers = workers or os.cpu_count() or 1
+    if workers <= 1:
+        for chunk in chunks:
+            yield from plan_chunk(chunk)
+        return
+
+    from concurrent.futures import ProcessPoolExecutor
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(settings,)) as pool:
+        pending = deque(pool.submit(plan_chunk, chunk)
+                        for chunk in itertools.islice(chunks, workers * CHUNKS_IN_FLIGHT))
+        while pending:
+            results = pending.popleft().result()
+            for chunk in itertools.islice(chunks, 1):
+                pending.append(pool.submit(plan_chunk, chunk))
+            yield from results
+
+
+def format_schedule(schedule: list) -> str:
+    # i.e. "Fall 2026: CMP SCI 1250; MATH 1320 | Spring 2027: ..."
+    return " | ".join(f"{semester['term']}: {'; '.join(semester['courses'])}" for semester in schedule)
+
+
+def result_writer(fd, file_format: str):
+    """
+    creates a function that writes one result to `fd` as a JSONL line or CSV row.
+    """
+    if file_format == "jsonl":
+        def write(result):
+            fd.write(json.dumps(result) + "\n")
+        return write
+    writer = csv.DictWriter(fd, fieldnames=CSV_FIELDS)
+    writer.writeheader()
+
+    def write(result):
+        writer.writerow(dict(result, schedule=format_schedule(result["schedule"])))
+    return write
+
+
+def run_bulk_plan(rows, write, progress=None, progress_every=1000, **options) -> dict:
+    """
+    plans every row, writing each result as soon as its chunk is done.
+
+    Parameters
+    ----------
+    rows:           iterable
+                    rows as `read_rows` yields them
+    write:          function
+                    called with each result, see `result_writer`
+    progress:       function
+                    called with the running totals every `progress_every` rows and once at the end
+    options:        dict
+                    passed to `plan_rows`
+    Returns
+    ----------
+    dict
+                    rows, planned, unfinished and failed counts, elapsed_s and rows_per_s
+    """
+    start_time = time.perf_counter()
+    totals = {"rows": 0, "planned": 0, "unfinished": 0, "failed": 0}
+    for result in plan_rows(rows, **options):
+        write(result)
+        totals["rows"] += 1
+        totals[result["status"]] += 1
+        if progress and totals["rows"] % progress_every == 0:
+            progress(dict(totals, elapsed_s=time.perf_counter() - start_time))
+    elapsed = time.perf_counter() - start_time
+    totals["elapsed_s"] = elapsed
+    totals["rows_per_s"] = totals["rows"] / elapsed if elapsed else 0.0
+    if progress:
+        progress(totals)
+    return totals
+
+
+def format_progress(totals: dict) -> str:
+    rate = totals["rows"] / totals["elapsed_s"] if totals["elapsed_s"] else 0.0
+    return (f"{totals['rows']} rows, {totals['planned']} planned, {totals['unfinished']} unfinished, "
+            f"{totals['failed']} failed, {totals['elapsed_s']:.1f}s ({rate:.0f} rows/s)")
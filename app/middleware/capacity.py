@@ -0,0 +1,289 @@
+import bisect
+import contextlib
+import csv
+import heapq
+import io
+import os
+import random
+import time
+from collections import Counter
+from app.middleware import course_parsing
+from app.middleware.catalog import get_catalog
+from app.middleware.forecast import DEFAULT_MAX_TERMS, term_sort_key
+from app.middleware.plan_validation import ELECTIVE_NAME
+from app.middleware.student_profiles import build_first_semester_form
+
+# how students are ordered when a course has fewer seats than requests
+PRIORITIES = ("graduation", "lottery")
+
+
+def read_capacity(path: str) -> dict:
+    """
+    reads the seats offered per course and term from a CSV file.
+
+    The file has `course`, `term` and `seats` columns. A term is either a season, i.e. "Fall", which
+    applies to every Fall, or a season and year, i.e. "Fall 2027", which overrides the season's seats.
+    Courses without a row have unlimited seats.
+
+    Parameters
+    ----------
+    path:       str
+                path to the CSV file
+    Returns
+    ----------
+    dict
+                (course, term) -> seats
+    """
+    capacity = {}
+    with open(path, newline="") as fd:
+        for row in csv.DictReader(fd):
+            course = row["course"].strip()
+            term = " ".join(row["term"].split())
+            if term.split(" ")[0] not in course_parsing.OFFERING_TERMS:
+                raise ValueError(f"Unknown term for {course}: {row['term']}")
+            capacity[(course, term)] = int(row["seats"])
+    return capacity
+
+
+def seats_for(capacity: dict, course: str, term: str):
+    # seats offered in a term such as "Fall 2027", or None if the course is not limited
+    seats = capacity.get((course, term))
+    if seats is None:
+        seats = capacity.get((course, term.split(" ")[0]))
+    return seats
+
+
+def next_term(state: dict) -> str:
+    return f"{state['current_semester']} {state['semester_years'][state['current_semester']]}"
+
+
+def student_priority(student: dict, term: str, priority: str, seed: int) -> tuple:
+    """
+    orders the students competing for a seat, lowest first.
+
+    Parameters
+    ----------
+    student:    dict
+                the student's scheduler state and allocation records, see `allocate_seats`
+    term:       str
+                the term being scheduled, i.e. "Fall 2027"
+    priority:   str
+                "graduation" seats the students with the fewest credits left first, "lottery" draws at random
+    seed:       int
+                seed for the lottery, which also breaks ties between students equally close to graduating
+    Returns
+    ----------
+    tuple
+    """
+    draw = random.Random(f"{seed}:{term}:{student['index']}").random()
+    if priority == "graduation":
+        credits_left = course_parsing.TOTAL_CREDITS_FOR_GRADUATION - student["state"]["total_credits_accumulated"]
+        return credits_left, draw, student["index"]
+    return draw, student["index"]
+
+
+def plan_semester(student: dict) -> set:
+    """
+    (re)plans the student's next semester without the courses they were denied a seat in.
+
+    The state is restored from the snapshot taken before the term, so only the contested semester is
+    planned again, not the whole schedule.
+
+    Returns
+    ----------
+    set
+                the courses the semester places, leaving out elective placeholders
+    """
+    state = student["state"]
+    state.clear()
+    state.update(course_parsing.copy_state(student["snapshot"]))
+    state["required_courses_dict_list"] = [course for course in state["required_courses_dict_list"]
+                                           if course[0] not in student["withheld"]]
+    student["semester_info"] = next(course_parsing.semester_generator(state))
+    return set(course["course"] for course in student["semester_info"]["schedule"] if course["name"] != ELECTIVE_NAME)
+
+
+def restore_withheld(student: dict) -> None:
+    # put the denied courses back, in catalog order, so they are tried again in the next term they are offered
+    state = student["state"]
+    withheld = [course for course in student["snapshot"]["required_courses_dict_list"]
+                if course[0] in student["withheld"] and course[0] not in state["courses_taken"]]
+    for course in withheld:
+        bisect.insort(state["required_courses_dict_list"], course, key=lambda entry: entry[1]["course_number"])
+
+
+def schedule_term(students: list, term: str, capacity: dict, priority: str, seed: int, allocations: dict) -> None:
+    """
+    schedules one term for every student due in it, allocating limited seats with a priority queue per course.
+
+    Students denied a seat have that course withheld and their semester planned again, which can place
+    other courses that compete for seats in the next round; rounds repeat until nobody is denied.
+
+    Parameters
+    ----------
+    students:       list
+                    the students whose next semester is `term`
+    term:           str
+                    i.e. "Fall 2027"
+    capacity:       dict
+                    seats per course and term, see `read_capacity`
+    priority:       str
+                    see `student_priority`
+    seed:           int
+                    seed for the lottery
+    allocations:    dict
+                    (course, term) -> seats, requested, granted and denied counts, updated in place
+    """
+    seats_left = {}
+    for student in students:
+        student["snapshot"] = course_parsing.copy_state(student["state"])
+        student["withheld"] = set()
+        student["granted"] = set()
+        student["priority"] = student_priority(student, term, priority, seed)
+
+    to_plan = students
+    while to_plan:
+        requests = {}
+        for student in to_plan:
+            courses = plan_semester(student)
+            # a seat held from an earlier round goes back if the new plan no longer places the course
+            for course in student["granted"] - courses:
+                seats_left[course] += 1
+                allocations[(course, term)]["requested"] -= 1
+                allocations[(course, term)]["granted"] -= 1
+            student["granted"] &= courses
+            for course in courses - student["granted"]:
+                seats = seats_for(capacity, course, term)
+                if seats is None:
+                    continue
+                if course not in seats_left:
+                    seats_left[course] = seats
+                    allocations[(course, term)] = {"course": course, "term": term, "seats": seats,
+                                                   "requested": 0, "granted": 0, "denied": 0}
+                requests.setdefault(course, []).append((student["priority"], student["index"], student))
+
+        to_plan = {}
+        for course, queue in sorted(requests.items()):
+            allocation = allocations[(course, term)]
+            heapq.heapify(queue)
+            while queue:
+                _, index, student = heapq.heappop(queue)
+                allocation["requested"] += 1
+                if seats_left[course] > 0:
+                    seats_left[course] -= 1
+                    allocation["granted"] += 1
+                    student["granted"].add(course)
+                else:
+                    # overflow students are pushed to the next offering of the course
+                    allocation["denied"] += 1
+                    student["withheld"].add(course)
+                    to_plan[index] = student
+        to_plan = list(to_plan.values())
+
+    for student in students:
+        restore_withheld(student)
+        if student["withheld"]:
+            student["denied"] += len(student["withheld"])
+        student["terms"] += 1
+        student["state"]["course_schedule"].clear()
+
+
+def allocate_seats(profiles: list, capacity: dict, priority="graduation", seed=0,
+                   max_terms=DEFAULT_MAX_TERMS, scheduler_engine="greedy") -> dict:
+    """
+    schedules a cohort term by term, sharing out the seats of capacity-limited courses.
+
+    Every student keeps their own scheduler state, and each term only plans the next semester, so a
+    denied seat costs one semester's replanning instead of a new schedule.
+
+    Parameters
+    ----------
+    profiles:           list
+                        student profiles, see `forecast.expand_cohort`
+    capacity:           dict
+                        seats per course and term, see `read_capacity`
+    priority:           str
+                        see `student_priority`
+    seed:               int
+                        seed for the scheduler's random choices and the lottery
+    max_terms:          int
+                        terms after which a student who has not graduated is counted as unfinished
+    scheduler_engine:   str
+                        see `course_parsing.SCHEDULER_ENGINES`
+    Returns
+    ----------
+    dict
+                        students:           number of students scheduled
+                        graduated:          students who graduate within `max_terms`
+                        unfinished:         students who do not
+                        delayed_students:   students denied at least one seat
+                        terms_to_graduate:  number of terms -> students
+                        allocations:        seats, requests, grants and denials per limited course and term
+                        unmet_demand:       the allocations that denied seats
+                        elapsed_s:          wall-clock seconds for the allocation
+    """
+    if priority not in PRIORITIES:
+        raise ValueError(f"Unknown priority: {priority}")
+    if scheduler_engine not in course_parsing.SCHEDULER_ENGINES:
+        raise ValueError(f"Unknown scheduler engine: {scheduler_engine}")
+    start_time = time.perf_counter()
+
+    with open(os.devnull, "w") as output, contextlib.redirect_stdout(output):
+        required_courses_dict = get_catalog()["courses_json"]
+        students = []
+        for index, profile in enumerate(profiles):
+            random.seed(f"{seed}:{index}")
+            form = build_first_semester_form(profile, required_courses_dict, True)
+            form.add("scheduler_engine", scheduler_engine)
+            students.append({
+                "index": index,
+                "state": course_parsing.read_scheduler_state(form),
+                "terms": 0,
+                "denied": 0
+            })
+
+        allocations = {}
+        active = [student for student in students if not student["state"]["is_graduated"]]
+        while active:
+            # schedule the earliest term any student is due in, so students starting in different terms share seats
+            term = min((next_term(student["state"]) for student in active), key=term_sort_key)
+            due = [student for student in active if next_term(student["state"]) == term]
+            schedule_term(due, term, capacity, priority, seed, allocations)
+            active = [student for student in active
+                      if not student["state"]["is_graduated"] and student["terms"] < max_terms]
+
+    terms_to_graduate = Counter(student["terms"] for student in students if student["state"]["is_graduated"])
+    allocation_list = sorted(allocations.values(), key=lambda allocation: (term_sort_key(allocation["term"]), allocation["course"]))
+    graduated = sum(terms_to_graduate.values())
+    return {
+        "students": len(students),
+        "graduated": graduated,
+        "unfinished": len(students) - graduated,
+        "delayed_students": sum(1 for student in students if student["denied"]),
+        "terms_to_graduate": {str(terms): count for terms, count in sorted(terms_to_graduate.items())},
+        "allocations": allocation_list,
+        "unmet_demand": [allocation for allocation in allocation_list if allocation["denied"]],
+        "elapsed_s": time.perf_counter() - start_time
+    }
+
+
+def write_allocations_csv(report: dict, fd) -> None:
+    writer = csv.DictWriter(fd, fieldnames=["course", "term", "seats", "requested", "granted", "denied"])
+    writer.writeheader()
+    writer.writerows(report["allocations"])
+
+
+def format_allocation_report(report: dict) -> str:
+    out = io.StringIO()
+    out.write(f"{'Students:':<20}{report['students']} ({report['unfinished']} unfinished)\n")
+    out.write(f"{'Delayed:':<20}{report['delayed_students']} students denied a seat at least once\n")
+    out.write(f"{'Allocated in:':<20}{report['elapsed_s']:.2f}s\n")
+    out.write("Terms to graduate:\n")
+    for terms_taken, students in report["terms_to_graduate"].items():
+        out.write(f"\t{terms_taken:>3} terms{students:>8}\n")
+    out.write("Unmet demand:\n")
+    out.write(f"\t{'Course':<20}{'Term':<14}{'Seats':>7}{'Requested':>11}{'Denied':>8}\n")
+    for allocation in report["unmet_demand"]:
+        out.write(f"\t{allocation['course']:<20}{allocation['term']:<14}{allocation['seats']:>7}"
+                  f"{allocation['requested']:>11}{allocation['denied']:>8}\n")
+    return out.getvalue()
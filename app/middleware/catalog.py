@@ -0,0 +1,415 @@
+import hashlib
+import json
+import os
+import sys
+import threading
+import weakref
+from collections import OrderedDict
+from app.middleware.course_search import build_search_index
+
+# the current catalog is xml/course_data.xml; earlier catalog years are xml/catalogs/<year>.xml, i.e. 2023-2024.xml
+CURRENT_CATALOG_YEAR = "current"
+CATALOG_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "xml", "catalogs")
+# compiled catalogs are evicted, least recently used first, once their estimated sizes add up to more than this
+MAX_CATALOG_CACHE_BYTES = 64 * 1024 * 1024
+
+# catalog year -> compiled catalog, least recently used first
+_compiled_catalogs = OrderedDict()
+_lock = threading.Lock()
+# one tuple per distinct set of terms, shared by every course offered in those terms
+_shared_offerings = {}
+# records of courses that are the same in several catalog years, shared by their catalogs
+_shared_records = weakref.WeakValueDictionary()
+
+
+def catalog_years() -> list:
+    # the current catalog first, then the catalog years found in `CATALOG_DIR`, newest first
+    years = []
+    if os.path.isdir(CATALOG_DIR):
+        years = sorted((os.path.splitext(name)[0] for name in os.listdir(CATALOG_DIR) if name.endswith(".xml")),
+                       reverse=True)
+    return [CURRENT_CATALOG_YEAR] + years
+
+
+def catalog_path(catalog_year=None) -> str:
+    """
+    returns the XML file of a catalog year.
+
+    Parameters
+    ----------
+    catalog_year:   str
+                    i.e. "2023-2024", defaults to `CURRENT_CATALOG_YEAR`
+    Returns
+    ----------
+    str
+    """
+    if not catalog_year or catalog_year == CURRENT_CATALOG_YEAR:
+        root = os.path.dirname(os.path.dirname(__file__))
+        return os.path.join(root, 'xml/course_data.xml')
+    # the year comes from requests, so it must be one of the files listed rather than any path
+    if catalog_year not in catalog_years():
+        raise ValueError(f"Unknown catalog year: {catalog_year}")
+    return os.path.join(CATALOG_DIR, f"{catalog_year}.xml")
+
+
+def catalog_version(path=None) -> tuple:
+    """
+    identifies the version of the course catalog by the XML file's size and modification time.
+
+    Parameters
+    ----------
+    path:       str
+                the catalog XML file, defaults to `xml/course_data.xml`
+    Returns
+    ----------
+    tuple
+    """
+    if path is None:
+        root = os.path.dirname(os.path.dirname(__file__))
+        path = os.path.join(root, 'xml/course_data.xml')
+    stat = os.stat(path)
+    return (path, stat.st_size, stat.st_mtime_ns)
+
+
+def compile_prerequisites(prerequisite: list) -> tuple:
+    """
+    converts the output of `build_prerequisites` into an immutable tuple of entries.
+
+    Entries keep the shape the scheduler and `drag_drop_utils.js` check against: a string is a single
+    course, and a tuple holds courses that are all required.
+
+    Parameters
+    ----------
+    prerequisite:   list
+                    a course's `prerequisite` list, which mixes strings and lists of strings
+    Returns
+    ----------
+    tuple
+    """
+    return tuple(prereqs if isinstance(prereqs, str) else tuple(prereqs) for prereqs in prerequisite)
+
+
+def prerequisite_options(prerequisites: tuple) -> tuple:
+    # each entry as a tuple of courses, whether it was a string or a tuple
+    return tuple((prereqs,) if isinstance(prereqs, str) else prereqs for prereqs in prerequisites)
+
+
+def credit_hours(credit) -> int:
+    # variable credit courses, i.e. "1-3", count their minimum
+    return int(str(credit).split("-")[0])
+
+
+class Course:
+    """
+    the fields the scheduler and validators read from one catalog course, converted once per catalog.
+
+    The course dicts from `parse_courses` keep the XML's shapes (and are what the pages embed and post
+    back); a record holds the same fields parsed: int credits, an interned key, and tuples for the
+    terms offered and the prerequisites.
+    """
+    __slots__ = ("key", "name", "credits", "offered", "offering_mask", "prerequisites", "concurrent", "__weakref__")
+
+    def __init__(self, key: str, course: dict):
+        self.key = sys.intern(key)
+        self.name = course["course_name"]
+        self.credits = credit_hours(course["credit"])
+        offered = tuple(sorted(set(map(sys.intern, course["semesters_offered"]))))
+        self.offered = _shared_offerings.setdefault(offered, offered)
+        self.offering_mask = course.get("offering_mask", 0)
+        self.prerequisites = tuple(sys.intern(prereqs) if isinstance(prereqs, str) else tuple(map(sys.intern, prereqs))
+                                   for prereqs in compile_prerequisites(course["prerequisite"]))
+        concurrent = course.get("concurrent")
+        self.concurrent = sys.intern(concurrent) if concurrent else None
+
+    def __repr__(self):
+        return f"Course({self.key!r}, {self.credits} credits, offered {sorted(self.offered)})"
+
+
+def shared_record(key: str, course: dict) -> Course:
+    # the record of a course, reused when another catalog year has the same course with the same fields
+    identity = (key, hashlib.blake2b(json.dumps(course, sort_keys=True).encode(), digest_size=16).digest())
+    record = _shared_records.get(identity)
+    if record is None:
+        record = Course(key, course)
+        _shared_records[identity] = record
+    return record
+
+
+def compile_catalog(all_courses: dict) -> dict:
+    """
+    builds the lookup indexes used to schedule and validate plans.
+
+    Parameters
+    ----------
+    all_courses:    dict
+                    the catalog, as returned by `parse_courses`
+    Returns
+    ----------
+    dict
+                    courses:        the catalog
+                    records:        course key -> `Course`
+                    dependencies:   the prerequisite graph as bitsets, see `build_dependency_index`
+                    search:         the course search indexes, see `course_search.build_search_index`
+    """
+    records = {record.key: record for record in (shared_record(key, course) for key, course in all_courses.items())}
+    catalog = {
+        "courses": all_courses,
+        "records": records,
+        "dependencies": build_dependency_index({key: record.prerequisites for key, record in records.items()})
+    }
+    catalog["search"] = build_search_index(all_courses)
+    return catalog
+
+
+def build_dependency_index(prerequisites: dict) -> dict:
+    """
+    builds the prerequisite graph, and its transitive closure, with one int bitset per course.
+
+    Bit `i` of a bitset stands for the course at `keys[i]`. Prerequisites outside the catalog, i.e.
+    "ALEKS" or courses from other departments, are not part of the graph.
+
+    Parameters
+    ----------
+    prerequisites:  dict
+                    course key -> tuple of prerequisite entries, see `compile_prerequisites`
+    Returns
+    ----------
+    dict
+                    keys:           course keys in bit order
+                    bits:           course key -> its bit
+                    options:        course key -> tuple of bitsets, one per prerequisite option
+                    prerequisites:  course key -> bitset of direct prerequisites
+                    unlocks:        course key -> bitset of courses that list it as a prerequisite
+                    ancestors:      course key -> bitset of all direct and indirect prerequisites
+                    descendants:    course key -> bitset of all courses that depend on it
+                    order:          course keys with every course after its prerequisites
+    """
+    keys = sorted(prerequisites)
+    bits = {key: 1 << i for i, key in enumerate(keys)}
+
+    options = {}
+    direct = {}
+    unlocks = dict.fromkeys(keys, 0)
+    for key in keys:
+        masks = []
+        for option in prerequisite_options(prerequisites[key]):
+            mask = 0
+            for prereq in option:
+                if prereq in bits and prereq != key:
+                    mask |= bits[prereq]
+            if mask:
+                masks.append(mask)
+        options[key] = tuple(masks)
+        direct[key] = 0
+        for mask in masks:
+            direct[key] |= mask
+        for prereq in iter_courses(direct[key], keys):
+            unlocks[prereq] |= bits[key]
+
+    # depth-first topological order; a prerequisite cycle is cut where it is found
+    order = []
+    visiting = set()
+    visited = set()
+
+    def visit(key):
+        if key in visited or key in visiting:
+            return
+        visiting.add(key)
+        for prereq in iter_courses(direct[key], keys):
+            visit(prereq)
+        visiting.discard(key)
+        visited.add(key)
+        order.append(key)
+
+    for key in keys:
+        visit(key)
+
+    ancestors = {}
+    for key in order:
+        mask = direct[key]
+        for prereq in iter_courses(direct[key], keys):
+            mask |= ancestors.get(prereq, 0)
+        ancestors[key] = mask
+    descendants = {}
+    for key in reversed(order):
+        mask = unlocks[key]
+        for dependent in iter_courses(unlocks[key], keys):
+            mask |= descendants.get(dependent, 0)
+        descendants[key] = mask
+
+    return {
+        "keys": keys,
+        "bits": bits,
+        "options": options,
+        "prerequisites": direct,
+        "unlocks": unlocks,
+        "ancestors": ancestors,
+        "descendants": descendants,
+        "order": order
+    }
+
+
+def iter_courses(mask: int, keys: list):
+    # yields the course key of each set bit, lowest bit first
+    while mask:
+        low = mask & -mask
+        yield keys[low.bit_length() - 1]
+        mask ^= low
+
+
+def unlocks(catalog: dict, course: str) -> list:
+    """
+    returns the courses that list `course` as a prerequisite.
+
+    Parameters
+    ----------
+    catalog:    dict
+                the compiled catalog, see `get_catalog`
+    course:     str
+                the course key, i.e. CMP SCI 2250
+    Returns
+    ----------
+    list
+    """
+    dependencies = catalog["dependencies"]
+    return list(iter_courses(dependencies["unlocks"].get(course, 0), dependencies["keys"]))
+
+
+def ancestors(catalog: dict, course: str) -> list:
+    """
+    returns every direct and indirect prerequisite of `course`, from any of its prerequisite options.
+
+    Parameters
+    ----------
+    catalog:    dict
+                the compiled catalog, see `get_catalog`
+    course:     str
+                the course key
+    Returns
+    ----------
+    list
+    """
+    dependencies = catalog["dependencies"]
+    return list(iter_courses(dependencies["ancestors"].get(course, 0), dependencies["keys"]))
+
+
+def blocked_by(catalog: dict, courses) -> list:
+    """
+    returns the courses that can no longer be taken next term if `courses` slip.
+
+    A course is blocked when every one of its prerequisite options needs a slipped or blocked course,
+    so a course with another way in is not reported.
+
+    Parameters
+    ----------
+    catalog:    dict
+                the compiled catalog, see `get_catalog`
+    courses:    str or list
+                the course key, or keys, that slip a term
+    Returns
+    ----------
+    list
+                blocked course keys, each after the courses that block it
+    """
+    dependencies = catalog["dependencies"]
+    if isinstance(courses, str):
+        courses = [courses]
+    blocked = 0
+    reachable = 0
+    for course in courses:
+        blocked |= dependencies["bits"].get(course, 0)
+        reachable |= dependencies["descendants"].get(course, 0)
+
+    result = []
+    for key in dependencies["order"]:
+        if not reachable & dependencies["bits"][key]:
+            continue
+        if all(option & blocked for option in dependencies["options"][key]):
+            blocked |= dependencies["bits"][key]
+            result.append(key)
+    return result
+
+
+def prereqs_for(catalog: dict, required_courses) -> dict:
+    """
+    slices the reverse-dependency index down to the courses a student still needs.
+
+    Parameters
+    ----------
+    catalog:            dict
+                        the compiled catalog, see `get_catalog`
+    required_courses:   iterable
+                        the student's required course keys
+    Returns
+    ----------
+    dict
+                        prerequisite key -> list of the required courses it is a prerequisite for,
+                        in the order of `required_courses`
+    """
+    dependencies = catalog["dependencies"]
+    prereqs_for_dict = {}
+    for course in required_courses:
+        for prereq in iter_courses(dependencies["prerequisites"].get(course, 0), dependencies["keys"]):
+            prereqs_for_dict.setdefault(prereq, []).append(course)
+    return prereqs_for_dict
+
+
+def estimate_size(value, seen=None) -> int:
+    # the memory held by a compiled catalog, counting each object once; a record shared with another
+    # catalog year is counted by both, so evicting either frees no more than estimated
+    seen = set() if seen is None else seen
+    if id(value) in seen:
+        return 0
+    seen.add(id(value))
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(estimate_size(key, seen) + estimate_size(item, seen) for key, item in value.items())
+    elif isinstance(value, (list, tuple, set, frozenset)):
+        size += sum(estimate_size(item, seen) for item in value)
+    elif isinstance(value, Course):
+        size += sum(estimate_size(getattr(value, slot), seen) for slot in Course.__slots__ if slot != "__weakref__")
+    return size
+
+
+def evict_catalogs() -> None:
+    # least recently used first, always keeping the catalog used last
+    total = sum(catalog["size"] for catalog in _compiled_catalogs.values())
+    while len(_compiled_catalogs) > 1 and total > MAX_CATALOG_CACHE_BYTES:
+        catalog_year, catalog = _compiled_catalogs.popitem(last=False)
+        total -= catalog["size"]
+        print(f"Catalog {catalog_year} evicted ({catalog['size'] // 1024} KB)")
+
+
+def get_catalog(catalog_year=None) -> dict:
+    """
+    returns the compiled catalog of a catalog year, compiling it on first use and again when its
+    XML file changes.
+
+    Parameters
+    ----------
+    catalog_year:   str
+                    see `catalog_years`, defaults to `CURRENT_CATALOG_YEAR`
+    Returns
+    ----------
+    dict
+                    see `compile_catalog`, with the catalog's year, version, size and JSON encoding
+    """
+    catalog_year = catalog_year or CURRENT_CATALOG_YEAR
+    path = catalog_path(catalog_year)
+    version = catalog_version(path)
+    # the lock also guards the order of use, which every lookup updates
+    with _lock:
+        catalog = _compiled_catalogs.get(catalog_year)
+        if catalog is None or catalog["version"] != version:
+            # imported here since course_parsing reads the dependency index from this module
+            from app.middleware.course_parsing import parse_courses
+            catalog = compile_catalog(parse_courses(path))
+            catalog["year"] = catalog_year
+            catalog["version"] = version
+            # the catalog as the home page embeds it (Flask sorts the keys), encoded once
+            catalog["courses_json"] = json.dumps(catalog["courses"], sort_keys=True)
+            catalog["size"] = estimate_size(catalog)
+            _compiled_catalogs[catalog_year] = catalog
+        _compiled_catalogs.move_to_end(catalog_year)
+        evict_catalogs()
+    return catalog
@@ -0,0 +1,101 @@
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+# checkpoints are kept in memory by the worker that created them; a request that reaches another
+# worker (or arrives after the checkpoint expired) simply rebuilds the state from the form
+CHECKPOINT_TTL_SECONDS = 30 * 60
+MAX_CHECKPOINTS = 256
+
+# hidden form fields that must be unchanged for a checkpoint to be resumed
+FINGERPRINT_FIELDS = (
+    "required_courses_dict_list",
+    "required_courses_dict_list_unchanged",
+    "course_prereqs_for",
+    "courses_taken",
+    "required_courses_tuple",
+    "certificate_choice",
+    "certificate_choices",
+    "catalog_year"
+)
+
+_checkpoints = OrderedDict()
+_lock = threading.Lock()
+
+
+def fingerprint(values) -> int:
+    return hash(tuple(values.get(field, "") for field in FINGERPRINT_FIELDS))
+
+
+def save_checkpoint(state: dict, generator, render_info: dict) -> str:
+    """
+    saves the scheduler after a semester so the next "Continue Schedule" request can resume it.
+
+    Parameters
+    ----------
+    state:          dict
+                    the scheduler variables, see `course_parsing.read_scheduler_state`
+    generator:      generator
+                    the suspended `course_parsing.schedule_semesters` generator, or None
+    render_info:    dict
+                    the rendered variables, which the browser posts back with the next request
+    Returns
+    ----------
+    str
+                    the checkpoint id, rendered as a hidden form field
+    """
+    checkpoint_id = uuid.uuid4().hex
+    checkpoint = {
+        "state": state,
+        "generator": generator,
+        "semester_number": render_info["semester_number"],
+        "fingerprint": fingerprint(render_info),
+        "saved_at": time.monotonic()
+    }
+    with _lock:
+        _checkpoints[checkpoint_id] = checkpoint
+        # drop the oldest checkpoints once over capacity or expired
+        while _checkpoints:
+            oldest = next(iter(_checkpoints.values()))
+            if len(_checkpoints) <= MAX_CHECKPOINTS and checkpoint["saved_at"] - oldest["saved_at"] <= CHECKPOINT_TTL_SECONDS:
+                break
+            _checkpoints.popitem(last=False)
+    return checkpoint_id
+
+
+def take_checkpoint(form) -> dict:
+    """
+    removes and returns the checkpoint named by the form, if it can be resumed.
+
+    A checkpoint is only resumed when the form is for the semester right after it and the hidden
+    scheduler fields are unchanged, i.e. not after the back button or an uploaded schedule.
+
+    Parameters
+    ----------
+    form:       MultiDict
+                the posted form
+    Returns
+    ----------
+    dict
+                the checkpoint, or None if the state must be rebuilt from the form
+    """
+    checkpoint_id = form.get("checkpoint_id")
+    if not checkpoint_id:
+        return None
+    with _lock:
+        checkpoint = _checkpoints.pop(checkpoint_id, None)
+    if checkpoint is None:
+        return None
+    if time.monotonic() - checkpoint["saved_at"] > CHECKPOINT_TTL_SECONDS:
+        return None
+    if str(checkpoint["semester_number"]) != form.get("semester_number"):
+        return None
+    if checkpoint["fingerprint"] != fingerprint(form):
+        return None
+    return checkpoint
+
+
+def clear_checkpoints() -> None:
+    with _lock:
+        _checkpoints.clear()
@@ -0,0 +1,389 @@
+import time
+from app.middleware import course_parsing
+from app.middleware.catalog import get_catalog, compile_prerequisites
+from app.middleware.critical_path import earliest_graduation, term_cycle, term_phase
+from app.middleware.plan_validation import check_prerequisites, ENGLISH_3130_MIN_CREDITS, FIXED_SEMESTER_COURSES
+
+# the search returns the best plan found within this many seconds, unless the form asks for another budget
+DEFAULT_TIME_BUDGET_SECONDS = 1.0
+# a term may go over the student's minimum credits by up to this many credits
+MAX_CREDITS_OVER_MINIMUM = 3
+# CS electives per term, as in the greedy engine
+MAX_CS_ELECTIVE_CREDITS_PER_SEMESTER = 6
+# plans are searched over at most this many terms
+MAX_TERMS = 24
+# subsets of the available required courses tried per term, largest and most critical first
+MAX_SUBSETS_PER_TERM = 6
+
+
+class SearchTimeout(Exception):
+    pass
+
+
+def course_level(course_info: dict) -> int:
+    try:
+        return int(course_info["course_number"])
+    except (KeyError, ValueError):
+        return 0
+
+
+def term_credit_bounds(state: dict, term: str) -> tuple:
+    # the minimum and maximum credits of a term, using the student's minimums for Fall/Spring and Summer
+    minimum = state["temp_min_credits_per_semester"] or state["min_credits_per_semester"]
+    if term == "Summer" and state["generate_complete_schedule"]:
+        minimum = state["summer_credit_count"]
+    return minimum, minimum + MAX_CREDITS_OVER_MINIMUM
+
+
+def build_problem(state: dict, catalog: dict) -> dict:
+    """
+    collects what the search needs from the scheduler state.
+
+    Parameters
+    ----------
+    state:      dict
+                the scheduler variables, see `course_parsing.read_scheduler_state`
+    catalog:    dict
+                the compiled catalog, see `catalog.get_catalog`
+    Returns
+    ----------
+    dict
+    """
+    lead, cycle = term_cycle(state["current_semester"], state["include_summer"])
+    terms = lead + cycle
+    courses = [course for course, _ in state["required_courses_dict_list"] if course not in state["courses_taken"]]
+    info = dict(state["required_courses_dict_list"])
+    descendants = catalog["dependencies"]["descendants"]
+
+    # most critical first: the courses pinned to the first semesters, then those that hold up the most other courses
+    courses.sort(key=lambda course: (course not in FIXED_SEMESTER_COURSES, -bin(descendants.get(course, 0)).count("1"),
+                                     info[course]["course_number"], course))
+    return {
+        "courses": courses,
+        "info": info,
+        "bit": {course: 1 << i for i, course in enumerate(courses)},
+        "prerequisites": {course: compile_prerequisites(info[course]["prerequisite"]) for course in courses},
+        "credits": {course: course_parsing.course_credits(course, info[course], catalog["records"]) for course in courses},
+        # the term at index `term_phase(lead_terms, period, term)` of `terms` is the one `term` terms after the start
+        "terms": terms,
+        "lead_terms": len(lead),
+        "period": len(cycle),
+        "bounds": [term_credit_bounds(state, term) for term in terms],
+        "offering_filters": [course_parsing.build_offering_filter(term, state["delivery_modes"]) for term in terms],
+        "required_courses": set(state["required_courses_tuple"]) | set(courses)
+    }
+
+
+def available_subsets(problem, phase, done, taken_before, credits_before, maximum):
+    """
+    yields the sets of required courses that can be taken together in a term.
+
+    Courses are tried in order of how critical they are, taking each one first, so the first subset is
+    the greedy choice and later ones leave courses out.
+    """
+    candidates = []
+    for course in problem["courses"]:
+        if done & problem["bit"][course]:
+            continue
+        info = problem["info"][course]
+        if not course_parsing.is_offered(problem["terms"][phase], info, problem["offering_filters"][phase]):
+            continue
+        if course == "ENGLISH 3130":
+            if credits_before < ENGLISH_3130_MIN_CREDITS:
+                continue
+        elif course_level(info) >= 3000 and credits_before < course_parsing.credits_for_3000_level:
+            continue
+        candidates.append(course)
+
+    yielded = 0
+    chosen = []
+
+    def extend(index, credits):
+        nonlocal yielded
+        if yielded >= MAX_SUBSETS_PER_TERM:
+            return
+        if index == len(candidates):
+            yielded += 1
+            yield list(chosen)
+            return
+        course = candidates[index]
+        if credits + problem["credits"][course] <= maximum:
+            passed, _ = check_prerequisites(course, problem["prerequisites"][course], problem["info"][course].get("concurrent"),
+                                            taken_before, set(chosen), credits_before, problem["required_courses"])
+            if passed or not problem["prerequisites"][course]:
+                chosen.append(course)
+                yield from extend(index + 1, credits + problem["credits"][course])
+                chosen.pop()
+        yield from extend(index + 1, credits)
+
+    yield from extend(0, 0)
+
+
+def fill_electives(counts, credits, credits_before, minimum, maximum, required_credits_left) -> list:
+    """
+    adds elective placeholders to a term, in the greedy engine's order of preference.
+
+    CS and certificate electives come first once 3000+ level courses can be taken, then general
+    education electives. Free electives only pad the term to its minimum, or make up credits the
+    student would otherwise be short of at graduation.
+
+    Parameters
+    ----------
+    counts:                 dict
+                            the min_3000, cert, gen_ed and free elective counters, updated in place
+    credits:                int
+                            the term's credits from required courses
+    credits_before:         int
+                            credits earned before the term
+    minimum:                int
+                            the term's minimum credits
+    maximum:                int
+                            the term's maximum credits
+    required_credits_left:  int
+                            credits of required courses not yet planned, after this term
+    Returns
+    ----------
+    list
+                            the placeholder kinds added, in order
+    """
+    placeholders = []
+    cs_elective_credits = 0
+    hours = course_parsing.DEFAULT_CREDIT_HOURS
+    can_take_3000 = credits_before >= course_parsing.credits_for_3000_level
+
+    while credits + hours <= maximum:
+        still_needed = required_credits_left + hours * (counts["min_3000"] + counts["cert"]) + max(counts["gen_ed"], 0)
+        short_of_graduation = credits_before + credits + still_needed < course_parsing.TOTAL_CREDITS_FOR_GRADUATION
+        has_cs_room = cs_elective_credits + hours <= MAX_CS_ELECTIVE_CREDITS_PER_SEMESTER
+        if can_take_3000 and has_cs_room and counts["min_3000"] > 0:
+            kind = "min_3000"
+        elif can_take_3000 and has_cs_room and counts["cert"] > 0:
+            kind = "cert"
+        elif counts["gen_ed"] > 0:
+            kind = "gen_ed"
+        elif short_of_graduation or (credits < minimum and still_needed > 0):
+            kind = "free"
+        else:
+            break
+
+        if kind in ("min_3000", "cert"):
+            cs_elective_credits += hours
+            counts[kind] -= 1
+        elif kind == "gen_ed":
+            counts["gen_ed"] -= hours
+        else:
+            counts["free"] += hours
+        placeholders.append(kind)
+        credits += hours
+    return placeholders
+
+
+def search_plan(state: dict, catalog: dict, time_budget: float) -> list:
+    """
+    searches for the plan with the fewest terms, by backtracking over the required courses taken each term.
+
+    Each term takes a subset of the required courses whose prerequisites are done (or, for the
+    `concurrent` course, taken the same term), that are offered that term in the allowed delivery modes,
+    and that pass the 60 credit gate for 3000+ level courses and the 48 credit gate for ENGLISH 3130.
+    Electives then fill the term to the student's minimum credits. A branch is cut when the critical-path
+    bound shows it cannot beat the best plan, or when the same courses and counters were already reached
+    by an earlier term.
+
+    Parameters
+    ----------
+    state:          dict
+                    the scheduler variables, see `course_parsing.read_scheduler_state`
+    catalog:        dict
+                    the compiled catalog, see `catalog.get_catalog`
+    time_budget:    float
+                    seconds to search; the best plan found so far is returned when it runs out
+    Returns
+    ----------
+    list
+                    one (courses, placeholders) tuple per term, or None if no plan was found
+    """
+    problem = build_problem(state, catalog)
+    terms = problem["terms"]
+    all_done = (1 << len(problem["courses"])) - 1
+    deadline = time.monotonic() + time_budget
+    start_taken = set(state["courses_taken"])
+    max_fall_spring = max(bound[1] for term, bound in zip(terms, problem["bounds"]) if term != "Summer")
+    max_summer = max([bound[1] for term, bound in zip(terms, problem["bounds"]) if term == "Summer"] or [0])
+    best = {"terms": MAX_TERMS + 1, "plan": None}
+    seen = {}
+
+    def required_credits_left(done):
+        return sum(problem["credits"][course] for course in problem["courses"] if not done & problem["bit"][course])
+
+    def search(term, done, taken_before, total, counts, plan):
+        if time.monotonic() > deadline:
+            raise SearchTimeout()
+        if done == all_done and counts["min_3000"] <= 0 and counts["cert"] <= 0 and counts["gen_ed"] <= 0 and \
+                total >= course_parsing.TOTAL_CREDITS_FOR_GRADUATION:
+            if term < best["terms"]:
+                best["terms"] = term
+                best["plan"] = list(plan)
+            return
+        if term >= best["terms"] - 1:
+            return
+
+        # cut branches that cannot finish in fewer terms than the best plan
+        phase = term_phase(problem["lead_terms"], problem["period"], term)
+        remaining = [course for course in problem["courses"] if not done & problem["bit"][course]]
+        bound = earliest_graduation(catalog, remaining, taken_before, terms[phase], state["include_summer"],
+                                    total, max_fall_spring, max_summer)
+        if bound["terms"] is None or term + max(bound["terms"], 1) >= best["terms"]:
+            return
+
+        key = (phase, done, total, counts["min_3000"], counts["cert"], counts["gen_ed"])
+        if seen.get(key, MAX_TERMS + 1) <= term:
+            return
+        seen[key] = term
+
+        minimum, maximum = problem["bounds"][phase]
+        for subset in available_subsets(problem, phase, done, taken_before, total, maximum):
+            credits = sum(problem["credits"][course] for course in subset)
+            next_done = done
+            for course in subset:
+                next_done |= problem["bit"][course]
+            next_counts = dict(counts)
+            placeholders = fill_electives(next_counts, credits, total, minimum, maximum, required_credits_left(next_done))
+            term_credits = credits + course_parsing.DEFAULT_CREDIT_HOURS * len(placeholders)
+            if not subset and not placeholders:
+                continue
+            plan.append((subset, placeholders))
+            search(term + 1, next_done, taken_before | set(subset), total + term_credits, next_counts, plan)
+            plan.pop()
+
+    counts = {
+        "min_3000": state["min_3000_course_still_needed"],
+        "cert": state["cert_elective_courses_still_needed"],
+        "gen_ed": state["gen_ed_credits_still_needed"],
+        "free": state["free_elective_credits_accumulated"]
+    }
+    try:
+        search(0, 0, start_taken, state["total_credits_accumulated"], counts, [])
+    except SearchTimeout:
+        print(f"Constraint scheduler: time budget of {time_budget}s used, keeping the best plan found")
+    return best["plan"]
+
+
+def elective_placeholder(kind: str, state: dict) -> dict:
+    if kind == "gen_ed":
+        return course_parsing.add_gen_ed_elective()
+    if kind == "free":
+        return course_parsing.add_free_elective()
+    if kind == "cert":
+        return {
+            'course': f"CMP SCI {state['certificate_choice_name']} Elective",
+            'name': '[User Selects]',
+            'description': '',
+            'credits': 3,
+            'category': course_parsing.course_categories['C'],
+            'passed_validation': True
+        }
+    return {
+        'course': "CMP SCI 3000+",
+        'name': '[User Selects]',
+        'description': '',
+        'credits': 3,
+        'category': course_parsing.course_categories['E'],
+        'passed_validation': True
+    }
+
+
+def apply_term(state: dict, courses: list, placeholders: list) -> dict:
+    """
+    adds a planned term to the schedule and updates the scheduler counters the way the greedy engine does.
+
+    Returns
+    ----------
+    dict
+                the semester appended to `state["course_schedule"]`
+    """
+    info = dict(state["required_courses_dict_list"])
+    records = get_catalog(state["catalog_year"])["records"]
+    current_semester_classes = []
+    current_semester_credits = 0
+    for course in courses:
+        _, current_semester_classes, state["courses_taken"], state["total_credits_accumulated"], current_semester_credits = \
+            course_parsing.add_course(state["current_semester"], info[course], current_semester_classes, course,
+                                      state["courses_taken"], state["total_credits_accumulated"], current_semester_credits,
+                                      course_parsing.course_categories['R'], records=records)
+    state["required_courses_dict_list"] = [x for x in state["required_courses_dict_list"] if x[0] not in courses]
+
+    hours = course_parsing.DEFAULT_CREDIT_HOURS
+    for kind in placeholders:
+        current_semester_classes.append(elective_placeholder(kind, state))
+        if kind == "min_3000":
+            state["min_3000_course_still_needed"] -= 1
+        elif kind == "cert":
+            state["cert_elective_courses_still_needed"] -= 1
+        elif kind == "gen_ed":
+            state["gen_ed_credits_still_needed"] -= hours
+        else:
+            state["free_elective_credits_accumulated"] += hours
+        state["total_credits_accumulated"] += hours
+        current_semester_credits += hours
+
+    current_semester_info = {
+        'semester': state["current_semester"],
+        'semester_number': state["semester"],
+        'credits': current_semester_credits,
+        'schedule': current_semester_classes,
+        'year': state["semester_years"][state["current_semester"]]
+    }
+    state["course_schedule"].append(current_semester_info)
+    state["is_graduated"] = course_parsing.graduation_check(
+        state["total_credits_accumulated"], state["required_courses_tuple"], state["courses_taken"],
+        state["min_3000_course_still_needed"], state["cert_elective_courses_still_needed"], state["gen_ed_credits_still_needed"])
+
+    # move on to the next semester
+    state["semester"] += 1
+    state["current_semester"] = course_parsing.update_semester(state["current_semester"], state["include_summer"])
+    if state["current_semester"] == state["first_semester"]:
+        state["semester_years"] = {key: value + 1 for key, value in state["semester_years"].items()}
+    if state["generate_complete_schedule"]:
+        if state["current_semester"] == "Summer":
+            state["min_credits_per_semester"] = state["summer_credit_count"]
+        else:
+            state["min_credits_per_semester"] = state["temp_min_credits_per_semester"]
+    return current_semester_info
+
+
+def constraint_schedule_semesters(state: dict):
+    """
+    schedules semesters from a plan searched for up front, with the same interface as
+    `course_parsing.schedule_semesters`.
+
+    The plan is searched again when the student changes the minimum credits between semesters. If no
+    plan is found within the time budget, the greedy engine schedules the rest.
+
+    Parameters
+    ----------
+    state:      dict
+                the scheduler variables, see `course_parsing.read_scheduler_state`
+    Yields
+    ----------
+    dict
+                the completed semester, as appended to `state["course_schedule"]`
+    """
+    plan = None
+    planned_for = None
+    while not state["is_graduated"]:
+        # search again if this is the first semester or the minimum credits were changed
+        credits_selection = (state["temp_min_credits_per_semester"], state["min_credits_per_semester"])
+        if plan is None or credits_selection != planned_for:
+            time_budget = course_parsing.read_time_budget(state.get("scheduler_time_budget")) or DEFAULT_TIME_BUDGET_SECONDS
+            plan = search_plan(state, get_catalog(state["catalog_year"]), time_budget)
+            planned_for = credits_selection
+            if plan is None:
+                print("Constraint scheduler: no plan found, using the greedy scheduler")
+                yield from course_parsing.schedule_semesters(state)
+                return
+        if not plan:
+            return
+        courses, placeholders = plan.pop(0)
+        semester_info = apply_term(state, courses, placeholders)
+        planned_for = (state["temp_min_credits_per_semester"], state["min_credits_per_semester"])
+        yield semester_info
@@ -1,14 +1,58 @@
-import xmltodict
 import json
 from collections.abc import Mapping
 from typing import Union, Any
 import math
 import datetime
-from itertools import chain
 import os
-import copy
 import random
-from app.middleware.test_schedule import test_schedule
+import time
+from functools import lru_cache
+from itertools import combinations
+from app.middleware.checkpoints import take_checkpoint, save_checkpoint
+from app.middleware.alloc_profile import phase
+from app.middleware.catalog import get_catalog, prereqs_for, compile_prerequisites, prerequisite_options, \
+    credit_hours, CURRENT_CATALOG_YEAR
+from app.middleware.student_profiles import DEGREES, CERTIFICATES
+
+# set up default variables (also used for counter on scheduling page)
+TOTAL_CREDITS_FOR_GRADUATION = 120
+TOTAL_CREDITS_FOR_BSCS = 71
+TOTAL_CREDITS_FOR_BSCS_ELECTIVES = 15
+TOTAL_CREDITS_FOR_GEN_EDS = 27
+DEFAULT_CREDIT_HOURS = 3
+course_categories = {
+    'R': 'BSCS',                # required
+    'E': 'BSCS',                # elective
+    'C': 'BSCS',                # certificate
+    'G': 'General Education',
+    'F': 'Free Elective',
+    'O': 'Other'
+}
+
+# adjust credit parameters for scheduling
+credits_for_3000_level = 60  # 3000+ level credits will not be taken before this many credits earned
+credits_for_english_3130 = 48  # ENGLISH 3130 will not be taken before this many credits earned
+
+# delivery modes in a rotation term's `time_code`: day, evening, online, hybrid
+OFFERING_TERMS = ("Fall", "Spring", "Summer")
+DELIVERY_MODES = "DEOH"
+
+# prerequisite closures kept per catalog, by required courses and academic history, see `graduation_closure`
+MAX_CLOSURES = 4096
+# catalogs (one per catalog year in use) whose decoded courses and requirement tables are kept
+MAX_DECODED_CATALOGS = 4
+
+# "greedy" places one course at a time; "constraint" searches for the shortest plan, see `constraint_scheduler`
+SCHEDULER_ENGINES = ("greedy", "constraint")
+# the constraint engine's time budget comes from a hidden form field, so it is kept within these bounds
+MIN_TIME_BUDGET_SECONDS = 0.05
+MAX_TIME_BUDGET_SECONDS = 5.0
+
+# a schedule still not graduated after this many terms is reported as unschedulable instead of growing forever
+MAX_SCHEDULE_TERMS = 24
+# seconds a full schedule may take, checked between semesters, on top of the constraint engine's time budget
+FULL_SCHEDULE_TIMEOUT_SECONDS = 10
+
 
 def print_dictionary(course_dictionary: dict) -> None:
     """
@@ -131,6 +175,9 @@ def build_dictionary(courses: Union[dict, list]) -> dict:
         else:
             course["semesters_offered"].append(course['rotation_term']['term'])
 
+        # add bitmap of the terms and delivery modes offered to dictionary
+        course["offering_mask"] = build_offering_mask(course['rotation_term'])
+
         if 'prerequisite_description' in course:
             course['prerequisite_description'] = course['prerequisite_description']
 
@@ -152,7 +199,7 @@ def build_dictionary(courses: Union[dict, list]) -> dict:
     return updated_course_dict
 
 
-def parse_courses() -> dict:
+def parse_courses(path=None) -> dict:
     """
     Parses relevant information from XML and return dictionaries.
 
@@ -165,14 +212,21 @@ def parse_courses() -> dict:
         - a list(if only one course for that key exists) or
         - a dictionary (if multiple courses for that key exist)
 
+    Parameters
+    ----------
+    path:           str
+                    the catalog XML file of a catalog year, defaults to `xml/course_data.xml`
     Returns
     ----------
     dict
                     The dictionary that holds all course information
     """
-    # open xml document to begin parsing
-    root = os.path.dirname(os.path.dirname(__file__))
-    with open(os.path.join(root, 'xml/course_data.xml')) as fd:
+    # open xml document to begin parsing; the XML parser is only loaded when a catalog is parsed
+    import xmltodict
+    if path is None:
+        root = os.path.dirname(os.path.dirname(__file__))
+        path = os.path.join(root, 'xml/course_data.xml')
+    with open(path) as fd:
         doc = xmltodict.parse(fd.read())
 
     # create a dictionary with course information to further parse
@@ -208,7 +262,8 @@ def parse_certificate(certificate_name) -> dict:
     dict
 
     """
-    # open xml document to begin parsing
+    # open xml document to begin parsing; the XML parser is only loaded when a catalog is parsed
+    import xmltodict
     root = os.path.dirname(os.path.dirname(__file__))
     with open(os.path.join(root, 'xml/cscertificate_data.xml')) as fd:
         doc = xmltodict.parse(fd.read())
@@ -224,11 +279,94 @@ def parse_certificate(certificate_name) -> dict:
     return core_courses, elective_courses, electives_needed
 
 
+def offering_bit(term: str, mode: str) -> int:
+    return 1 << (OFFERING_TERMS.index(term) * len(DELIVERY_MODES) + DELIVERY_MODES.index(mode))
+
+
+def build_offering_mask(rotation_terms: Union[dict, list]) -> int:
+    """
+    builds a bitmap with one bit per term and delivery mode a course is offered in.
+
+    Parameters
+    ----------
+    rotation_terms:     dict or list
+                        the course's `rotation_term` tags, each with a `term` and a `time_code` such as "D, E, O"
+    Returns
+    ----------
+    int
+                        a time code that is blank or "A" (arranged) counts as every delivery mode
+    """
+    if isinstance(rotation_terms, Mapping):
+        rotation_terms = [rotation_terms]
+    offering_mask = 0
+    for rotation_term in rotation_terms:
+        if rotation_term['term'] not in OFFERING_TERMS:
+            continue
+        modes = [mode.strip() for mode in (rotation_term.get('time_code') or '').split(',')]
+        modes = [mode for mode in modes if mode in DELIVERY_MODES and mode]
+        for mode in modes or DELIVERY_MODES:
+            offering_mask |= offering_bit(rotation_term['term'], mode)
+    return offering_mask
+
+
+@lru_cache(maxsize=None)
+def build_offering_filter(current_semester: str, delivery_modes: str) -> Union[tuple, None]:
+    """
+    builds the bitmaps `add_course` checks a course's `offering_mask` against.
+
+    Parameters
+    ----------
+    current_semester:   str
+                        the semester being scheduled
+    delivery_modes:     str
+                        the delivery modes the student can take, i.e. "EO" for evening or online
+    Returns
+    ----------
+    tuple
+                        the bitmap for the semester in the allowed modes, the bitmap for the allowed modes in
+                        any term, and the bitmap for the semester in any mode
+    """
+    if current_semester not in OFFERING_TERMS:
+        return None
+    if not delivery_modes:
+        delivery_modes = DELIVERY_MODES
+    term_filter = 0
+    modes_filter = 0
+    for mode in delivery_modes:
+        if mode not in DELIVERY_MODES:
+            continue
+        term_filter |= offering_bit(current_semester, mode)
+        for term in OFFERING_TERMS:
+            modes_filter |= offering_bit(term, mode)
+    semester_filter = 0
+    for mode in DELIVERY_MODES:
+        semester_filter |= offering_bit(current_semester, mode)
+    return term_filter, modes_filter, semester_filter
+
+
+def is_offered(current_semester, course_info, offering_filter=None) -> bool:
+    if offering_filter is None or 'offering_mask' not in course_info:
+        return current_semester in course_info['semesters_offered']
+    term_filter, modes_filter, semester_filter = offering_filter
+    # a course never offered in the allowed modes can still be taken in any mode, so the student can graduate
+    if not course_info['offering_mask'] & modes_filter:
+        term_filter = semester_filter
+    return bool(course_info['offering_mask'] & term_filter)
+
+
+def course_credits(course, course_info, records=None) -> int:
+    # the credits of the catalog record, or of the posted course info for a course outside the catalog
+    record = records.get(course) if records else None
+    return record.credits if record is not None else credit_hours(course_info['credit'])
+
+
 def add_course(current_semester, course_info, current_semester_classes, course, courses_taken,
-               total_credits_accumulated, current_semester_credits, course_category):
+               total_credits_accumulated, current_semester_credits, course_category, offering_filter=None,
+               records=None):
     # Add course, credits to current semester and list of courses taken, credits earned
     course_added = False
-    if current_semester in course_info['semesters_offered']:
+    if is_offered(current_semester, course_info, offering_filter):
+        credits = course_credits(course, course_info, records)
         current_semester_classes.append({
             'course': course,
             'name': course_info['course_name'],
@@ -239,8 +377,8 @@ def add_course(current_semester, course_info, current_semester_classes, course,
             'passed_validation': True
         })
         courses_taken.append(course)
-        total_credits_accumulated = total_credits_accumulated + int(course_info['credit'])
-        current_semester_credits = current_semester_credits + int(course_info['credit'])
+        total_credits_accumulated = total_credits_accumulated + credits
+        current_semester_credits = current_semester_credits + credits
         course_added = True
     return course_added, current_semester_classes, courses_taken, total_credits_accumulated, current_semester_credits
 
@@ -504,45 +642,265 @@ def build_courses_for_graduation (all_courses_dict, courses_taken, courses_for_g
     if (len(added_courses)):
         build_courses_for_graduation (all_courses_dict, courses_taken, courses_for_graduation, added_courses)
 
-def generate_semester(request): # -> dict[Union[str, Any], Union[Union[str, list, int, list[Any], None], Any]]:
+
+@lru_cache(maxsize=MAX_DECODED_CATALOGS)
+def decode_courses_dict(required_courses_dict: str) -> dict:
+    # every student of a catalog year posts the same catalog from the home page, so the catalogs decoded are reused;
+    # the scheduler only reads the course dictionaries, so they can be shared between requests
+    return json.loads(required_courses_dict)
+
+
+def scan_program_requirements(all_courses_dict, degree_choice, cert_xml_tags, cert_names) -> dict:
+    """
+    collects the courses a degree and certificates require, and the choose-N groups they select from.
+
+    Parameters
+    ----------
+    all_courses_dict:   dict
+                        the catalog, as the home page embeds it
+    degree_choice:      str
+                        i.e. BSComputerScience
+    cert_xml_tags:      frozenset
+                        the XML tags of the selected certificates, i.e. {"DATACERTReq"}
+    cert_names:         frozenset
+                        the names of the selected certificates, i.e. {"Data Science"}
+    Returns
+    ----------
+    dict
+                        required:   the required courses in catalog order, a course once per program requiring it
+                        choices:    (number to choose, courses to choose from) groups of the degree and every
+                                    certificate, without repeats
+                        overlaps:   per group, course -> the positions of the other groups listing the course
+                        printed:    the "course  degree" lines logged while building the schedule
+    """
+    required = []
+    choices = []
+    printed = []
+    for k, v in all_courses_dict.items():
+        # if the course is required
+        if "required" in v:
+            major_or_cert = v['required']['major_or_cert']
+            if not isinstance(major_or_cert, list):
+                major_or_cert = [major_or_cert]
+            for item in major_or_cert:
+                if item == degree_choice or len(cert_xml_tags.intersection(v['required_by_major_cert'])):
+                    if item == degree_choice:
+                        printed.append(f"\t{k:<20}{item}")
+                    required.append(k)
+        # if the course is a part of a user's selection, for the degree or any certificate's electives;
+        # certificate groups name the certificate or its XML tag
+        if "selection_group" in v.keys():
+            for program in v["selection_group"]["program"]:
+                major_or_cert = program['major_or_cert']
+                if major_or_cert == degree_choice or major_or_cert in cert_names or major_or_cert in cert_xml_tags:
+                    course_tuple = (program["choose"], frozenset(program["course_options"]["option"]))
+                    if course_tuple not in choices:
+                        choices.append(course_tuple)
+    # a course listed by several groups counts toward each of them
+    overlaps = tuple({course: frozenset(other_position for other_position, (_, other) in enumerate(choices)
+                                        if other_position != position and course in other)
+                      for course in options} for position, (_, options) in enumerate(choices))
+    return {"required": tuple(required), "choices": tuple(choices), "overlaps": overlaps, "printed": tuple(printed)}
+
+
+@lru_cache(maxsize=MAX_DECODED_CATALOGS)
+def requirement_table(required_courses_dict: str) -> dict:
+    """
+    precomputes the requirements of every degree with every subset of certificates, for one catalog.
+
+    The same degree and certificates always need the same courses, so each request only copies its
+    entry; the prerequisite closures, which also depend on the courses taken, are added as they are met.
+
+    Parameters
+    ----------
+    required_courses_dict:  str
+                            the JSON catalog embedded in the home page
+    Returns
+    ----------
+    dict
+                            programs:   (degree, certificate tags, certificate names) -> see `scan_program_requirements`
+                            closures:   see `graduation_closure`
+    """
+    all_courses_dict = decode_courses_dict(required_courses_dict)
+    programs = {}
+    for degree in DEGREES:
+        for size in range(len(CERTIFICATES) + 1):
+            for certificates in combinations(CERTIFICATES, size):
+                key = (degree, frozenset(tag for _, tag in certificates), frozenset(name for name, _ in certificates))
+                programs[key] = scan_program_requirements(all_courses_dict, *key)
+    return {"programs": programs, "closures": {}}
+
+
+def program_requirements(required_courses_dict: str, degree_choice, cert_xml_tags, cert_names) -> dict:
+    # looked up in the table, or scanned for a degree or certificate the table does not list; those come from
+    # posted forms and can be anything, so they are not added, and the table stays the size `requirement_table` built
+    table = requirement_table(required_courses_dict)
+    key = (degree_choice, frozenset(cert_xml_tags), frozenset(cert_names))
+    requirements = table["programs"].get(key)
+    if requirements is None:
+        requirements = scan_program_requirements(decode_courses_dict(required_courses_dict), *key)
+    return requirements
+
+
+def select_choice_courses(requirements: dict, courses_for_graduation: list, rng=random) -> list:
+    """
+    picks the courses each choose-N group still needs, preferring courses that count toward other groups too.
+
+    A course already required, or picked for an earlier group, counts toward every group listing it, so
+    certificates with overlapping electives share courses instead of each adding their own.
+
+    Parameters
+    ----------
+    requirements:           dict
+                            the groups and their overlaps, see `scan_program_requirements`
+    courses_for_graduation: list
+                            the required courses, extended in place
+    rng:                    random.Random
+                            draws among equally good candidates
+    Returns
+    ----------
+    list
+                            `courses_for_graduation`
+    """
+    course_choices = requirements["choices"]
+    chosen = set(courses_for_graduation)
+    for position, (choose, options) in enumerate(course_choices):
+        overlaps = requirements["overlaps"][position]
+        print(f"\nSelect {choose} from {set(options)}")
+        intersection = chosen & options
+        print(f"\tIntersection: {intersection}")
+
+        # only add courses that are necessary (avoid overlap)
+        if len(intersection) >= int(choose):
+            print("\tRequirement already satisfied")
+            continue
+        print(f"\tMust now select {int(choose) - len(intersection)}")
+        for i in range(int(choose) - len(intersection)):
+            candidates = options - chosen
+            if not candidates:
+                break
+            if any(overlaps[course] for course in candidates):
+                # prefer the candidates counting toward the most other groups still short of courses
+                short = {other_position for other_position, (other_choose, other) in enumerate(course_choices)
+                         if len(chosen & other) < int(other_choose)}
+                shared = {course: len(overlaps[course] & short) for course in candidates}
+                most_shared = max(shared.values())
+                candidates = {course for course in candidates if shared[course] == most_shared}
+            # sorted, so a seeded run picks the same courses regardless of set order
+            student_selection = rng.choice(sorted(candidates))
+            courses_for_graduation.append(student_selection)
+            chosen.add(student_selection)
+            print(f"\t{student_selection:<20}{'Choice'}")
+    return courses_for_graduation
+
+
+def graduation_closure(required_courses_dict: str, courses_taken, courses_for_graduation: list) -> list:
+    """
+    adds the missing prerequisites of `courses_for_graduation`, see `build_courses_for_graduation`.
+
+    The closure only depends on the courses required and the courses taken, so students with the same
+    requirements, choices and academic history share it.
+
+    Returns
+    ----------
+    list
+                `courses_for_graduation`, extended in place
+    """
+    closures = requirement_table(required_courses_dict)["closures"]
+    key = (tuple(courses_for_graduation), frozenset(courses_taken))
+    added = closures.get(key)
+    if added is None:
+        required_courses_tuple = tuple(courses_for_graduation)
+        build_courses_for_graduation(decode_courses_dict(required_courses_dict), courses_taken,
+                                     courses_for_graduation, required_courses_tuple)
+        added = tuple(courses_for_graduation[len(required_courses_tuple):])
+        if len(closures) >= MAX_CLOSURES:
+            closures.clear()
+        closures[key] = added
+    else:
+        courses_for_graduation.extend(added)
+    return courses_for_graduation
+
+
+def read_time_budget(value) -> float:
+    """
+    reads the constraint engine's time budget posted by the form.
+
+    Parameters
+    ----------
+    value:      str
+                the `scheduler_time_budget` field, in seconds
+    Returns
+    ----------
+    float
+                the budget clamped to `MIN_TIME_BUDGET_SECONDS`..`MAX_TIME_BUDGET_SECONDS`, or None for the
+                engine's default when the field is missing, not a number, not finite or not positive
+    """
+    try:
+        budget = float(value)
+    except (TypeError, ValueError):
+        return None
+    if not math.isfinite(budget) or budget <= 0:
+        return None
+    return min(max(budget, MIN_TIME_BUDGET_SECONDS), MAX_TIME_BUDGET_SECONDS)
+
+
+def read_scheduler_state(form, checkpoint_state=None, rng=None) -> dict:
+    """
+    reads the scheduler variables for a request to `/schedule`.
+
+    For the first semester, the required courses are built from the catalog and the user's academic history.
+    For later semesters, the state is rebuilt from the hidden form fields, unless `checkpoint_state` holds
+    the already-decoded required courses from the previous request.
+
+    Parameters
+    ----------
+    form:               MultiDict
+                        the posted form
+    checkpoint_state:   dict
+                        the state saved after the previous semester, see `checkpoints.take_checkpoint`
+    rng:                random.Random
+                        draws the courses picked from each group; seeded by callers that need the same plan
+                        for the same profile, defaults to the `random` module
+    Returns
+    ----------
+    dict
+                        holds every variable used by `schedule_semesters` and `build_render_info`
+    """
     # pass variables back
-    degree_choice = str(request.form["degree_choice"])
-    course_schedule = json.loads(request.form["course_schedule"])
-    current_semester = request.form["current_semester"]
-    semester = int(request.form["semester_number"])
-    generate_complete_schedule = True if "generate_complete_schedule" in request.form.keys() else False
-    num_3000_replaced_by_cert_core = int(request.form["num_3000_replaced_by_cert_core"])  # default is 0
-    first_semester = request.form["first_semester"]
-    semester_years = json.loads(request.form["semester_years"])
-    user_name = request.form["user_name"]
-    ge_taken = int(request.form["ge_taken"])
-    free_elective_credits_accumulated = int(request.form["fe_taken"])
-    gen_ed_credits_still_needed = int(request.form["gen_ed_credits_still_needed"]) - ge_taken if semester == 0 else int(request.form["gen_ed_credits_still_needed"])
-    cert_elective_courses_still_needed = int(request.form["cert_elective_courses_still_needed"])
-    min_3000_course_still_needed = int(request.form["min_3000_course"])
-    total_credits_accumulated = int(request.form["total_credits"]) if semester != 0 else int(request.form["total_credits"]) + ge_taken + free_elective_credits_accumulated
-
-    # set up default variables (also used for counter on scheduling page)
-    TOTAL_CREDITS_FOR_GRADUATION = 120
-    TOTAL_CREDITS_FOR_BSCS = 71
-    TOTAL_CREDITS_FOR_BSCS_ELECTIVES = 15
-    TOTAL_CREDITS_FOR_GEN_EDS = 27
-    TOTAL_CREDITS_FOR_CERTIFICATE_ELECTIVES = 0 # set in first semester and maintained by request.form in subsequent semesters
-    DEFAULT_CREDIT_HOURS = 3
-    course_categories = {
-        'R': 'BSCS',                # required
-        'E': 'BSCS',                # elective
-        'C': 'BSCS',                # certificate
-        'G': 'General Education',
-        'F': 'Free Elective',
-        'O': 'Other'
-    }
+    degree_choice = str(form["degree_choice"])
+    course_schedule = json.loads(form["course_schedule"])
+    current_semester = form["current_semester"]
+    semester = int(form["semester_number"])
+    generate_complete_schedule = True if "generate_complete_schedule" in form.keys() else False
+    num_3000_replaced_by_cert_core = int(form["num_3000_replaced_by_cert_core"])  # default is 0
+    first_semester = form["first_semester"]
+    semester_years = json.loads(form["semester_years"])
+    user_name = form["user_name"]
+    # the catalog of the year the student entered, picked on the home page and carried between semesters
+    catalog_year = form.get("catalog_year") or CURRENT_CATALOG_YEAR
+    ge_taken = int(form["ge_taken"])
+    free_elective_credits_accumulated = int(form["fe_taken"])
+    gen_ed_credits_still_needed = int(form["gen_ed_credits_still_needed"]) - ge_taken if semester == 0 else int(form["gen_ed_credits_still_needed"])
+    cert_elective_courses_still_needed = int(form["cert_elective_courses_still_needed"])
+    min_3000_course_still_needed = int(form["min_3000_course"])
+    total_credits_accumulated = int(form["total_credits"]) if semester != 0 else int(form["total_credits"]) + ge_taken + free_elective_credits_accumulated
+
+    TOTAL_CREDITS_FOR_CERTIFICATE_ELECTIVES = 0 # set in first semester and maintained by form in subsequent semesters
 
     # user enters credits for upcoming semester
-    min_credits_per_semester = int(request.form["minimum_semester_credits"])
-    summer_credit_count = int(request.form["minimum_summer_credits"])
+    min_credits_per_semester = int(form["minimum_semester_credits"])
+    summer_credit_count = int(form["minimum_summer_credits"])
     temp_min_credits_per_semester = None
 
+    # delivery modes the student can take, checked on the home page and carried between semesters
+    delivery_modes = "".join(form.getlist("delivery_modes"))
+    delivery_modes = "".join(mode for mode in DELIVERY_MODES if mode in delivery_modes) or DELIVERY_MODES
+
+    # scheduling engine picked on the home page and carried between semesters
+    scheduler_engine = form.get("scheduler_engine") if form.get("scheduler_engine") in SCHEDULER_ENGINES else SCHEDULER_ENGINES[0]
+    scheduler_time_budget = read_time_budget(form.get("scheduler_time_budget"))
+
     # set up scheduler variables, and overwritten below
     include_summer = False
     courses_taken = []
@@ -563,94 +921,57 @@ def generate_semester(request): # -> dict[Union[str, Any], Union[Union[str, list
 
     # if the first semester, overwrite schedular variables from above
     if semester == 0:
-        courses_for_graduation = []
-        course_choices_for_graduation = []
         temp_min_credits_per_semester = min_credits_per_semester
 
         # set up semesters list
-        first_semester = request.form["current_semester"]
+        first_semester = form["current_semester"]
         if (first_semester == "Summer"):
             min_credits_per_semester = summer_credit_count
         semester_years = get_semester_years(first_semester)
-        if "include_summer" in request.form.keys():
-            include_summer = True if request.form["include_summer"] == "on" else False
+        if "include_summer" in form.keys():
+            include_summer = True if form["include_summer"] == "on" else False
 
         # set up academic history
-        if ("courses_taken" in request.form.keys()):
-            courses_taken = request.form.getlist("courses_taken")
-        if ("waived_courses" in request.form.keys()):
-            courses_taken.extend(request.form.getlist("waived_courses"))
+        if ("courses_taken" in form.keys()):
+            courses_taken = form.getlist("courses_taken")
+        if ("waived_courses" in form.keys()):
+            courses_taken.extend(form.getlist("waived_courses"))
             courses_taken = list(dict.fromkeys(courses_taken))
-        if ("aleks_check" in request.form.keys()):
+        if ("aleks_check" in form.keys()):
             has_passed_math_placement_exam = True
 
         # determine the semesters that user will be enrolled in
         user_semesters = build_semester_list(current_semester, include_summer)
 
         # generate required courses
-        all_courses_dict = json.loads(request.form['required_courses_dict'])
-        certs_selected = json.loads(request.form["selected_certificates"])
+        all_courses_dict = decode_courses_dict(form['required_courses_dict'])
+        certs_selected = json.loads(form["selected_certificates"])
         certificate_choice = ""
-        cert_xml_tag_list = []
+        certificate_choices = []
 
-        # set up certificate
+        # set up certificates; the last one selected is still kept in `certificate_choice` for its placeholders
         for cert in certs_selected:
             certificate_choice = cert.split(",")
             certificate_choice_name = certificate_choice[0]
             certificate_choice_xml_tag = certificate_choice[1]
-            cert_xml_tag_list.append(certificate_choice_xml_tag)
+            certificate_choices.append(certificate_choice)
 
-        # create list of courses in which user makes a selection from a set
+        # the courses the degree and certificates require, and the groups to choose from, are precomputed
+        requirements = program_requirements(form['required_courses_dict'], degree_choice,
+                                            [tag for _, tag in certificate_choices],
+                                            [name for name, _ in certificate_choices])
         print("BUILD SCHEDULE: ")
-        for k, v in all_courses_dict.items():
-            # if the course is required
-            if "required" in v:
-                major_or_cert = v['required']['major_or_cert']
-                if not isinstance(major_or_cert, list):
-                    major_or_cert = [major_or_cert]
-                for item in major_or_cert:
-                    if item == degree_choice or len(set(cert_xml_tag_list).intersection(v['required_by_major_cert'])):
-                        print(f"\t{k:<20}{item}") if item == degree_choice else None
-                        courses_for_graduation.append(k)
-            # if the course is a part of a user's selection
-            if "selection_group" in v.keys():
-                for program in v["selection_group"]["program"]:
-                    # selections for degree
-                    if program['major_or_cert'] == degree_choice:
-                        course_set = set(program["course_options"]["option"])
-                        num_of_choices = program["choose"]
-                        course_tuple = (num_of_choices, course_set)
-                        if(course_tuple not in course_choices_for_graduation):
-                            course_choices_for_graduation.append(course_tuple)
-                    # selections for certificate electives, if certificate
-                    if certificate_choice and program['major_or_cert'] == certificate_choice[0]:
-                        course_set = set(program["course_options"]["option"])
-                        num_of_choices = program["choose"]
-                        course_tuple = (num_of_choices, course_set)
-                        if(course_tuple not in course_choices_for_graduation):
-                            course_choices_for_graduation.append(course_tuple)
-
-        # iterate through the number of course choices and add to list of courses
-        for course_choice in course_choices_for_graduation:
-            print(f"\nSelect {course_choice[0]} from {course_choice[1]}")
-            intersection = set(courses_for_graduation) & set(course_choice[1])
-            print(f"\tIntersection: {intersection}")
-
-            # only add courses that are necessary (avoid overlap)
-            if len(intersection) >= int(course_choice[0]):
-                print("\tRequirement already satisfied")
-            else:
-                print(f"\tMust now select {int(course_choice[0]) - len(intersection)}")
-                for i in range(int(course_choice[0]) - len(intersection)):
-                    student_selection = random.choice(list(course_choice[1]))
-                    courses_for_graduation.append(student_selection)
-                    print(f"\t{student_selection:<20}{'Choice'}")
-                    course_choice[1].remove(student_selection)
+        for line in requirements["printed"]:
+            print(line)
+        courses_for_graduation = list(requirements["required"])
+
+        # add the courses picked from each group, counting shared courses toward every group
+        select_choice_courses(requirements, courses_for_graduation, rng or random)
 
         # copy
         print("\n\nContinuing...")
-        required_courses_tuple = tuple(copy.deepcopy(courses_for_graduation))
-        build_courses_for_graduation (all_courses_dict, courses_taken, courses_for_graduation, required_courses_tuple)
+        required_courses_tuple = tuple(courses_for_graduation)
+        graduation_closure(form['required_courses_dict'], courses_taken, courses_for_graduation)
 
         # remove University course - INTDSC 1003 - if user has required credits
         if total_credits_accumulated >= 24:
@@ -694,77 +1015,147 @@ def generate_semester(request): # -> dict[Union[str, Any], Union[Union[str, list
             }
             required_courses_dict.update(course_dict)
         required_courses_dict_list = sorted(list(required_courses_dict.items()), key=lambda d: d[1]["course_number"])
-        courses_dict_list_unchanged = copy.deepcopy(required_courses_dict_list)
-        prereqs_for_dict = {}
-
-        for course_data in required_courses_dict.items():
-            prereq_for_list = []
-            key = course_data[0]
-            course = course_data[1]
-            for prereq in course['prerequisite']:
-                if isinstance(prereq, str):
-                    prereq_for_list.append(prereq)
-                else:
-                    prereq_for_list.extend(list(chain.from_iterable(course['prerequisite'])))
-            prereq_for_list = list(set(prereq_for_list))
-            for prereq in prereq_for_list:
-                if prereq not in prereqs_for_dict.keys():
-                    prereqs_for_dict[prereq] = [key]
-                else:
-                    prereqs_for_dict[prereq].append(key)
-        course_prereqs_for = prereqs_for_dict
+        # the scheduler only removes entries from the list and never edits a course, so a shallow copy is enough
+        courses_dict_list_unchanged = list(required_courses_dict_list)
+        # which required courses each course is a prerequisite for, used to re-check dependents after a drag and drop
+        course_prereqs_for = prereqs_for(get_catalog(catalog_year), required_courses_dict.keys())
 
         # testing
-        if certificate_choice:
-            test_schedule(degree_choice, required_courses_dict_list, certificate_choice[0])
-        else:
-            test_schedule(degree_choice, required_courses_dict_list)
+        from app.middleware.test_schedule import test_schedule
+        test_schedule(degree_choice, required_courses_dict_list, *[name for name, _ in certificate_choices])
     # if NOT the first semester
     elif semester != 0:
-        required_courses_dict_list = json.loads(request.form['required_courses_dict_list'])
-        courses_dict_list_unchanged = json.loads(request.form['required_courses_dict_list_unchanged'])
-        course_prereqs_for = json.loads(request.form["course_prereqs_for"])
-        user_semesters = request.form["semesters"]
-        include_summer = True if request.form["include_summer"] == "True" else False
-        temp_min_credits_per_semester = int(request.form["saved_minimum_credits_selection"])
-        is_graduated = True if request.form["is_graduated"] == "True" else False
-        certificate_choice = json.loads(request.form["certificate_choice"])
+        # the decoded required courses can be reused from the previous request's checkpoint
+        if checkpoint_state is not None:
+            required_courses_dict_list = checkpoint_state["required_courses_dict_list"]
+            courses_dict_list_unchanged = checkpoint_state["courses_dict_list_unchanged"]
+            course_prereqs_for = checkpoint_state["course_prereqs_for"]
+            certificate_choice = checkpoint_state["certificate_choice"]
+            certificate_choices = checkpoint_state["certificate_choices"]
+            required_courses_tuple = checkpoint_state["required_courses_tuple"]
+        else:
+            required_courses_dict_list = json.loads(form['required_courses_dict_list'])
+            courses_dict_list_unchanged = json.loads(form['required_courses_dict_list_unchanged'])
+            course_prereqs_for = json.loads(form["course_prereqs_for"])
+            certificate_choice = json.loads(form["certificate_choice"])
+            # schedules saved before several certificates were kept only post the last one
+            if form.get("certificate_choices"):
+                certificate_choices = json.loads(form["certificate_choices"])
+            else:
+                certificate_choices = [certificate_choice] if certificate_choice else []
+            required_courses_tuple = json.loads(form["required_courses_tuple"])
+        user_semesters = form["semesters"]
+        include_summer = True if form["include_summer"] == "True" else False
+        temp_min_credits_per_semester = int(form["saved_minimum_credits_selection"])
+        is_graduated = True if form["is_graduated"] == "True" else False
         if(certificate_choice_name == ""):
             certificate_choice_name = " "
             certificate_choice_xml_tag = " "
         else:
             certificate_choice_name = certificate_choice[0]
             certificate_choice_xml_tag = certificate_choice[1]
-        TOTAL_CREDITS_FOR_CERTIFICATE_ELECTIVES = int(request.form["TOTAL_CREDITS_FOR_CERTIFICATE_ELECTIVES"])
-        if ("courses_taken" in request.form.keys()):
-            courses_taken = json.loads(request.form["courses_taken"])
-        required_courses_tuple = json.loads(request.form["required_courses_tuple"])
-
-    # adjust credit parameters for scheduling
-    credits_for_3000_level = 60  # 3000+ level credits will not be taken before this many credits earned
-
-    # start with a blank semester
-    current_semester_credits = 0
-    current_semester_classes = []
-    current_semester_cs_math_credits_per_semester = 0
-    current_CS_elective_credits_per_semester = 0
-    is_course_generation_complete = False
-
-    # create header for console
-    # if(generate_complete_schedule):
-    #     print(f"{'Min credits Fall/Spring:':<40} {min_credits_per_semester}")
-    #     print(f"{'Min credits for summer:':<40} {summer_credit_count}\n\n")
-    # elif(not generate_complete_schedule):
-    #     print(f"Minimum credits for upcoming semester: {min_credits_per_semester}\n\n")
-    # print(f"Status:\t{'Num:':<15}{'Course Name:':<40} "
-    #       f"{'Cr of Min:':<5}"
-    #       f"{'Total':>15}/{TOTAL_CREDITS_FOR_GRADUATION}:")
-    
+        TOTAL_CREDITS_FOR_CERTIFICATE_ELECTIVES = int(form["TOTAL_CREDITS_FOR_CERTIFICATE_ELECTIVES"])
+        if checkpoint_state is not None:
+            courses_taken = checkpoint_state["courses_taken"]
+        elif ("courses_taken" in form.keys()):
+            courses_taken = json.loads(form["courses_taken"])
 
+    return {
+        "degree_choice": degree_choice,
+        "course_schedule": course_schedule,
+        "current_semester": current_semester,
+        "semester": semester,
+        "generate_complete_schedule": generate_complete_schedule,
+        "num_3000_replaced_by_cert_core": num_3000_replaced_by_cert_core,
+        "first_semester": first_semester,
+        "semester_years": semester_years,
+        "user_name": user_name,
+        "catalog_year": catalog_year,
+        "ge_taken": ge_taken,
+        "free_elective_credits_accumulated": free_elective_credits_accumulated,
+        "gen_ed_credits_still_needed": gen_ed_credits_still_needed,
+        "cert_elective_courses_still_needed": cert_elective_courses_still_needed,
+        "min_3000_course_still_needed": min_3000_course_still_needed,
+        "total_credits_accumulated": total_credits_accumulated,
+        "TOTAL_CREDITS_FOR_CERTIFICATE_ELECTIVES": TOTAL_CREDITS_FOR_CERTIFICATE_ELECTIVES,
+        "min_credits_per_semester": min_credits_per_semester,
+        "summer_credit_count": summer_credit_count,
+        "temp_min_credits_per_semester": temp_min_credits_per_semester,
+        "include_summer": include_summer,
+        "delivery_modes": delivery_modes,
+        "scheduler_engine": scheduler_engine,
+        "scheduler_time_budget": scheduler_time_budget,
+        "courses_taken": courses_taken,
+        "waived_courses": waived_courses,
+        "required_courses_dict_list": required_courses_dict_list,
+        "courses_dict_list_unchanged": courses_dict_list_unchanged,
+        "course_prereqs_for": course_prereqs_for,
+        "user_semesters": user_semesters,
+        "is_graduated": is_graduated,
+        "certificate_choice": certificate_choice,
+        "certificate_choices": certificate_choices,
+        "certificate_choice_name": certificate_choice_name,
+        "certificate_choice_xml_tag": certificate_choice_xml_tag,
+        "required_courses_tuple": required_courses_tuple,
+        # set by `run_scheduler` when the schedule cannot be completed, see `unschedulable_result`
+        "unschedulable": None
+    }
 
-    if not is_graduated:
-        # loop through to generate a semester or a whole schedule
-        while (not is_course_generation_complete):
+
+def schedule_semesters(state: dict):
+    """
+    greedily places courses, yielding each semester as soon as it is complete.
+
+    The scheduler variables are read from `state` when the generator starts and every time it is resumed,
+    and written back to `state` before each semester is yielded, so the caller may adjust the state
+    (i.e. the minimum credits the user picked for the next semester) between semesters.
+
+    Parameters
+    ----------
+    state:      dict
+                the scheduler variables, see `read_scheduler_state`
+    Yields
+    ----------
+    dict
+                the completed semester, as appended to `state["course_schedule"]`
+    """
+    # the credits of catalog courses are read from their records rather than parsed from the posted strings
+    records = get_catalog(state.get("catalog_year"))["records"]
+    while True:
+        # (re)load the scheduler variables
+        generate_complete_schedule = state["generate_complete_schedule"]
+        summer_credit_count = state["summer_credit_count"]
+        include_summer = state["include_summer"]
+        first_semester = state["first_semester"]
+        required_courses_tuple = state["required_courses_tuple"]
+        certificate_choice_xml_tag = state["certificate_choice_xml_tag"]
+        certificate_choice_name = state["certificate_choice_name"]
+        required_courses_dict_list = state["required_courses_dict_list"]
+        courses_taken = state["courses_taken"]
+        course_schedule = state["course_schedule"]
+        current_semester = state["current_semester"]
+        semester = state["semester"]
+        semester_years = state["semester_years"]
+        total_credits_accumulated = state["total_credits_accumulated"]
+        min_credits_per_semester = state["min_credits_per_semester"]
+        temp_min_credits_per_semester = state["temp_min_credits_per_semester"]
+        min_3000_course_still_needed = state["min_3000_course_still_needed"]
+        cert_elective_courses_still_needed = state["cert_elective_courses_still_needed"]
+        gen_ed_credits_still_needed = state["gen_ed_credits_still_needed"]
+        free_elective_credits_accumulated = state["free_elective_credits_accumulated"]
+        is_graduated = state["is_graduated"]
+        offering_filter = build_offering_filter(current_semester, state["delivery_modes"])
+
+        # start with a blank semester
+        current_semester_credits = 0
+        current_semester_classes = []
+        current_semester_cs_math_credits_per_semester = 0
+        current_CS_elective_credits_per_semester = 0
+        is_semester_complete = False
+        is_schedule_complete = False
+
+        # loop through to generate a semester
+        while (not is_semester_complete):
             course_added = False
 
             # adjust credit ratios for scheduling
@@ -776,9 +1167,6 @@ def generate_semester(request): # -> dict[Union[str, Any], Union[Union[str, list
             for index, x in enumerate(required_courses_dict_list):
                 course: str = x[0]  # holds course subject + number
                 course_info: dict = x[1]  # holds all other information about course
-                # print(f"{course=}")
-                # print(f"{course_info['prerequisite']=}")
-                # print(f"{courses_taken=}")
                 concurrent = None
                 if "concurrent" in course_info.keys():
                     concurrent = course_info["concurrent"]
@@ -791,7 +1179,7 @@ def generate_semester(request): # -> dict[Union[str, Any], Union[Union[str, list
                         course_added, current_semester_classes, courses_taken, total_credits_accumulated, current_semester_credits \
                             = add_course(
                             current_semester, course_info, current_semester_classes, course, courses_taken,
-                            total_credits_accumulated, current_semester_credits, course_categories['R'])
+                            total_credits_accumulated, current_semester_credits, course_categories['R'], offering_filter, records)
 
                     # if the course has at least one pre-requisite
                     else:
@@ -806,11 +1194,11 @@ def generate_semester(request): # -> dict[Union[str, Any], Union[Union[str, list
                             if isinstance(prereqs, str):
                                 # ENGLISH 3130 has a special prerequisite of at least 48 credit hours before the class can be taken
                                 if (course == "ENGLISH 3130"):
-                                    if (total_credits_accumulated >= 48) and (prereqs in courses_taken):
+                                    if (total_credits_accumulated >= credits_for_english_3130) and (prereqs in courses_taken):
                                         course_added, current_semester_classes, courses_taken, total_credits_accumulated, current_semester_credits \
                                             = add_course(
                                             current_semester, course_info, current_semester_classes, course, courses_taken,
-                                            total_credits_accumulated, current_semester_credits, course_categories['R']
+                                            total_credits_accumulated, current_semester_credits, course_categories['R'], offering_filter, records
                                         )
                                         break
 
@@ -833,7 +1221,7 @@ def generate_semester(request): # -> dict[Union[str, Any], Union[Union[str, list
                                             or (prereqs[0] == concurrent)):
                                         course_added, current_semester_classes, courses_taken, total_credits_accumulated, current_semester_credits = add_course(
                                             current_semester, course_info, current_semester_classes, course, courses_taken,
-                                            total_credits_accumulated, current_semester_credits, course_categories['R']
+                                            total_credits_accumulated, current_semester_credits, course_categories['R'], offering_filter, records
                                         )
                                         break
 
@@ -854,23 +1242,20 @@ def generate_semester(request): # -> dict[Union[str, Any], Union[Union[str, list
                                     if required_courses_taken:
                                         course_added, current_semester_classes, courses_taken, total_credits_accumulated, current_semester_credits = add_course(
                                             current_semester, course_info, current_semester_classes, course, courses_taken,
-                                            total_credits_accumulated, current_semester_credits, course_categories['R']
+                                            total_credits_accumulated, current_semester_credits, course_categories['R'], offering_filter, records
                                         )
                                         required_courses_taken = False
                                         break
                         if required_courses_taken:
                             course_added, current_semester_classes, courses_taken, total_credits_accumulated, current_semester_credits = add_course(
                                 current_semester, course_info, current_semester_classes, course, courses_taken,
-                                total_credits_accumulated, current_semester_credits, course_categories['R']
+                                total_credits_accumulated, current_semester_credits, course_categories['R'], offering_filter, records
                             )
 
                     # if the course was added, update semester info
                     if course_added:
-                        current_semester_cs_math_credits_per_semester += int(course_info['credit'])
-                        # print(f"Added: \t{course:<15}{course_info['course_name'][:40]:<40} "
-                        #     f"{current_semester_credits:<2} of {min_credits_per_semester:<2}"
-                        #     f"{total_credits_accumulated:>15}")
-                        
+                        current_semester_cs_math_credits_per_semester += course_credits(course, course_info, records)
+
                         is_graduated = graduation_check(
                                 total_credits_accumulated, required_courses_tuple,
                                 courses_taken, min_3000_course_still_needed,
@@ -886,26 +1271,18 @@ def generate_semester(request): # -> dict[Union[str, Any], Union[Union[str, list
                                 'year': semester_years[current_semester]
                             }
                             course_schedule.append(current_semester_info)
-
-                            # if only generating a semester stop here
-                            if not generate_complete_schedule:
-                                is_course_generation_complete = True
+                            is_semester_complete = True
 
                             # reset semester info
-                            current_semester_credits = 0
-                            current_semester_classes = []
                             semester += 1
-                            current_semester_cs_math_credits_per_semester = 0
-                            current_CS_elective_credits_per_semester = 0
                             current_semester = update_semester(current_semester, include_summer)
 
                             if is_graduated and generate_complete_schedule:
-                                is_course_generation_complete = True
+                                is_schedule_complete = True
                                 break
                             else:
                                 if(current_semester == first_semester):
                                     semester_years = {key: value + 1 for key, value in semester_years.items()}
-                                    # print(f"\nNext Semester, {current_semester} {semester_years[current_semester]}")
                                 # ensure summer credit hours are not F/Sp credit hours
                                 if (current_semester == "Summer" and generate_complete_schedule):
                                     min_credits_per_semester = summer_credit_count
@@ -915,216 +1292,380 @@ def generate_semester(request): # -> dict[Union[str, Any], Union[Union[str, list
                         required_courses_dict_list.pop(index)
                         break
 
+            if is_semester_complete:
+                break
+
             # second, if a required course was NOT added above, add some kind of elective
             if (not course_added):
-                # if user CANNOT take 3000+ level class, due to needing more credit
-                if total_credits_accumulated < credits_for_3000_level:
-                    if gen_ed_credits_still_needed >= DEFAULT_CREDIT_HOURS:
-                        current_semester_classes.append(add_gen_ed_elective())
-                        gen_ed_credits_still_needed -= DEFAULT_CREDIT_HOURS
-                        # print(f"Added: \t{'GEN ED':<15}{'[User Selects]':<40} "
-                        #     f"{current_semester_credits + 3:<2} of {min_credits_per_semester:<2}"
-                        #     f"{total_credits_accumulated + 3:>15}")
+                # adding electives never adds a required course to `courses_taken`, so no required course can be
+                # added until the semester is complete or the credits pass a threshold a required course checks;
+                # the electives until then are added here at once instead of rescanning the required courses for each
+                required_course_still_needed = next((course for course in required_courses_tuple if course not in courses_taken), None)
+                required_courses_still_needed = (required_course_still_needed,) if required_course_still_needed else ()
+                while True:
+                    # if user CANNOT take 3000+ level class, due to needing more credit
+                    if total_credits_accumulated < credits_for_3000_level:
+                        if gen_ed_credits_still_needed >= DEFAULT_CREDIT_HOURS:
+                            current_semester_classes.append(add_gen_ed_elective())
+                            gen_ed_credits_still_needed -= DEFAULT_CREDIT_HOURS
+                        else:
+                            current_semester_classes.append(add_free_elective())
+                            free_elective_credits_accumulated += DEFAULT_CREDIT_HOURS
+                    # if user CAN take 3000+ level classes
                     else:
-                        current_semester_classes.append(add_free_elective())
-                        free_elective_credits_accumulated += DEFAULT_CREDIT_HOURS
-                        # print(f"Added: \t{'FREE ELEC':<15}{'[User Selects]':<40} "
-                        #     f"{current_semester_credits + 3:<2} of {min_credits_per_semester:<2}"
-                        #     f"{total_credits_accumulated + 3:>15}")
-                # if user CAN take 3000+ level classes
-                else:
-                    # user elects for a certificate
-                    if certificate_choice_xml_tag != "":
-                        """
-                        check to ensure enough room is in schedule for another CMP SCI class based on 4 conditions:
-                            1. The amount of CMP SCI 3000 elective credit is less than pre-determined maximum
-                            2. Total credit count of CS/MATH is less than pre-determined maximum 
-                            3. There are still CMP SCI 3000 electives to take
-                            4. There are still certificate electives to take
-
-                        if all 4 four conditions fail, add a General Education elective or Free Elective
-                        """
-                        # condition 1 and 2
-                        if (current_CS_elective_credits_per_semester <= (max_CS_elective_credits_per_semester - 3)) and \
-                                (current_semester_cs_math_credits_per_semester <= (max_CS_math_total_credits - 3) or \
-                                 (max_CS_math_total_credits - 3) <= 0):
-                            # condition 3: if non-elective 3000-level courses are still needed, add these primarily
-                            if min_3000_course_still_needed > 0:
+                        # user elects for a certificate
+                        if certificate_choice_xml_tag != "":
+                            """
+                            check to ensure enough room is in schedule for another CMP SCI class based on 4 conditions:
+                                1. The amount of CMP SCI 3000 elective credit is less than pre-determined maximum
+                                2. Total credit count of CS/MATH is less than pre-determined maximum
+                                3. There are still CMP SCI 3000 electives to take
+                                4. There are still certificate electives to take
+
+                            if all 4 four conditions fail, add a General Education elective or Free Elective
+                            """
+                            # condition 1 and 2
+                            if (current_CS_elective_credits_per_semester <= (max_CS_elective_credits_per_semester - 3)) and \
+                                    (current_semester_cs_math_credits_per_semester <= (max_CS_math_total_credits - 3) or \
+                                     (max_CS_math_total_credits - 3) <= 0):
+                                # condition 3: if non-elective 3000-level courses are still needed, add these primarily
+                                if min_3000_course_still_needed > 0:
+                                    current_semester_classes.append({
+                                            'course': "CMP SCI 3000+",
+                                            'name': '[User Selects]',
+                                            'description': '',
+                                            'credits': 3,
+                                            'category': 'CS Elective',
+                                            'passed_validation': True
+                                        })
+
+                                    # increment current semester credits, decrement courses needed
+                                    current_semester_cs_math_credits_per_semester += DEFAULT_CREDIT_HOURS
+                                    current_CS_elective_credits_per_semester += DEFAULT_CREDIT_HOURS
+                                    min_3000_course_still_needed -= 1
+
+                                # condition 4: if elective 3000-level courses are still needed, add these secondarily
+                                elif cert_elective_courses_still_needed > 0:
+                                    current_semester_classes.append({
+                                            'course': f"CMP SCI {certificate_choice_name} Elective",
+                                            'name': '[User Selects]',
+                                            'description': '',
+                                            'credits': 3,
+                                            'category': course_categories['C'],
+                                            'passed_validation': True
+                                        })
+
+                                    # increment current semester credits, decrement courses needed
+                                    current_semester_cs_math_credits_per_semester += DEFAULT_CREDIT_HOURS
+                                    current_CS_elective_credits_per_semester += DEFAULT_CREDIT_HOURS
+                                    cert_elective_courses_still_needed -= 1
+
+                                # all 4 conditions fail.
+                                # add a general education elective
+                                elif gen_ed_credits_still_needed > 0:
+                                    current_semester_classes.append(add_gen_ed_elective())
+                                    gen_ed_credits_still_needed -= DEFAULT_CREDIT_HOURS
+                                # add a free elective
+                                else:
+                                    current_semester_classes.append(add_free_elective())
+                                    free_elective_credits_accumulated += DEFAULT_CREDIT_HOURS
+
+                            # if condition 1 or 2 fail, add a type of elective for balance
+                            else:
+                                if gen_ed_credits_still_needed > 0:
+                                    current_semester_classes.append(add_gen_ed_elective())
+                                    gen_ed_credits_still_needed -= DEFAULT_CREDIT_HOURS
+                                else:
+                                    current_semester_classes.append(add_free_elective())
+                                    free_elective_credits_accumulated += DEFAULT_CREDIT_HOURS
+
+
+                        # user does NOT elect for a certificate
+                        elif certificate_choice_xml_tag == "":
+                            """
+                            check to ensure enough room is in schedule for another CMP SCI class based on 3 conditions:
+                                1. There are still CMP SCI 3000 electives to take
+                                2. The amount of CMP SCI 3000 elective credit is less than pre-determined maximum
+                                3. Total credit count of CS/MATH is less than pre-determined maximum
+                            """
+                            # condition 1, 2, and 3
+                            if min_3000_course_still_needed > 0 and \
+                                    (current_CS_elective_credits_per_semester <= (max_CS_elective_credits_per_semester - 3)) and \
+                                    (current_semester_cs_math_credits_per_semester <= (max_CS_math_total_credits - 3) or \
+                                     (max_CS_math_total_credits - 3) <= 0):
                                 current_semester_classes.append({
-                                        'course': "CMP SCI 3000+",
-                                        'name': '[User Selects]',
-                                        'description': '',
-                                        'credits': 3,
-                                        'category': 'CS Elective',
-                                        'passed_validation': True
-                                    })
-
-                                # increment current semester credits, decrement courses needed
+                                    'course': "CMP SCI 3000+",
+                                    'name': '[User Selects]',
+                                    'description': '',
+                                    'credits': 3,
+                                    'category': course_categories['E'],
+                                    'passed_validation': True
+                                })
                                 current_semester_cs_math_credits_per_semester += DEFAULT_CREDIT_HOURS
                                 current_CS_elective_credits_per_semester += DEFAULT_CREDIT_HOURS
                                 min_3000_course_still_needed -= 1
-                                # print(f"Added: \t{'COMP SCI 3000+':<15}{'[User Selects]':<40} "
-                                #     f"{current_semester_credits + 3:<2} of {min_credits_per_semester:<2}"
-                                #     f"{total_credits_accumulated + 3:>15}")
 
-                            # condition 4: if elective 3000-level courses are still needed, add these secondarily
-                            elif cert_elective_courses_still_needed > 0:
-                                current_semester_classes.append({
-                                        'course': f"CMP SCI {certificate_choice_name} Elective",
-                                        'name': '[User Selects]',
-                                        'description': '',
-                                        'credits': 3,
-                                        'category': course_categories['C'],
-                                        'passed_validation': True
-                                    })
-
-                                # increment current semester credits, decrement courses needed
-                                current_semester_cs_math_credits_per_semester += DEFAULT_CREDIT_HOURS
-                                current_CS_elective_credits_per_semester += DEFAULT_CREDIT_HOURS
-                                cert_elective_courses_still_needed -= 1
-                                # print(f"Added: \t{'CMP SCI CERT':<15}{'[User Selects]':<40} "
-                                #     f"{current_semester_credits + 3:<2} of {min_credits_per_semester:<2}"
-                                #     f"{total_credits_accumulated + 3:>15}")
-
-                            # all 4 conditions fail.
-                            # add a general education elective
-                            elif gen_ed_credits_still_needed > 0:
-                                current_semester_classes.append(add_gen_ed_elective())
-                                # print(f"Added: \t{'GEN ED':<15}{'[User Selects]':<40} "
-                                #     f"{current_semester_credits + 3:<2} of {min_credits_per_semester:<2}"
-                                #     f"{total_credits_accumulated + 3:>15}")
-                                gen_ed_credits_still_needed -= DEFAULT_CREDIT_HOURS
-                            # add a free elective
+                            # if condition 1, 2, or 3 fail, add a type of elective for balance
                             else:
-                                current_semester_classes.append(add_free_elective())
-                                free_elective_credits_accumulated += DEFAULT_CREDIT_HOURS
-                                # print(f"Added: \t{'FREE ELEC':<15}{'[User Selects]':<40} " 
-                                #     f"{current_semester_credits + 3:<2} of {min_credits_per_semester:<2}" 
-                                #     f"{total_credits_accumulated + 3:>15}")
+                                if gen_ed_credits_still_needed > 0:
+                                    current_semester_classes.append(add_gen_ed_elective())
+                                    gen_ed_credits_still_needed -= DEFAULT_CREDIT_HOURS
+                                else:
+                                    current_semester_classes.append(add_free_elective())
+                                    free_elective_credits_accumulated += DEFAULT_CREDIT_HOURS
+
+                    # regardless of the type of elective, add the credits
+                    total_credits_accumulated = total_credits_accumulated + DEFAULT_CREDIT_HOURS
+                    current_semester_credits = current_semester_credits + DEFAULT_CREDIT_HOURS
+
+                    is_graduated = graduation_check(
+                                    total_credits_accumulated, required_courses_still_needed,
+                                    courses_taken, min_3000_course_still_needed,
+                                    cert_elective_courses_still_needed, gen_ed_credits_still_needed)
+
+                    # if current semester is fully generated or generating the whole schedule and has graduated, then stop generation
+                    if (current_semester_credits >= min_credits_per_semester) or (generate_complete_schedule and is_graduated):
+                        current_semester_info = {
+                            'semester': current_semester,
+                            'semester_number': semester,
+                            'credits': current_semester_credits,
+                            'schedule': current_semester_classes,
+                            'year': semester_years[current_semester]
+                        }
+                        course_schedule.append(current_semester_info)
+                        is_semester_complete = True
+
+                        # reset semester info
+                        semester += 1
+                        current_semester = update_semester(current_semester, include_summer)
+
+                        if(current_semester == first_semester):
+                            semester_years = {key: value + 1 for key, value in semester_years.items()}
+                        # ensure summer credit hours are not F/Sp credit hours
+                        if (current_semester == "Summer" and generate_complete_schedule):
+                            min_credits_per_semester = summer_credit_count
+                        elif (current_semester != "Summer" and generate_complete_schedule):
+                            min_credits_per_semester = temp_min_credits_per_semester
+
+                        if is_graduated and generate_complete_schedule:
+                            is_schedule_complete = True
+                        break
 
-                        # if condition 1 or 2 fail, add a type of elective for balance
-                        else:
-                            if gen_ed_credits_still_needed > 0:
-                                current_semester_classes.append(add_gen_ed_elective())
-                                gen_ed_credits_still_needed -= DEFAULT_CREDIT_HOURS
-                                # print(f"Added: \t{'GEN ED':<15}{'[User Selects]':<40} "
-                                #     f"{current_semester_credits + 3:<2} of {min_credits_per_semester:<2}"
-                                #    f"{total_credits_accumulated + 3:>15}")
-                            else:
-                                current_semester_classes.append(add_free_elective())
-                                free_elective_credits_accumulated += DEFAULT_CREDIT_HOURS
-                                # print(f"Added: \t{'FREE ELEC':<15}{'[User Selects]':<40} "
-                                #     f"{current_semester_credits + 3:<2} of {min_credits_per_semester:<2}"
-                                #     f"{total_credits_accumulated + 3:>15}")
-
-
-                    # user does NOT elect for a certificate
-                    elif certificate_choice_xml_tag == "":
-                        """
-                        check to ensure enough room is in schedule for another CMP SCI class based on 3 conditions:
-                            1. There are still CMP SCI 3000 electives to take
-                            2. The amount of CMP SCI 3000 elective credit is less than pre-determined maximum
-                            3. Total credit count of CS/MATH is less than pre-determined maximum 
-                        """
-                        # condition 1, 2, and 3
-                        if min_3000_course_still_needed > 0 and \
-                                (current_CS_elective_credits_per_semester <= (max_CS_elective_credits_per_semester - 3)) and \
-                                (current_semester_cs_math_credits_per_semester <= (max_CS_math_total_credits - 3) or \
-                                 (max_CS_math_total_credits - 3) <= 0):
-                            current_semester_classes.append({
-                                'course': "CMP SCI 3000+",
-                                'name': '[User Selects]',
-                                'description': '',
-                                'credits': 3,
-                                'category': course_categories['E'],
-                                'passed_validation': True
-                            })
-                            current_semester_cs_math_credits_per_semester += DEFAULT_CREDIT_HOURS
-                            current_CS_elective_credits_per_semester += DEFAULT_CREDIT_HOURS
-                            min_3000_course_still_needed -= 1
-                            # print(f"Added: \t{'CMP SCI 3000+':<15}{'[User Selects]':<40} "
-                            #     f"{current_semester_credits + 3:<2} of {min_credits_per_semester:<2}"
-                            #     f"{total_credits_accumulated + 3:>15}")
-
-                        # if condition 1, 2, or 3 fail, add a type of elective for balance
-                        else:
-                            if gen_ed_credits_still_needed > 0:
-                                current_semester_classes.append(add_gen_ed_elective())
-                                gen_ed_credits_still_needed -= DEFAULT_CREDIT_HOURS
-                                # print(f"Added: \t{'GEN ED':<15}{'[User Selects]':<40} "
-                                #     f"{current_semester_credits + 3:<2} of {min_credits_per_semester:<2}"
-                                #     f"{total_credits_accumulated + 3:>15}")
-                            else:
-                                current_semester_classes.append(add_free_elective())
-                                free_elective_credits_accumulated += DEFAULT_CREDIT_HOURS
-                                # print(f"Added: \t{'FREE ELEC':<15}{'[User Selects]':<40} "
-                                    # f"{current_semester_credits + 3:<2} of {min_credits_per_semester:<2}"
-                                    # f"{total_credits_accumulated + 3:>15}")
+                    # ENGLISH 3130 may be added once enough credits are earned, so look at the required courses again
+                    if total_credits_accumulated - DEFAULT_CREDIT_HOURS < credits_for_english_3130 <= total_credits_accumulated:
+                        break
 
-                # regardless of the type of elective, add the credits
-                total_credits_accumulated = total_credits_accumulated + DEFAULT_CREDIT_HOURS
-                current_semester_credits = current_semester_credits + DEFAULT_CREDIT_HOURS
+        # save the scheduler variables so the caller can render or checkpoint them
+        state.update({
+            "required_courses_dict_list": required_courses_dict_list,
+            "courses_taken": courses_taken,
+            "course_schedule": course_schedule,
+            "current_semester": current_semester,
+            "semester": semester,
+            "semester_years": semester_years,
+            "total_credits_accumulated": total_credits_accumulated,
+            "min_credits_per_semester": min_credits_per_semester,
+            "temp_min_credits_per_semester": temp_min_credits_per_semester,
+            "min_3000_course_still_needed": min_3000_course_still_needed,
+            "cert_elective_courses_still_needed": cert_elective_courses_still_needed,
+            "gen_ed_credits_still_needed": gen_ed_credits_still_needed,
+            "free_elective_credits_accumulated": free_elective_credits_accumulated,
+            "is_graduated": is_graduated
+        })
+        yield course_schedule[-1]
 
-                is_graduated = graduation_check(
-                                total_credits_accumulated, required_courses_tuple,
-                                courses_taken, min_3000_course_still_needed,
-                                cert_elective_courses_still_needed, gen_ed_credits_still_needed)
+        if is_schedule_complete:
+            return
 
-                # if current semester is fully generated or generating the whole schedule and has graduated, then stop generation
-                if (current_semester_credits >= min_credits_per_semester) or (generate_complete_schedule and is_graduated):
-                    current_semester_info = {
-                        'semester': current_semester,
-                        'semester_number': semester,
-                        'credits': current_semester_credits,
-                        'schedule': current_semester_classes,
-                        'year': semester_years[current_semester]
-                    }
-                    course_schedule.append(current_semester_info)
-
-                    # if only generating a semester stop here
-                    if not generate_complete_schedule:
-                        is_course_generation_complete = True
-
-                    # reset semester info
-                    current_semester_credits = 0
-                    current_semester_classes = []
-                    semester += 1
-                    current_semester_cs_math_credits_per_semester = 0
-                    current_CS_elective_credits_per_semester = 0
-                    current_semester = update_semester(current_semester, include_summer)
-
-                    if(current_semester == first_semester):
-                        semester_years = {key: value + 1 for key, value in semester_years.items()}
-                        # print(f"\nNext Semester, {current_semester} {semester_years[current_semester]}")
-                    # ensure summer credit hours are not F/Sp credit hours
-                    if (current_semester == "Summer" and generate_complete_schedule):
-                        min_credits_per_semester = summer_credit_count
-                    elif (current_semester != "Summer" and generate_complete_schedule):
-                        min_credits_per_semester = temp_min_credits_per_semester
-
-                    if is_graduated and generate_complete_schedule:
-                        is_course_generation_complete = True
-                        break
+
+def add_empty_semester(state: dict) -> None:
+    # If generating new semester after graduation requirements complete, generate empty semester
+    current_semester_info = {
+        'semester': state["current_semester"],
+        'semester_number': state["semester"],
+        'credits': 0,
+        'schedule': [],
+        'year': state["semester_years"][state["current_semester"]]
+    }
+    state["course_schedule"].append(current_semester_info)
+
+    state["semester"] += 1
+    state["current_semester"] = update_semester(state["current_semester"], state["include_summer"])
+
+    if(state["current_semester"] == state["first_semester"]):
+        state["semester_years"] = {key: value + 1 for key, value in state["semester_years"].items()}
+
+
+def copy_state(state: dict) -> dict:
+    # the scheduler only appends to and removes from the lists in its state, so copying them is enough to undo semesters
+    return {key: list(value) if isinstance(value, list) else dict(value) if isinstance(value, dict) else value
+            for key, value in state.items()}
+
+
+def schedule_timeout(state: dict) -> float:
+    # the constraint engine searches for its whole plan before the first semester, within its own time budget;
+    # the budget is clamped again so a state not read from a form cannot make the deadline infinite
+    if state["scheduler_engine"] == "constraint":
+        from app.middleware.constraint_scheduler import DEFAULT_TIME_BUDGET_SECONDS
+        return FULL_SCHEDULE_TIMEOUT_SECONDS + (read_time_budget(state["scheduler_time_budget"]) or DEFAULT_TIME_BUDGET_SECONDS)
+    return FULL_SCHEDULE_TIMEOUT_SECONDS
+
+
+def semester_generator(state: dict):
+    # imported here since the constraint engine builds on this module
+    if state["scheduler_engine"] == "constraint":
+        from app.middleware.constraint_scheduler import constraint_schedule_semesters
+        return constraint_schedule_semesters(state)
+    return schedule_semesters(state)
+
+
+def blocking_courses(state: dict) -> list:
+    """
+    finds the required courses still needed that the scheduler can never place.
+
+    A course is blocked when it is not offered in any term the student schedules, or when every one of
+    its prerequisite options needs a course that is not in the catalog, is not in the plan, or is blocked
+    itself. If no course is blocked, every required course still needed is returned as not placed.
+
+    Parameters
+    ----------
+    state:      dict
+                the scheduler variables, see `read_scheduler_state`
+    Returns
+    ----------
+    list
+                {"course": ..., "reason": ...} per course, each after the courses that block it
+    """
+    courses_taken = set(state["courses_taken"])
+    still_needed = [(course, course_info) for course, course_info in state["required_courses_dict_list"]
+                    if course not in courses_taken]
+    still_needed_keys = {course for course, _ in still_needed}
+    catalog_courses = get_catalog(state["catalog_year"])["courses"]
+    terms = [term for term in OFFERING_TERMS if term != "Summer" or state["include_summer"]]
+
+    def prerequisite_problem(prereq, blocked):
+        if prereq in courses_taken:
+            return None
+        if prereq in blocked:
+            return f"needs {prereq}"
+        if prereq not in catalog_courses:
+            return f"prerequisite {prereq} is not in the catalog"
+        if prereq not in still_needed_keys:
+            return f"prerequisite {prereq} is not in the plan"
+        return None
+
+    blocked = {}
+    # a course is only blocked by courses before it in the dependency chain, so repeat until nothing changes
+    changed = True
+    while changed:
+        changed = False
+        for course, course_info in still_needed:
+            if course in blocked:
+                continue
+            reason = None
+            if not any(is_offered(term, course_info, build_offering_filter(term, state["delivery_modes"])) for term in terms):
+                reason = f"not offered in {' or '.join(terms)}"
+            else:
+                problems = [next(filter(None, (prerequisite_problem(prereq, blocked) for prereq in option)), None)
+                            for option in prerequisite_options(compile_prerequisites(course_info["prerequisite"]))]
+                if problems and all(problems):
+                    reason = problems[0]
+            if reason:
+                blocked[course] = reason
+                changed = True
+
+    if not blocked:
+        blocked = {course: "not placed" for course, _ in still_needed}
+    return [{"course": course, "reason": reason} for course, reason in blocked.items()]
+
+
+def unschedulable_result(state: dict, cause: str) -> dict:
+    """
+    explains why a schedule could not be completed.
+
+    Parameters
+    ----------
+    state:      dict
+                the scheduler variables, see `read_scheduler_state`
+    cause:      str
+                what stopped the scheduler, i.e. the term limit
+    Returns
+    ----------
+    dict
+                reason:             "unschedulable: " the cause and the blocking courses
+                blocking_courses:   see `blocking_courses`
+    """
+    blocking = blocking_courses(state)
+    reason = f"unschedulable: {cause}"
+    if blocking:
+        reason += "; " + "; ".join(f"{course['course']} {course['reason']}" for course in blocking)
+    return {"reason": reason, "blocking_courses": blocking}
+
+
+def run_scheduler(state: dict, generator=None):
+    """
+    generates one semester, or the whole schedule if `state["generate_complete_schedule"]`.
+
+    A schedule that has not graduated after `MAX_SCHEDULE_TERMS` terms, or a full schedule that takes
+    longer than `FULL_SCHEDULE_TIMEOUT_SECONDS`, is stopped and `state["unschedulable"]` is set.
+
+    Parameters
+    ----------
+    state:      dict
+                the scheduler variables, see `read_scheduler_state`
+    generator:  generator
+                a suspended `schedule_semesters` generator for `state` to resume from, if any
+    Returns
+    ----------
+    generator
+                the suspended generator after one semester, or None if there is nothing to resume
+    """
+    if not state["is_graduated"]:
+        if generator is None:
+            generator = semester_generator(state)
+        if state["generate_complete_schedule"]:
+            deadline = time.monotonic() + schedule_timeout(state)
+            for _ in generator:
+                if state["is_graduated"]:
+                    continue
+                if len(state["course_schedule"]) >= MAX_SCHEDULE_TERMS:
+                    state["unschedulable"] = unschedulable_result(state, f"not graduated after {MAX_SCHEDULE_TERMS} terms")
+                    break
+                if time.monotonic() > deadline:
+                    state["unschedulable"] = unschedulable_result(state, f"not graduated within {schedule_timeout(state):g}s")
+                    break
+            generator = None
+        else:
+            next(generator)
+            if not state["is_graduated"] and len(state["course_schedule"]) >= MAX_SCHEDULE_TERMS:
+                state["unschedulable"] = unschedulable_result(state, f"not graduated after {MAX_SCHEDULE_TERMS} terms")
     else:
-        # If generating new semester after graduation requirements complete, generate empty semester
-        current_semester_info = {
-            'semester': current_semester,
-            'semester_number': semester,
-            'credits': current_semester_credits,
-            'schedule': current_semester_classes,
-            'year': semester_years[current_semester]
-        }
-        course_schedule.append(current_semester_info)
+        add_empty_semester(state)
 
-        semester += 1
-        current_semester = update_semester(current_semester, include_summer)
+    if (state["current_semester"] != "Summer" and not state["generate_complete_schedule"]):
+        state["min_credits_per_semester"] = state["temp_min_credits_per_semester"]
+    return generator
 
-        if(current_semester == first_semester):
-                            semester_years = {key: value + 1 for key, value in semester_years.items()}
-                            # print(f"\nNext Semester, {current_semester} {semester_years[current_semester]}")
 
-    if (current_semester != "Summer" and not generate_complete_schedule):
-        min_credits_per_semester = temp_min_credits_per_semester
+def build_render_info(state: dict) -> dict:
+    """
+    builds the variables rendered on the schedule page (and saved by `download_schedule`).
+
+    Parameters
+    ----------
+    state:      dict
+                the scheduler variables, see `read_scheduler_state`
+    Returns
+    ----------
+    dict
+    """
+    current_semester = state["current_semester"]
+    is_graduated = state["is_graduated"]
+    gen_ed_credits_still_needed = state["gen_ed_credits_still_needed"]
+    cert_elective_courses_still_needed = state["cert_elective_courses_still_needed"]
+    min_3000_course_still_needed = state["min_3000_course_still_needed"]
+    num_3000_replaced_by_cert_core = state["num_3000_replaced_by_cert_core"]
+    TOTAL_CREDITS_FOR_CERTIFICATE_ELECTIVES = state["TOTAL_CREDITS_FOR_CERTIFICATE_ELECTIVES"]
 
     minimum_semester_credits = None
 
@@ -1142,38 +1683,155 @@ def generate_semester(request): # -> dict[Union[str, Any], Union[Union[str, list
     modified_accumulated_3000 = (modified_total_for_3000 -(min_3000_course_still_needed*DEFAULT_CREDIT_HOURS))
 
     return {
-        "required_courses_dict_list": json.dumps(required_courses_dict_list),
-        "required_courses_dict_list_unchanged": json.dumps(courses_dict_list_unchanged),
-        "semesters": user_semesters,
-        "total_credits": total_credits_accumulated,
-        "course_schedule": json.dumps(course_schedule),
-        "course_schedule_display": course_schedule,
-        "courses_taken": json.dumps(courses_taken),
-        "list_of_required_courses_taken_display": courses_taken,
-        "semester_number": semester,
-        "waived_courses": waived_courses,
+        "required_courses_dict_list": json.dumps(state["required_courses_dict_list"]),
+        "required_courses_dict_list_unchanged": json.dumps(state["courses_dict_list_unchanged"]),
+        "semesters": state["user_semesters"],
+        "total_credits": state["total_credits_accumulated"],
+        "course_schedule": json.dumps(state["course_schedule"]),
+        "course_schedule_display": state["course_schedule"],
+        "courses_taken": json.dumps(state["courses_taken"]),
+        "list_of_required_courses_taken_display": state["courses_taken"],
+        "semester_number": state["semester"],
+        "waived_courses": state["waived_courses"],
         "current_semester": current_semester,
         "minimum_semester_credits": minimum_semester_credits,
         "min_3000_course": min_3000_course_still_needed,
-        "include_summer": include_summer,
-        "certificate_choice": json.dumps(certificate_choice),
-        "certificates_display": certificate_choice,
+        "include_summer": state["include_summer"],
+        "delivery_modes": state["delivery_modes"],
+        "scheduler_engine": state["scheduler_engine"],
+        "scheduler_time_budget": state["scheduler_time_budget"] or "",
+        "certificate_choice": json.dumps(state["certificate_choice"]),
+        "certificate_choices": json.dumps(state["certificate_choices"]),
+        "certificates_display": [name for name, _ in state["certificate_choices"]],
         "num_3000_replaced_by_cert_core": num_3000_replaced_by_cert_core,
         "cert_elective_courses_still_needed": cert_elective_courses_still_needed,
         "TOTAL_CREDITS_FOR_CERTIFICATE_ELECTIVES": TOTAL_CREDITS_FOR_CERTIFICATE_ELECTIVES,
-        "saved_minimum_credits_selection": min_credits_per_semester,
+        "saved_minimum_credits_selection": state["min_credits_per_semester"],
         "gen_ed_credits_still_needed": gen_ed_credits_still_needed,
-        "full_schedule_generation": generate_complete_schedule,
-        "minimum_summer_credits": summer_credit_count,
-        "first_semester": first_semester,
-        "semester_years": json.dumps(semester_years),
-        "semester_years_display": semester_years,
-        "course_prereqs_for": json.dumps(course_prereqs_for),
-        "user_name": user_name,
-        "fe_taken": free_elective_credits_accumulated,
-        "ge_taken": ge_taken,
-        "degree_choice": degree_choice,
+        "full_schedule_generation": state["generate_complete_schedule"],
+        "minimum_summer_credits": state["summer_credit_count"],
+        "first_semester": state["first_semester"],
+        "semester_years": json.dumps(state["semester_years"]),
+        "semester_years_display": state["semester_years"],
+        "course_prereqs_for": json.dumps(state["course_prereqs_for"]),
+        "user_name": state["user_name"],
+        "catalog_year": state["catalog_year"],
+        "fe_taken": state["free_elective_credits_accumulated"],
+        "ge_taken": state["ge_taken"],
+        "degree_choice": state["degree_choice"],
         "is_graduated": is_graduated,
-        "required_courses_tuple": json.dumps(required_courses_tuple),
-        "required_courses_tuple_display": required_courses_tuple
+        "required_courses_tuple": json.dumps(state["required_courses_tuple"]),
+        "required_courses_tuple_display": state["required_courses_tuple"],
+        "unschedulable": state["unschedulable"]
     }
+
+
+def generate_semester(request): # -> dict[Union[str, Any], Union[Union[str, list, int, list[Any], None], Any]]:
+    """
+    generates the next semester (or the whole schedule) for a request to `/schedule`.
+
+    In semester-by-semester mode, the suspended scheduler is checkpointed after each semester, and the
+    next "Continue Schedule" request resumes from it instead of rebuilding the state from the form. With
+    `SCHEDULER_WATCHDOG` set, a full schedule is generated in a worker process, see `schedule_watchdog`.
+    """
+    checkpoint = take_checkpoint(request.form)
+    with phase("read_state"):
+        if checkpoint:
+            # the suspended generator reads from the checkpointed state, so update it in place
+            state = checkpoint["state"]
+            state.update(read_scheduler_state(request.form, state))
+            generator = checkpoint["generator"]
+        else:
+            state = read_scheduler_state(request.form)
+            generator = None
+    with phase("schedule"):
+        # imported here since the watchdog runs this module's scheduler
+        from app.middleware import schedule_watchdog
+        if state["generate_complete_schedule"] and not state["is_graduated"] and schedule_watchdog.is_enabled():
+            state = schedule_watchdog.run_isolated(state)
+        else:
+            generator = run_scheduler(state, generator)
+    with phase("render_info"):
+        render_info = build_render_info(state)
+    if not state["generate_complete_schedule"]:
+        with phase("checkpoint"):
+            render_info["checkpoint_id"] = save_checkpoint(state, generator, render_info)
+    return render_info
+
+
+def build_schedule_summary(state: dict) -> dict:
+    """
+    builds the credit and requirement counters shown in the header of the schedule page.
+
+    Parameters
+    ----------
+    state:      dict
+                the scheduler variables, see `read_scheduler_state`
+    Returns
+    ----------
+    dict
+    """
+    total_credits = state["total_credits_accumulated"]
+    gen_ed_credits_still_needed = state["gen_ed_credits_still_needed"]
+    cert_elective_courses_still_needed = state["cert_elective_courses_still_needed"]
+    fe_taken = state["free_elective_credits_accumulated"]
+    TOTAL_CREDITS_FOR_CERTIFICATE_ELECTIVES = state["TOTAL_CREDITS_FOR_CERTIFICATE_ELECTIVES"]
+    bscs_credits = total_credits - (TOTAL_CREDITS_FOR_GEN_EDS - gen_ed_credits_still_needed) - fe_taken \
+        - (TOTAL_CREDITS_FOR_CERTIFICATE_ELECTIVES - (cert_elective_courses_still_needed * DEFAULT_CREDIT_HOURS))
+    return {
+        "semesters": state["semester"],
+        "current_semester": state["current_semester"],
+        "semester_years": state["semester_years"],
+        "total_credits": total_credits,
+        "total_credits_for_graduation": TOTAL_CREDITS_FOR_GRADUATION,
+        "bscs_credits": bscs_credits,
+        "gen_ed_credits_taken": TOTAL_CREDITS_FOR_GEN_EDS - gen_ed_credits_still_needed,
+        "gen_ed_credits_still_needed": gen_ed_credits_still_needed,
+        "fe_taken": fe_taken,
+        "min_3000_course": state["min_3000_course_still_needed"],
+        "cert_elective_courses_still_needed": cert_elective_courses_still_needed,
+        "required_courses_still_needed": [course for course in state["required_courses_tuple"]
+                                          if course not in state["courses_taken"]],
+        "is_graduated": state["is_graduated"]
+    }
+
+
+def generate_schedule_events(form):
+    """
+    generates the whole schedule, yielding each semester as soon as it is placed.
+
+    Completed semesters are dropped from the state once yielded, so memory does not grow with the
+    length of the schedule. Like `run_scheduler`, the stream stops at `MAX_SCHEDULE_TERMS` terms, and
+    ends with an "error" event once the schedule has taken longer than `schedule_timeout`.
+
+    Parameters
+    ----------
+    form:       MultiDict
+                the posted form, as for `generate_semester`
+    Yields
+    ----------
+    dict
+                a "semester" event per semester, then a "summary" event with the counters
+    """
+    state = read_scheduler_state(form)
+    state["generate_complete_schedule"] = True
+    if state["is_graduated"]:
+        add_empty_semester(state)
+        yield {"event": "semester", "semester": state["course_schedule"][-1]}
+    else:
+        terms = 0
+        # measured from the start of scheduling, as in `run_scheduler`, so time spent sending semesters counts too
+        deadline = time.monotonic() + schedule_timeout(state)
+        for semester_info in semester_generator(state):
+            yield {"event": "semester", "semester": semester_info}
+            state["course_schedule"].clear()
+            terms += 1
+            if not state["is_graduated"] and terms >= MAX_SCHEDULE_TERMS:
+                state["unschedulable"] = unschedulable_result(state, f"not graduated after {MAX_SCHEDULE_TERMS} terms")
+                yield {"event": "unschedulable", **state["unschedulable"]}
+                break
+            if not state["is_graduated"] and time.monotonic() > deadline:
+                state["unschedulable"] = unschedulable_result(state, f"not graduated within {schedule_timeout(state):g}s")
+                yield {"event": "error", "message": state["unschedulable"]["reason"], **state["unschedulable"]}
+                return
+    yield {"event": "summary", "summary": build_schedule_summary(state)}
@@ -0,0 +1,176 @@
+import bisect
+import re
+import time
+from app.middleware.student_profiles import CERTIFICATES
+
+# course numbers are grouped into these bands, by the thousand, with everything from 3000 up together
+LEVEL_BANDS = ("1000", "2000", "3000+")
+DEFAULT_LIMIT = 50
+WORD_PATTERN = re.compile(r"[a-z0-9]+")
+CERTIFICATE_TAGS = {name: tag for name, tag in CERTIFICATES}
+
+
+def words(text: str) -> list:
+    return WORD_PATTERN.findall(str(text).lower())
+
+
+def level_band(course_number) -> str:
+    digits = re.match(r"\d+", str(course_number))
+    number = int(digits.group()) if digits else 0
+    if number < 2000:
+        return LEVEL_BANDS[0]
+    if number < 3000:
+        return LEVEL_BANDS[1]
+    return LEVEL_BANDS[2]
+
+
+def course_programs(course: dict) -> set:
+    # degrees and certificate tags that require the course or list it in a selection group
+    programs = set(course.get("required_by_major_cert", []))
+    for program in course.get("selection_group", {}).get("program", []):
+        programs.add(program["major_or_cert"])
+    return {CERTIFICATE_TAGS.get(program, program) for program in programs}
+
+
+def positions_mask(positions: list, size: int) -> int:
+    # the bitset with a bit set at each position
+    bitset = bytearray((size + 7) // 8)
+    for position in positions:
+        bitset[position >> 3] |= 1 << (position & 7)
+    return int.from_bytes(bitset, "little")
+
+
+def build_search_index(all_courses: dict) -> dict:
+    """
+    builds the indexes `search_courses` answers queries from.
+
+    Every posting is an int bitset over the sorted course keys, as in `catalog.build_dependency_index`,
+    so a query is a few ANDs and ORs however large the catalog is.
+
+    Parameters
+    ----------
+    all_courses:    dict
+                    the catalog, as returned by `parse_courses`
+    Returns
+    ----------
+    dict
+                    keys:       course keys in bit order
+                    words:      every indexed word, sorted, for prefix lookups with bisect
+                    postings:   word -> bitset of the courses whose key, name or description contain it
+                    names:      word -> bitset of the courses whose key or name contain it
+                    subjects:   subject -> bitset, i.e. "CMP SCI"
+                    levels:     level band -> bitset, see `LEVEL_BANDS`
+                    terms:      term offered -> bitset
+                    programs:   degree or certificate tag -> bitset, i.e. "BSDataScience" or "DATACERTReq"
+                    all:        bitset of every course
+    """
+    keys = sorted(all_courses)
+    # positions are collected first and turned into bitsets once, since OR-ing into a large int copies it
+    positions = {"postings": {}, "names": {}, "subjects": {}, "levels": {}, "terms": {}, "programs": {}}
+    for i, key in enumerate(keys):
+        course = all_courses[key]
+        name_words = set(words(key)) | set(words(course.get("course_name", "")))
+        for word in name_words:
+            positions["names"].setdefault(word, []).append(i)
+        for word in name_words | set(words(course.get("course_description", ""))):
+            positions["postings"].setdefault(word, []).append(i)
+        facets = (
+            ("subjects", [course.get("subject", "")]),
+            ("levels", [level_band(course.get("course_number", ""))]),
+            ("terms", course.get("semesters_offered", [])),
+            ("programs", course_programs(course))
+        )
+        for facet, values in facets:
+            for value in values:
+                positions[facet].setdefault(value, []).append(i)
+
+    index = {facet: {value: positions_mask(found, len(keys)) for value, found in values.items()}
+             for facet, values in positions.items()}
+    index["keys"] = keys
+    index["words"] = sorted(index["postings"])
+    index["all"] = (1 << len(keys)) - 1
+    return index
+
+
+def prefix_mask(index: dict, postings: dict, prefix: str) -> int:
+    # ORs the postings of every indexed word starting with `prefix`
+    mask = 0
+    indexed_words = index["words"]
+    position = bisect.bisect_left(indexed_words, prefix)
+    while position < len(indexed_words) and indexed_words[position].startswith(prefix):
+        mask |= postings.get(indexed_words[position], 0)
+        position += 1
+    return mask
+
+
+def facet_mask(index: dict, facet: str, values: list) -> int:
+    # ORs the values asked for within a facet; unknown values match nothing
+    mask = 0
+    for value in values:
+        if facet == "levels" and value.isdigit():
+            value = level_band(value)
+        elif facet == "programs":
+            value = CERTIFICATE_TAGS.get(value, value.split(",")[-1])
+        mask |= index[facet].get(value, 0)
+    return mask
+
+
+def search_courses(catalog: dict, query="", subjects=(), levels=(), terms=(), programs=(), limit=DEFAULT_LIMIT) -> dict:
+    """
+    finds the courses matching every query word, as a prefix, and every facet given.
+
+    Parameters
+    ----------
+    catalog:    dict
+                the compiled catalog, see `get_catalog`
+    query:      str
+                keywords, i.e. "data struct"; each word must prefix a word of the course's key, name or description
+    subjects:   list
+                i.e. ["CMP SCI", "MATH"]
+    levels:     list
+                level bands or course numbers, i.e. ["3000+"] or ["3000"]
+    terms:      list
+                terms the course is offered, i.e. ["Summer"]
+    programs:   list
+                degrees or certificates, by name, XML tag, or both as the home page posts them
+    limit:      int
+                the most courses returned
+    Returns
+    ----------
+    dict
+                count:      the number of matching courses
+                courses:    up to `limit` matches, the ones matching every word in their key or name first
+                took_ms:    milliseconds spent on the query
+    """
+    start_time = time.perf_counter()
+    index = catalog["search"]
+    mask = index["all"]
+    name_mask = index["all"]
+    for prefix in words(query):
+        mask &= prefix_mask(index, index["postings"], prefix)
+        name_mask &= prefix_mask(index, index["names"], prefix)
+    for facet, values in (("subjects", subjects), ("levels", levels), ("terms", terms), ("programs", programs)):
+        if values:
+            mask &= facet_mask(index, facet, values)
+    name_mask &= mask
+
+    keys = index["keys"]
+    matches = []
+    for ranked in (name_mask, mask & ~name_mask):
+        while ranked and len(matches) < limit:
+            low = ranked & -ranked
+            matches.append(keys[low.bit_length() - 1])
+            ranked ^= low
+    courses = catalog["courses"]
+    return {
+        "count": bin(mask).count("1"),
+        "courses": [{
+            "course": key,
+            "name": courses[key]["course_name"],
+            "credits": courses[key]["credit"],
+            "level": level_band(courses[key]["course_number"]),
+            "semesters_offered": courses[key]["semesters_offered"],
+            "prerequisite_description": courses[key].get("prerequisite_description", "")
+        } for key in matches],
+        "took_ms": (time.perf_counter() - start_time) * 1000
+    }
@@ -0,0 +1,228 @@
+from app.middleware.catalog import prerequisite_options
+from app.middleware.course_parsing import OFFERING_TERMS, TOTAL_CREDITS_FOR_GRADUATION
+from app.middleware.plan_validation import ENGLISH_3130_MIN_CREDITS
+
+# courses that also need a number of credits completed by the end of the semester they are taken in
+MIN_CREDITS_FOR_COURSE = {"ENGLISH 3130": ENGLISH_3130_MIN_CREDITS}
+
+
+def term_cycle(start_term: str, include_summer: bool) -> tuple:
+    """
+    orders the terms from `start_term` the way `course_parsing.update_semester` steps through them.
+
+    A Summer start with Summer terms off is scheduled once, before the terms repeat as Fall and Spring.
+
+    Parameters
+    ----------
+    start_term:     str
+                    the first term, one of `course_parsing.OFFERING_TERMS`
+    include_summer: bool
+                    whether Summer terms are scheduled
+    Returns
+    ----------
+    tuple
+                    the terms scheduled once before the cycle, and the repeating cycle of terms
+    """
+    if start_term not in OFFERING_TERMS:
+        raise ValueError(f"Unknown semester: {start_term}, expected one of {', '.join(OFFERING_TERMS)}")
+    terms = [term for term in OFFERING_TERMS if include_summer or term != "Summer"]
+    if start_term not in terms:
+        return [start_term], terms
+    start = terms.index(start_term)
+    return [], terms[start:] + terms[:start]
+
+
+def term_phase(lead_terms: int, period: int, index: int) -> int:
+    # position in the lead terms followed by the cycle (see `term_cycle`) of the term `index` terms after the start
+    return index if index < lead_terms else lead_terms + (index - lead_terms) % period
+
+
+def credit_terms(credits_needed, cycle, credits_per_semester, summer_credits, lead=()) -> int:
+    # number of terms to earn `credits_needed` at the given load, or None if the load earns nothing
+    terms = 0
+    for term in lead:
+        if credits_needed <= 0:
+            return terms
+        credits_needed -= summer_credits if term == "Summer" else credits_per_semester
+        terms += 1
+    if credits_needed <= 0:
+        return terms
+    credits_per_cycle = sum(summer_credits if term == "Summer" else credits_per_semester for term in cycle)
+    if credits_per_cycle <= 0:
+        return None
+    terms += (credits_needed // credits_per_cycle) * len(cycle)
+    credits_needed -= (credits_needed // credits_per_cycle) * credits_per_cycle
+    # less than a cycle of credits is left
+    for term in cycle:
+        if credits_needed <= 0:
+            break
+        credits_needed -= summer_credits if term == "Summer" else credits_per_semester
+        terms += 1
+    return terms
+
+
+def earliest_graduation(catalog: dict, required_courses, courses_taken, start_term: str, include_summer: bool,
+                        total_credits=0, credits_per_semester=None, summer_credits=0) -> dict:
+    """
+    computes a lower bound on the number of terms left before graduation.
+
+    Each remaining course is placed in the earliest term it is offered after its prerequisites, where a
+    course's `concurrent` prerequisite may share its term and any one prerequisite option is enough. The
+    longest such chain bounds the terms from below, as does earning the remaining credits at the given load.
+
+    Parameters
+    ----------
+    catalog:                dict
+                            the compiled catalog, see `catalog.get_catalog`
+    required_courses:       iterable
+                            the courses the student must take
+    courses_taken:          iterable
+                            courses already completed or waived
+    start_term:             str
+                            the first term to schedule, one of `course_parsing.OFFERING_TERMS`
+    include_summer:         bool
+                            whether Summer terms are scheduled
+    total_credits:          int
+                            credits already earned
+    credits_per_semester:   int
+                            the most credits taken each Fall and Spring; the credit bound is skipped if None
+    summer_credits:         int
+                            the most credits taken each Summer
+    Returns
+    ----------
+    dict
+                            terms:          the lower bound on remaining terms, or None if a course can never be taken
+                            chain_terms:    terms needed by the longest prerequisite chain
+                            credit_terms:   terms needed to earn the remaining credits
+                            bottleneck:     the longest chain, each course with its earliest term
+                            earliest:       course key -> earliest term index, 0 being `start_term`
+                            unschedulable:  required courses never offered in the scheduled terms
+    """
+    dependencies = catalog["dependencies"]
+    records = catalog["records"]
+    bits = dependencies["bits"]
+    lead, cycle = term_cycle(start_term, include_summer)
+    terms_in_order = lead + cycle
+    period = len(cycle)
+
+    def term_at(index):
+        return terms_in_order[term_phase(len(lead), period, index)]
+
+    taken_mask = 0
+    for course in courses_taken:
+        taken_mask |= bits.get(course, 0)
+    remaining = [course for course in required_courses if course in bits and not taken_mask & bits[course]]
+    needed_mask = 0
+    for course in remaining:
+        needed_mask |= bits[course] | dependencies["ancestors"][course]
+    needed_mask &= ~taken_mask
+
+    # terms by which the credit-gated courses can be taken
+    credit_release = {}
+    if credits_per_semester is not None:
+        for course, min_credits in MIN_CREDITS_FOR_COURSE.items():
+            terms = credit_terms(min_credits - total_credits, cycle, credits_per_semester, summer_credits, lead)
+            credit_release[course] = max(terms - 1, 0) if terms is not None else None
+
+    earliest = {}
+    binding = {}
+    never = set()
+    for course in dependencies["order"]:
+        if not needed_mask & bits[course]:
+            continue
+        record = records[course]
+        concurrent = record.concurrent
+
+        # the earliest term the prerequisites allow, from the best prerequisite option
+        release = 0
+        release_prereq = None
+        options = prerequisite_options(record.prerequisites)
+        best = None
+        for option in options:
+            option_release = 0
+            option_prereq = None
+            for prereq in option:
+                if prereq not in bits or taken_mask & bits[prereq] or prereq == course:
+                    continue
+                if prereq in never or prereq not in earliest:
+                    option_release = None
+                    break
+                prereq_release = earliest[prereq] + (0 if prereq == concurrent else 1)
+                if prereq_release >= option_release:
+                    option_release = prereq_release
+                    option_prereq = prereq
+            if option_release is not None and (best is None or option_release < best):
+                best = option_release
+                release_prereq = option_prereq
+        if options and best is None:
+            never.add(course)
+            continue
+        release = best or 0
+
+        if course in credit_release:
+            if credit_release[course] is None:
+                never.add(course)
+                continue
+            release = max(release, credit_release[course])
+
+        # move forward to a term the course is offered
+        offered = record.offered
+        for shift in range(len(lead) + period):
+            if term_at(release + shift) in offered:
+                earliest[course] = release + shift
+                binding[course] = release_prereq
+                break
+        else:
+            never.add(course)
+
+    unschedulable = [course for course in remaining if course in never]
+    last = max((course for course in remaining if course in earliest), key=lambda course: earliest[course], default=None)
+    bottleneck = []
+    course = last
+    while course is not None:
+        bottleneck.append({"course": course, "term_index": earliest[course], "semester": term_at(earliest[course])})
+        course = binding.get(course)
+    bottleneck.reverse()
+
+    chain_terms = earliest[last] + 1 if last is not None else 0
+    terms_for_credits = None
+    if credits_per_semester is not None:
+        terms_for_credits = credit_terms(TOTAL_CREDITS_FOR_GRADUATION - total_credits, cycle, credits_per_semester,
+                                         summer_credits, lead)
+
+    terms = None
+    if not unschedulable and not (credits_per_semester is not None and terms_for_credits is None):
+        terms = max(chain_terms, terms_for_credits or 0)
+
+    return {
+        "terms": terms,
+        "chain_terms": chain_terms,
+        "credit_terms": terms_for_credits,
+        "bottleneck": bottleneck,
+        "earliest": earliest,
+        "unschedulable": unschedulable
+    }
+
+
+def earliest_graduation_for_state(state: dict, catalog: dict) -> dict:
+    """
+    computes `earliest_graduation` for the scheduler's state, from the semester it will schedule next.
+
+    Parameters
+    ----------
+    state:      dict
+                the scheduler variables, see `course_parsing.read_scheduler_state`
+    catalog:    dict
+                the compiled catalog, see `catalog.get_catalog`
+    Returns
+    ----------
+    dict
+    """
+    # a semester is filled until it reaches the minimum, so its last course can go over by its credits less one
+    overshoot = max(record.credits for record in catalog["records"].values()) - 1
+    credits_per_semester = (state["temp_min_credits_per_semester"] or state["min_credits_per_semester"]) + overshoot
+    summer_credits = state["summer_credit_count"] + overshoot if state["generate_complete_schedule"] else credits_per_semester
+    remaining = [course for course, _ in state["required_courses_dict_list"]]
+    return earliest_graduation(catalog, remaining, state["courses_taken"], state["current_semester"],
+                               state["include_summer"], state["total_credits_accumulated"],
+                               credits_per_semester, summer_credits)
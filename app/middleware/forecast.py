@@ -0,0 +1,319 @@
+import contextlib
+import csv
+import io
+import json
+import os
+import random
+import time
+from collections import Counter
+from app.middleware import course_parsing
+from app.middleware.catalog import get_catalog
+from app.middleware.student_profiles import CERTIFICATES, random_profile, requires_summer, build_first_semester_form
+
+# a student still enrolled after this many terms is counted as unfinished instead of looping forever
+DEFAULT_MAX_TERMS = 24
+# students simulated per task sent to a worker process
+DEFAULT_CHUNK_SIZE = 250
+# orders the terms of a year when sorting the demand matrix
+TERM_ORDER = {"Spring": 0, "Summer": 1, "Fall": 2}
+
+# profile fields read from a cohort, by how their values are parsed
+LIST_FIELDS = ("certificates", "courses_taken", "waived_courses")
+BOOL_FIELDS = ("include_summer", "aleks_check")
+INT_FIELDS = ("minimum_semester_credits", "minimum_summer_credits", "ge_taken", "fe_taken", "total_credits")
+TEXT_FIELDS = ("user_name", "degree_choice", "current_semester")
+
+# set in each worker process by `init_worker`
+worker_settings = {}
+
+
+def parse_certificate_choice(certificate: str) -> str:
+    """
+    finds a certificate by its name, its XML tag, or both as the home page posts them.
+
+    Parameters
+    ----------
+    certificate:    str
+                    i.e. "Data Science", "DATACERTReq" or "Data Science,DATACERTReq"
+    Returns
+    ----------
+    str
+                    the "name,tag" value the home page posts in `selected_certificates`
+    """
+    certificate = certificate.strip()
+    for name, tag in CERTIFICATES:
+        if certificate in (name, tag, f"{name},{tag}"):
+            return f"{name},{tag}"
+    raise ValueError(f"Unknown certificate: {certificate}")
+
+
+def parse_cohort_field(field: str, value):
+    # values from a CSV cell are strings, values from JSON may already be typed
+    if field in LIST_FIELDS:
+        if isinstance(value, str):
+            value = [item.strip() for item in value.split(";") if item.strip()]
+        if field == "certificates":
+            value = [parse_certificate_choice(certificate) for certificate in value]
+        return list(value)
+    if field in BOOL_FIELDS:
+        if isinstance(value, str):
+            return value.strip().lower() in ("1", "true", "yes", "on", "y")
+        return bool(value)
+    if field in INT_FIELDS:
+        return int(value) if value != "" else 0
+    return str(value)
+
+
+def read_cohort(path: str) -> list:
+    """
+    reads a cohort description from a JSON or CSV file.
+
+    JSON holds a list of groups (or an object with a `groups` list), i.e.
+    `{"groups": [{"count": 400, "degree_choice": "BSComputerScience", "certificates": ["Data Science"]}]}`.
+    CSV holds one group per row, with a column per profile field; list fields separate their items with ";".
+    A row without a `count` column is one student.
+
+    Parameters
+    ----------
+    path:       str
+                path to a .json or .csv file
+    Returns
+    ----------
+    list
+                one dict per group, holding a `count` and the profile fields the group fixes
+    """
+    with open(path, newline="") as fd:
+        if path.lower().endswith(".json"):
+            groups = json.load(fd)
+            if isinstance(groups, dict):
+                groups = groups["groups"]
+        else:
+            groups = list(csv.DictReader(fd))
+
+    cohort = []
+    for group in groups:
+        fields = {"count": int(group.get("count") or 1)}
+        for field, value in group.items():
+            if field in LIST_FIELDS + BOOL_FIELDS + INT_FIELDS + TEXT_FIELDS and value is not None:
+                fields[field] = parse_cohort_field(field, value)
+        cohort.append(fields)
+    return cohort
+
+
+def expand_cohort(cohort: list, seed: int = 0) -> list:
+    """
+    creates one profile per student in a cohort.
+
+    Fields a group leaves out are drawn the same way `random_profile` draws them, so a group of
+    "400 B.S. Computer Science students starting in Fall" still varies in load and transfer credit.
+
+    Parameters
+    ----------
+    cohort:     list
+                groups, see `read_cohort`
+    seed:       int
+                seed for the fields drawn at random
+    Returns
+    ----------
+    list
+                student profiles, see `random_profile`
+    """
+    rng = random.Random(seed)
+    profiles = []
+    for group in cohort:
+        for _ in range(group["count"]):
+            profile = random_profile(rng, len(profiles))
+            profile.update({field: value for field, value in group.items() if field != "count"})
+            if "total_credits" not in group:
+                # the home page will not allow fewer credits than the completed courses are worth
+                profile["total_credits"] = 3 * len(profile["courses_taken"])
+            if requires_summer(profile):
+                profile["include_summer"] = True
+            profiles.append(profile)
+    return profiles
+
+
+def init_worker(settings: dict) -> None:
+    # runs once per worker process, so the catalog is compiled once per process instead of once per student
+    worker_settings.update(settings)
+    with contextlib.redirect_stdout(io.StringIO()):
+        get_catalog()
+
+
+def simulate_batch(batch: tuple) -> dict:
+    """
+    runs a batch of students through the scheduler and counts the seats they take.
+
+    Each student's random choices are seeded from the forecast seed and the student's index, so the
+    forecast does not depend on how students are split between processes.
+
+    Parameters
+    ----------
+    batch:      tuple
+                the index of the first student and the list of profiles
+    Returns
+    ----------
+    dict
+                partial counts, see `merge_counts`
+    """
+    start, profiles = batch
+    settings = worker_settings
+    counts = {
+        "students": 0,
+        "unfinished": 0,
+        "demand": Counter(),
+        "terms_to_graduate": Counter()
+    }
+    with open(os.devnull, "w") as output, contextlib.redirect_stdout(output):
+        for index, profile in enumerate(profiles, start):
+            random.seed(f"{settings['seed']}:{index}")
+            form = build_first_semester_form(profile, settings["required_courses_dict"], True)
+            form.add("scheduler_engine", settings["scheduler_engine"])
+            state = course_parsing.read_scheduler_state(form)
+
+            seats = Counter()
+            terms = 0
+            if not state["is_graduated"]:
+                for semester_info in course_parsing.semester_generator(state):
+                    terms += 1
+                    term = f"{semester_info['semester']} {semester_info['year']}"
+                    for course in semester_info["schedule"]:
+                        seats[(course["course"], term)] += 1
+                    if terms >= settings["max_terms"]:
+                        break
+
+            counts["students"] += 1
+            if state["is_graduated"]:
+                counts["demand"].update(seats)
+                counts["terms_to_graduate"][terms] += 1
+            else:
+                counts["unfinished"] += 1
+    return counts
+
+
+def merge_counts(total: dict, counts: dict) -> dict:
+    total["students"] += counts["students"]
+    total["unfinished"] += counts["unfinished"]
+    total["demand"].update(counts["demand"])
+    total["terms_to_graduate"].update(counts["terms_to_graduate"])
+    return total
+
+
+def term_sort_key(term: str) -> tuple:
+    season, year = term.rsplit(" ", 1)
+    return int(year), TERM_ORDER.get(season, len(TERM_ORDER))
+
+
+def forecast_demand(profiles: list, seed: int = 0, workers=None, max_terms=DEFAULT_MAX_TERMS,
+                    scheduler_engine="greedy", chunk_size=DEFAULT_CHUNK_SIZE) -> dict:
+    """
+    simulates every student's plan and aggregates the seats each course needs in each term.
+
+    Parameters
+    ----------
+    profiles:           list
+                        student profiles, see `expand_cohort`
+    seed:               int
+                        seed for the scheduler's random choices
+    workers:            int
+                        number of worker processes, defaults to the number of CPUs; 1 runs in this process
+    max_terms:          int
+                        terms after which a student who has not graduated is counted as unfinished
+    scheduler_engine:   str
+                        the engine each plan is generated with, see `course_parsing.SCHEDULER_ENGINES`
+    chunk_size:         int
+                        students per task sent to a worker
+    Returns
+    ----------
+    dict
+                        students:           number of students simulated
+                        graduated:          students whose plan graduates within `max_terms`
+                        unfinished:         students left out of the demand
+                        terms:              the terms in the forecast, in calendar order
+                        courses:            the courses in the forecast, sorted
+                        demand:             course -> term -> seats
+                        term_totals:        term -> seats
+                        terms_to_graduate:  number of terms -> students
+                        elapsed_s:          wall-clock seconds for the simulation
+    """
+    if scheduler_engine not in course_parsing.SCHEDULER_ENGINES:
+        raise ValueError(f"Unknown scheduler engine: {scheduler_engine}")
+    start_time = time.perf_counter()
+
+    # build the catalog once, before any worker is started, so forked workers share it
+    with contextlib.redirect_stdout(io.StringIO()):
+        required_courses_dict = get_catalog()["courses_json"]
+    settings = {
+        "required_courses_dict": required_courses_dict,
+        "seed": seed,
+        "max_terms": max_terms,
+        "scheduler_engine": scheduler_engine
+    }
+    init_worker(settings)
+
+    batches = [(start, profiles[start:start + chunk_size]) for start in range(0, len(profiles), chunk_size)]
+    workers = workers or os.cpu_count() or 1
+    total = {"students": 0, "unfinished": 0, "demand": Counter(), "terms_to_graduate": Counter()}
+    if workers <= 1 or len(batches) <= 1:
+        for batch in batches:
+            merge_counts(total, simulate_batch(batch))
+    else:
+        # the process pool machinery is only loaded when it is used
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(settings,)) as pool:
+            for counts in pool.map(simulate_batch, batches):
+                merge_counts(total, counts)
+
+    demand = {}
+    term_totals = Counter()
+    for (course, term), seats in total["demand"].items():
+        demand.setdefault(course, {})[term] = seats
+        term_totals[term] += seats
+    terms = sorted(term_totals, key=term_sort_key)
+    return {
+        "students": total["students"],
+        "graduated": total["students"] - total["unfinished"],
+        "unfinished": total["unfinished"],
+        "terms": terms,
+        "courses": sorted(demand),
+        "demand": {course: {term: demand[course][term] for term in terms if term in demand[course]}
+                   for course in sorted(demand)},
+        "term_totals": {term: term_totals[term] for term in terms},
+        "terms_to_graduate": {str(terms_taken): students for terms_taken, students
+                              in sorted(total["terms_to_graduate"].items())},
+        "elapsed_s": time.perf_counter() - start_time
+    }
+
+
+def write_forecast_csv(forecast: dict, fd) -> None:
+    """
+    writes the seat-demand matrix with a row per course, a column per term, and a total column.
+    """
+    writer = csv.writer(fd)
+    writer.writerow(["course"] + forecast["terms"] + ["total"])
+    for course in forecast["courses"]:
+        seats = forecast["demand"][course]
+        writer.writerow([course] + [seats.get(term, 0) for term in forecast["terms"]] + [sum(seats.values())])
+    writer.writerow(["TOTAL"] + [forecast["term_totals"][term] for term in forecast["terms"]]
+                    + [sum(forecast["term_totals"].values())])
+
+
+def write_forecast_json(forecast: dict, fd) -> None:
+    json.dump(forecast, fd, indent=2)
+
+
+def format_forecast(forecast: dict, top=15) -> str:
+    out = io.StringIO()
+    out.write(f"{'Students:':<20}{forecast['students']} ({forecast['unfinished']} unfinished)\n")
+    out.write(f"{'Simulated in:':<20}{forecast['elapsed_s']:.2f}s\n")
+    if forecast["terms"]:
+        out.write(f"{'Terms:':<20}{forecast['terms'][0]} to {forecast['terms'][-1]}\n")
+    out.write("Terms to graduate:\n")
+    for terms_taken, students in forecast["terms_to_graduate"].items():
+        out.write(f"\t{terms_taken:>3} terms{students:>8}\n")
+    out.write("Busiest course-terms:\n")
+    busiest = sorted(((seats, course, term) for course, row in forecast["demand"].items() for term, seats in row.items()),
+                     key=lambda item: (-item[0], item[1], term_sort_key(item[2])))
+    for seats, course, term in busiest[:top]:
+        out.write(f"\t{course:<40}{term:<14}{seats:>8}\n")
+    return out.getvalue()
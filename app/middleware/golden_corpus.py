@@ -0,0 +1,301 @@
+import contextlib
+import hashlib
+import io
+import json
+import os
+import random
+import statistics
+import time
+from app.middleware import course_parsing
+from app.middleware.catalog import get_catalog
+from app.middleware.forecast import DEFAULT_MAX_TERMS
+from app.middleware.student_profiles import (CERTIFICATES, DEGREES, build_first_semester_form,
+                                             elective_heavy_profile, random_profile)
+
+CORPUS_VERSION = 1
+# "full" is "Generate Full Schedule"; "semester" resumes the scheduler one semester at a time, as "Continue Schedule" does
+PLAN_MODES = ("full", "semester")
+DEFAULT_STUDENTS = 2000
+# profiles planned per task sent to a worker process
+DEFAULT_CHUNK_SIZE = 100
+# a profile is reported as slower when it takes this many times as long and at least `MIN_SLOWDOWN_MS` longer,
+# so sub-millisecond timer noise is not reported
+SLOWDOWN_RATIO = 1.5
+MIN_SLOWDOWN_MS = 0.2
+# divergences and timing changes listed in the report
+REPORT_TOP = 10
+
+# set in each worker process by `init_worker`
+worker_settings = {}
+
+
+def corpus_profiles(num_students: int, seed: int, required_courses_dict: str) -> list:
+    """
+    creates the seeded profiles of a corpus: random profiles, with every fourth one elective-heavy and
+    every fifth one taking a second certificate.
+
+    Returns
+    ----------
+    list
+                one profile per student, see `random_profile`
+    """
+    rng = random.Random(seed)
+    required_courses = {degree: course_parsing.program_requirements(required_courses_dict, degree, [], [])["required"]
+                        for degree in DEGREES}
+    profiles = []
+    for index in range(num_students):
+        if index % 4 == 3:
+            profile = elective_heavy_profile(rng, index, required_courses)
+        else:
+            profile = random_profile(rng, index)
+        if index % 5 == 0:
+            names = {certificate.split(",")[0] for certificate in profile["certificates"]}
+            name, tag = rng.choice([certificate for certificate in CERTIFICATES if certificate[0] not in names])
+            profile["certificates"].append(f"{name},{tag}")
+        profiles.append(profile)
+    return profiles
+
+
+def digest(value) -> str:
+    # a short, stable hash of any JSON value
+    return hashlib.blake2b(json.dumps(value, sort_keys=True).encode(), digest_size=8).hexdigest()
+
+
+def plan_fingerprint(state: dict) -> str:
+    # everything a student sees of the plan: each term's courses and credits, and where the plan ends
+    return digest([
+        [[semester["semester"], semester["year"], semester["credits"], [course["course"] for course in semester["schedule"]]]
+         for semester in state["course_schedule"]],
+        state["is_graduated"],
+        state["total_credits_accumulated"]
+    ])
+
+
+def plan_profile(profile: dict, mode: str, seed, settings: dict) -> dict:
+    # plans one profile in one mode, returning its fingerprint
+    form = build_first_semester_form(profile, settings["required_courses_dict"], mode == "full")
+    form.add("scheduler_engine", settings["scheduler_engine"])
+    random.seed(seed)
+    state = course_parsing.read_scheduler_state(form)
+    if mode == "full":
+        if not state["is_graduated"]:
+            for _ in course_parsing.semester_generator(state):
+                if len(state["course_schedule"]) >= settings["max_terms"]:
+                    break
+    else:
+        generator = None
+        while not state["is_graduated"] and len(state["course_schedule"]) < settings["max_terms"]:
+            generator = course_parsing.run_scheduler(state, generator)
+    return {
+        "fingerprint": plan_fingerprint(state),
+        "terms": len(state["course_schedule"]),
+        "graduated": state["is_graduated"]
+    }
+
+
+def init_worker(settings: dict) -> None:
+    # runs once per worker process, so the catalog is compiled once per process instead of once per student
+    worker_settings.update(settings)
+    with contextlib.redirect_stdout(io.StringIO()):
+        worker_settings["required_courses_dict"] = get_catalog()["courses_json"]
+
+
+def plan_chunk(chunk: tuple) -> list:
+    """
+    plans a chunk of profiles in every mode, timing each plan.
+
+    Parameters
+    ----------
+    chunk:      tuple
+                the index of the first profile and the list of profiles
+    Returns
+    ----------
+    list
+                one entry per profile and mode: index, mode, fingerprint, terms, graduated and ms, the
+                fastest of `runs` plans
+    """
+    start, profiles = chunk
+    settings = worker_settings
+    entries = []
+    with open(os.devnull, "w") as output, contextlib.redirect_stdout(output):
+        for index, profile in enumerate(profiles, start):
+            for mode in PLAN_MODES:
+                fastest = float("inf")
+                for _ in range(settings["runs"]):
+                    start_time = time.perf_counter()
+                    result = plan_profile(profile, mode, f"{settings['seed']}:{index}", settings)
+                    fastest = min(fastest, (time.perf_counter() - start_time) * 1000)
+                entries.append(dict(index=index, mode=mode, ms=round(fastest, 4), **result))
+    return entries
+
+
+def run_corpus(num_students=DEFAULT_STUDENTS, seed=0, workers=None, runs=1, max_terms=DEFAULT_MAX_TERMS,
+               scheduler_engine="greedy", chunk_size=DEFAULT_CHUNK_SIZE) -> dict:
+    """
+    plans every profile of a corpus in parallel, fingerprinting and timing each plan.
+
+    Parameters
+    ----------
+    num_students:       int
+                        profiles planned, each in every mode of `PLAN_MODES`
+    seed:               int
+                        seed for the profiles and the scheduler's choices
+    workers:            int
+                        number of worker processes, defaults to the number of CPUs; 1 plans in this process
+    runs:               int
+                        times each plan is generated; the fastest is kept, so more runs mean less noise
+    max_terms:          int
+                        terms after which a plan is cut off
+    scheduler_engine:   str
+                        see `course_parsing.SCHEDULER_ENGINES`
+    chunk_size:         int
+                        profiles per task sent to a worker
+    Returns
+    ----------
+    dict
+                        header:     the settings, and digests of the catalog and the profiles, so a corpus
+                                    is only compared with runs of the same students
+                        plans:      one entry per profile and mode, see `plan_chunk`
+    """
+    if scheduler_engine not in course_parsing.SCHEDULER_ENGINES:
+        raise ValueError(f"Unknown scheduler engine: {scheduler_engine}")
+    start_time = time.perf_counter()
+    settings = {"seed": seed, "runs": runs, "max_terms": max_terms, "scheduler_engine": scheduler_engine}
+    # build the catalog before any worker is started, so forked workers share it
+    init_worker(settings)
+    required_courses_dict = worker_settings["required_courses_dict"]
+    profiles = corpus_profiles(num_students, seed, required_courses_dict)
+
+    chunks = [(start, profiles[start:start + chunk_size]) for start in range(0, len(profiles), chunk_size)]
+    workers = workers or os.cpu_count() or 1
+    plans = []
+    if workers <= 1 or len(chunks) <= 1:
+        for chunk in chunks:
+            plans.extend(plan_chunk(chunk))
+    else:
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(settings,)) as pool:
+            for entries in pool.map(plan_chunk, chunks):
+                plans.extend(entries)
+
+    return {
+        "header": {
+            "version": CORPUS_VERSION,
+            "students": num_students,
+            "seed": seed,
+            "max_terms": max_terms,
+            "scheduler_engine": scheduler_engine,
+            "modes": list(PLAN_MODES),
+            "catalog": digest(required_courses_dict),
+            "profiles": digest(profiles),
+            "workers": workers,
+            "runs": runs,
+            "elapsed_s": time.perf_counter() - start_time
+        },
+        "plans": plans
+    }
+
+
+def write_corpus(corpus: dict, fd) -> None:
+    # the header on the first line, then one line per plan
+    fd.write(json.dumps(corpus["header"]) + "\n")
+    for entry in corpus["plans"]:
+        fd.write(json.dumps(entry, separators=(",", ":")) + "\n")
+
+
+def read_corpus(fd) -> dict:
+    lines = (line for line in fd if line.strip())
+    header = json.loads(next(lines))
+    if header.get("version") != CORPUS_VERSION:
+        raise ValueError(f"Unsupported golden corpus version: {header.get('version')}")
+    return {"header": header, "plans": [json.loads(line) for line in lines]}
+
+
+def compare_corpus(golden: dict, current: dict) -> dict:
+    """
+    compares a run with the golden corpus it was generated from.
+
+    Parameters
+    ----------
+    golden:     dict
+                the recorded corpus, see `read_corpus`
+    current:    dict
+                a run with the same settings, see `run_corpus`
+    Returns
+    ----------
+    dict
+                compared:       plans compared
+                diverged:       number of plans whose fingerprint changed
+                divergences:    the first `REPORT_TOP` of them, with both fingerprints and terms
+                stale:          the reasons the corpus cannot be compared, i.e. the catalog changed
+                speedup:        median and geometric mean of golden ms / current ms, and the totals
+                slower:         number of plans slower by `SLOWDOWN_RATIO` and `MIN_SLOWDOWN_MS`
+                slowest:        the plans that slowed down most, and fastest, those that sped up most
+    """
+    stale = [f"{field} changed" for field in ("catalog", "profiles")
+             if golden["header"][field] != current["header"][field]]
+    expected = {(entry["index"], entry["mode"]): entry for entry in golden["plans"]}
+    divergences = []
+    changes = []
+    for entry in current["plans"]:
+        recorded = expected.get((entry["index"], entry["mode"]))
+        if recorded is None:
+            continue
+        if entry["fingerprint"] != recorded["fingerprint"]:
+            divergences.append({
+                "index": entry["index"],
+                "mode": entry["mode"],
+                "expected": recorded["fingerprint"],
+                "found": entry["fingerprint"],
+                "expected_terms": recorded["terms"],
+                "found_terms": entry["terms"],
+                "expected_graduated": recorded["graduated"],
+                "found_graduated": entry["graduated"]
+            })
+        if recorded["ms"] > 0 and entry["ms"] > 0:
+            changes.append({"index": entry["index"], "mode": entry["mode"], "golden_ms": recorded["ms"],
+                            "current_ms": entry["ms"], "speedup": recorded["ms"] / entry["ms"]})
+
+    speedups = [change["speedup"] for change in changes]
+    by_speedup = sorted(changes, key=lambda change: change["speedup"])
+    golden_ms = sum(change["golden_ms"] for change in changes)
+    current_ms = sum(change["current_ms"] for change in changes)
+    return {
+        "compared": len(changes),
+        "diverged": len(divergences),
+        "divergences": divergences[:REPORT_TOP],
+        "stale": stale,
+        "speedup": {
+            "median": statistics.median(speedups) if speedups else 1.0,
+            "geometric_mean": statistics.geometric_mean(speedups) if speedups else 1.0,
+            "golden_ms": golden_ms,
+            "current_ms": current_ms,
+            "total": golden_ms / current_ms if current_ms else 1.0
+        },
+        "slower": sum(change["speedup"] * SLOWDOWN_RATIO <= 1
+                      and change["current_ms"] - change["golden_ms"] >= MIN_SLOWDOWN_MS for change in changes),
+        "slowest": [change for change in by_speedup[:REPORT_TOP] if change["speedup"] < 1],
+        "fastest": [change for change in reversed(by_speedup[-REPORT_TOP:]) if change["speedup"] > 1]
+    }
+
+
+def format_comparison(comparison: dict) -> str:
+    out = io.StringIO()
+    for reason in comparison["stale"]:
+        out.write(f"WARNING: {reason} since the corpus was recorded; divergences are expected\n")
+    out.write(f"{'Plans compared:':<20}{comparison['compared']}\n")
+    out.write(f"{'Diverged:':<20}{comparison['diverged']}\n")
+    for divergence in comparison["divergences"]:
+        out.write(f"\tprofile {divergence['index']:<8}{divergence['mode']:<10}{divergence['expected']} -> "
+                  f"{divergence['found']}  ({divergence['expected_terms']} -> {divergence['found_terms']} terms)\n")
+    speedup = comparison["speedup"]
+    out.write(f"{'Speedup:':<20}{speedup['total']:.2f}x total ({speedup['golden_ms']:.0f} -> {speedup['current_ms']:.0f} ms), "
+              f"{speedup['median']:.2f}x median, {speedup['geometric_mean']:.2f}x geometric mean\n")
+    out.write(f"{'Slower plans:':<20}{comparison['slower']} (at least {SLOWDOWN_RATIO}x and {MIN_SLOWDOWN_MS} ms slower)\n")
+    for title, changes in (("Largest slowdowns:", comparison["slowest"]), ("Largest speedups:", comparison["fastest"])):
+        if changes:
+            out.write(f"{title}\n")
+        for change in changes:
+            out.write(f"\tprofile {change['index']:<8}{change['mode']:<10}{change['golden_ms']:>8.2f} -> "
+                      f"{change['current_ms']:>8.2f} ms{change['speedup']:>8.2f}x\n")
+    return out.getvalue()
@@ -0,0 +1,330 @@
+import contextlib
+import io
+import json
+import math
+import os
+import random
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from html.parser import HTMLParser
+from app.middleware.student_profiles import random_profile, build_first_semester_form
+
+# the steps of a session, in the order a student performs them
+SESSION_STEPS = ["index", "first_semester", "next_semester", "print", "upload"]
+
+
+class FormStateParser(HTMLParser):
+    """
+    collects the state a browser would re-post from a rendered page.
+
+    Hidden inputs hold the growing scheduler state; the selected option of the
+    `minimum_semester_credits` dropdown holds the credits for the next semester.
+    """
+    def __init__(self):
+        super().__init__()
+        self.fields = {}
+        self._select_name = None
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        if tag == "input" and attrs.get("type") == "hidden" and attrs.get("name"):
+            self.fields[attrs["name"]] = attrs.get("value") or ""
+        elif tag == "select":
+            self._select_name = attrs.get("name")
+        elif tag == "option" and self._select_name == "minimum_semester_credits" and "selected" in attrs:
+            self.fields["minimum_semester_credits"] = attrs.get("value") or ""
+
+    def handle_endtag(self, tag):
+        if tag == "select":
+            self._select_name = None
+
+
+def parse_form_state(html: bytes) -> dict:
+    parser = FormStateParser()
+    parser.feed(html.decode("utf-8", errors="replace"))
+    return parser.fields
+
+
+def encode_urlencoded(fields) -> tuple:
+    body = urllib.parse.urlencode(list(iter_fields(fields)), doseq=False).encode()
+    return body, "application/x-www-form-urlencoded"
+
+
+def encode_multipart(fields, files=None) -> tuple:
+    """
+    encodes fields and files the way a browser submits a multipart form.
+
+    Parameters
+    ----------
+    fields:     dict or MultiDict
+                the form fields
+    files:      dict
+                maps field name to a (filename, bytes) tuple
+    Returns
+    ----------
+    tuple
+                the encoded body and its content type
+    """
+    boundary = uuid.uuid4().hex
+    lines = []
+    for name, value in iter_fields(fields):
+        lines.append(f"--{boundary}\r\nContent-Disposition: form-data; name=\"{name}\"\r\n\r\n".encode())
+        lines.append(str(value).encode() + b"\r\n")
+    for name, (filename, content) in (files or {}).items():
+        lines.append(f"--{boundary}\r\nContent-Disposition: form-data; name=\"{name}\"; "
+                     f"filename=\"{filename}\"\r\nContent-Type: text/plain\r\n\r\n".encode())
+        lines.append(content + b"\r\n")
+    lines.append(f"--{boundary}--\r\n".encode())
+    return b"".join(lines), f"multipart/form-data; boundary={boundary}"
+
+
+def iter_fields(fields):
+    # MultiDict keeps repeated keys for multi-selects
+    if hasattr(fields, "items") and hasattr(fields, "getlist"):
+        return fields.items(multi=True)
+    return fields.items()
+
+
+class TestClientTransport:
+    """sends requests to the app in-process through the Flask test client."""
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def request(self, method, path, body=None, content_type=None) -> tuple:
+        response = self.client.open(path, method=method, data=body, content_type=content_type)
+        return response.status_code, response.get_data()
+
+
+class HttpTransport:
+    """sends requests to a running server, i.e. `flask run` or a production deployment."""
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip("/")
+
+    def request(self, method, path, body=None, content_type=None) -> tuple:
+        headers = {"Content-Type": content_type} if content_type else {}
+        req = urllib.request.Request(self.base_url + path, data=body, headers=headers, method=method)
+        try:
+            with urllib.request.urlopen(req) as response:
+                return response.status, response.read()
+        except urllib.error.HTTPError as e:
+            return e.code, e.read()
+
+
+def synthesize_sessions(num_sessions, next_semesters=4, seed=0) -> list:
+    """
+    creates session scripts from random student profiles.
+
+    Parameters
+    ----------
+    num_sessions:       int
+                        number of sessions to create
+    next_semesters:     int
+                        number of "Continue Schedule" posts after the first semester
+    seed:               int
+                        seed for reproducible sessions
+    Returns
+    ----------
+    list
+                        each session holds a profile and the number of "next semester" steps
+    """
+    rng = random.Random(seed)
+    return [{
+        "profile": random_profile(rng, index),
+        "next_semesters": next_semesters,
+        "print": True,
+        "upload": True
+    } for index in range(num_sessions)]
+
+
+def save_sessions(sessions, path) -> None:
+    with open(path, "w") as fd:
+        json.dump(sessions, fd, indent=2)
+
+
+def load_sessions(path) -> list:
+    with open(path) as fd:
+        return json.load(fd)
+
+
+def run_session(transport, session) -> list:
+    """
+    replays one session and measures each step.
+
+    Returns
+    ----------
+    list
+                one (step, seconds, bytes_sent, bytes_received, status) tuple per request
+    """
+    measurements = []
+
+    def timed(step, method, path, body=None, content_type=None, expect_schedule=False):
+        start = time.perf_counter()
+        status, data = transport.request(method, path, body, content_type)
+        elapsed = time.perf_counter() - start
+        measurements.append((step, elapsed, len(body or b""), len(data), status))
+        if status != 200:
+            raise RuntimeError(f"{step} returned {status}")
+        # `/schedule` falls back to the home page when the scheduler raises an exception
+        if expect_schedule and b'name="render_info"' not in data:
+            raise RuntimeError(f"{step} fell back to the home page")
+        return data
+
+    # load the home page, which embeds the catalog the browser posts back
+    page = timed("index", "GET", "/index")
+    home_state = parse_form_state(page)
+    form = build_first_semester_form(session["profile"], home_state.get("required_courses_dict", "{}"))
+    body, content_type = encode_multipart(form)
+    page = timed("first_semester", "POST", "/schedule", body, content_type, True)
+
+    # step through the semesters, re-posting the hidden state each time
+    for _ in range(session.get("next_semesters", 0)):
+        state = parse_form_state(page)
+        state["single_semester"] = "Continue Schedule"
+        body, content_type = encode_urlencoded(state)
+        page = timed("next_semester", "POST", "/schedule", body, content_type, True)
+
+    state = parse_form_state(page)
+    if session.get("print"):
+        print_state = dict(state, Print="Print View")
+        body, content_type = encode_urlencoded(print_state)
+        timed("print", "POST", "/schedule", body, content_type)
+
+    # upload the plan the same way `download_schedule` in save_load.js saves it
+    if session.get("upload") and state.get("render_info"):
+        render_info = json.loads(state["render_info"])
+        render_info["course_schedule"] = state["course_schedule"]
+        render_info["course_schedule_display"] = json.loads(state["course_schedule"])
+        upload = json.dumps(render_info).encode()
+        body, content_type = encode_multipart({"upload": "Upload"}, {"file": ("course_schedule.txt", upload)})
+        timed("upload", "POST", "/schedule", body, content_type, True)
+
+    return measurements
+
+
+def percentile(sorted_values, percent) -> float:
+    # nearest-rank percentile
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(percent / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def summarize(measurements, elapsed, num_sessions, errors) -> dict:
+    """
+    builds the report for a load test.
+
+    Parameters
+    ----------
+    measurements:   list
+                    (step, seconds, bytes_sent, bytes_received, status) tuples from all sessions
+    elapsed:        float
+                    wall-clock seconds for the whole run
+    num_sessions:   int
+                    number of sessions replayed
+    errors:         list
+                    error messages from failed sessions
+    Returns
+    ----------
+    dict
+    """
+    steps = {}
+    for step in SESSION_STEPS:
+        rows = [m for m in measurements if m[0] == step]
+        if not rows:
+            continue
+        latencies = sorted(m[1] for m in rows)
+        steps[step] = {
+            "requests": len(rows),
+            "p50_ms": percentile(latencies, 50) * 1000,
+            "p90_ms": percentile(latencies, 90) * 1000,
+            "p95_ms": percentile(latencies, 95) * 1000,
+            "p99_ms": percentile(latencies, 99) * 1000,
+            "max_ms": latencies[-1] * 1000,
+            "bytes_sent": sum(m[2] for m in rows),
+            "bytes_received": sum(m[3] for m in rows)
+        }
+    return {
+        "sessions": num_sessions,
+        "failed_sessions": len(errors),
+        "errors": errors[:10],
+        "requests": len(measurements),
+        "elapsed_s": elapsed,
+        "requests_per_s": len(measurements) / elapsed if elapsed else 0.0,
+        "sessions_per_s": num_sessions / elapsed if elapsed else 0.0,
+        "bytes_sent": sum(m[2] for m in measurements),
+        "bytes_received": sum(m[3] for m in measurements),
+        "steps": steps
+    }
+
+
+def run_load_test(sessions, concurrency=4, app=None, base_url=None, quiet=True) -> dict:
+    """
+    replays sessions concurrently and reports throughput, latency percentiles, and bytes transferred.
+
+    Parameters
+    ----------
+    sessions:       list
+                    session scripts, see `synthesize_sessions`
+    concurrency:    int
+                    number of sessions replayed at once
+    app:            Flask
+                    replays in-process through the test client when given
+    base_url:       str
+                    replays against a running server when given, i.e. http://127.0.0.1:5000
+    quiet:          bool
+                    silences the scheduler's console output while replaying in-process
+    Returns
+    ----------
+    dict
+                    see `summarize`
+    """
+    local = threading.local()
+
+    def transport():
+        # each thread gets its own client, like each user has their own browser
+        if not hasattr(local, "transport"):
+            local.transport = HttpTransport(base_url) if base_url else TestClientTransport(app)
+        return local.transport
+
+    errors = []
+
+    def replay(session):
+        try:
+            return run_session(transport(), session)
+        except Exception as e:
+            errors.append(str(e))
+            return []
+
+    output = open(os.devnull, "w") if quiet and not base_url else None
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(output) if output else contextlib.nullcontext():
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            results = list(pool.map(replay, sessions))
+    elapsed = time.perf_counter() - start
+    if output:
+        output.close()
+
+    measurements = [m for result in results for m in result]
+    return summarize(measurements, elapsed, len(sessions), errors)
+
+
+def format_report(report) -> str:
+    out = io.StringIO()
+    out.write(f"{'Sessions:':<20}{report['sessions']} ({report['failed_sessions']} failed)\n")
+    out.write(f"{'Requests:':<20}{report['requests']} in {report['elapsed_s']:.2f}s\n")
+    out.write(f"{'Throughput:':<20}{report['requests_per_s']:.1f} req/s, {report['sessions_per_s']:.2f} sessions/s\n")
+    out.write(f"{'Transferred:':<20}{report['bytes_sent']:,} B sent, {report['bytes_received']:,} B received\n\n")
+    out.write(f"{'Step':<16}{'Count':>7}{'p50 ms':>10}{'p90 ms':>10}{'p95 ms':>10}{'p99 ms':>10}"
+              f"{'Avg sent':>12}{'Avg recv':>12}\n")
+    for step, stats in report["steps"].items():
+        out.write(f"{step:<16}{stats['requests']:>7}{stats['p50_ms']:>10.1f}{stats['p90_ms']:>10.1f}"
+                  f"{stats['p95_ms']:>10.1f}{stats['p99_ms']:>10.1f}"
+                  f"{stats['bytes_sent'] // stats['requests']:>12,}{stats['bytes_received'] // stats['requests']:>12,}\n")
+    for error in report["errors"]:
+        out.write(f"ERROR: {error}\n")
+    return out.getvalue()
@@ -0,0 +1,297 @@
+import contextlib
+import csv
+import io
+import json
+import time
+from app.middleware.catalog import get_catalog
+from app.middleware.course_parsing import add_gen_ed_elective, add_free_elective
+
+EXPORT_FORMATS = ("csv", "jsonl", "ics")
+EXPORT_MIMETYPES = {
+    "csv": "text/csv",
+    "jsonl": "application/x-ndjson",
+    "ics": "text/calendar"
+}
+# exports are sent in pieces of about this many characters, so no export is held in memory whole
+CHUNK_SIZE = 64 * 1024
+# one row per course placement in CSV exports
+COURSE_FIELDS = ("course", "name", "credits", "category")
+CSV_FIELDS = ["plan", "user_name", "degree_choice", "term", "semester_number", *COURSE_FIELDS]
+
+# the catalog has no academic calendar, so terms are exported as these (month, day) spans, end exclusive
+TERM_DATES = {
+    "Spring": ((1, 16), (5, 16)),
+    "Summer": ((6, 1), (8, 1)),
+    "Fall": ((8, 24), (12, 16))
+}
+ICS_PRODID = "-//UMSL Course Scheduler//Plan Export//EN"
+# profiles planned by one export request; larger cohorts are planned with `flask plan` and exported with `flask export`
+MAX_EXPORT_PROFILES = 20
+# RFC 5545 lines are folded at 75 octets
+ICS_LINE_OCTETS = 75
+
+
+def course_details(course: str) -> dict:
+    # bulk plans only list course numbers, so names and credits come from the catalog
+    for placeholder in (add_gen_ed_elective(), add_free_elective()):
+        if course == placeholder["course"]:
+            return {field: placeholder[field] for field in COURSE_FIELDS}
+    with contextlib.redirect_stdout(io.StringIO()):
+        info = get_catalog()["courses"].get(course, {})
+    return {"course": course, "name": info.get("course_name", ""), "credits": info.get("credit", ""), "category": ""}
+
+
+def check_term(term) -> str:
+    # a term must be a season with dates in `TERM_DATES` and a year, i.e. "Fall 2027"
+    season, _, year = str(term).rpartition(" ")
+    if season not in TERM_DATES or not year.isdigit():
+        raise ValueError(f"Unknown term: {term!r}, expected a season ({', '.join(TERM_DATES)}) and a year")
+    return term
+
+
+def check_list(value, name: str) -> list:
+    if not isinstance(value, list):
+        raise TypeError(f"{name} must be a list, not {type(value).__name__}")
+    return value
+
+
+def export_course(course) -> dict:
+    # a course number, looked up in the catalog, or a course dict as the schedule page posts it
+    if isinstance(course, str):
+        return course_details(course)
+    if not isinstance(course, dict):
+        raise TypeError(f"a course must be a course number or a dict, not {type(course).__name__}")
+    return {field: course.get(field, "") for field in COURSE_FIELDS}
+
+
+def normalize_plan(plan, index: int = 0) -> dict:
+    """
+    reads a plan from any of the shapes the scheduler produces, checking its terms and lists.
+
+    Accepted are a `course_schedule` list as the schedule page posts it, a dict holding one (i.e. a what-if
+    plan), a `flask plan` result, whose semesters list course numbers under `schedule`, or a plan this
+    function returned, i.e. a line of a JSONL export.
+
+    Parameters
+    ----------
+    plan:       Union[dict, list]
+                the plan
+    index:      int
+                identifies the plan in the export when it has no `plan_id` or `row` of its own
+    Returns
+    ----------
+    dict
+                plan, user_name, degree_choice and status, and the semesters, each with its term,
+                semester_number, credits and a dict per course
+    """
+    if isinstance(plan, list):
+        plan = {"course_schedule": plan}
+    if not isinstance(plan, dict):
+        raise TypeError(f"a plan must be a dict or a list of semesters, not {type(plan).__name__}")
+    profile = plan.get("profile") or {}
+    semesters = []
+    if "course_schedule" in plan:
+        course_schedule = plan["course_schedule"]
+        if isinstance(course_schedule, str):
+            course_schedule = json.loads(course_schedule)
+        for number, semester in enumerate(check_list(course_schedule, "course_schedule")):
+            semesters.append({
+                "term": check_term(f"{semester['semester']} {semester['year']}"),
+                "semester_number": semester.get("semester_number", number),
+                "credits": semester.get("credits", 0),
+                "courses": [export_course(course) for course in check_list(semester["schedule"], "schedule")]
+            })
+    else:
+        # a `flask plan` result, whose "semesters" counts its terms, or a plan already normalized
+        normalized = isinstance(plan.get("semesters"), list)
+        for number, semester in enumerate(check_list(plan["semesters"] if normalized else plan.get("schedule", []),
+                                                     "semesters" if normalized else "schedule")):
+            semesters.append({
+                "term": check_term(semester["term"]),
+                "semester_number": semester.get("semester_number", number) if normalized else number,
+                "credits": semester.get("credits", 0),
+                "courses": [export_course(course) for course in check_list(semester["courses"], "courses")]
+            })
+    return {
+        "plan": str(plan.get("plan") or plan.get("plan_id") or plan.get("row") or index + 1),
+        "user_name": plan.get("user_name") or profile.get("user_name", ""),
+        "degree_choice": plan.get("degree_choice") or profile.get("degree_choice", ""),
+        "status": plan.get("status", "planned"),
+        "semesters": semesters
+    }
+
+
+# what a plan that cannot be read raises; see `readable_plans`
+PLAN_ERRORS = (ValueError, KeyError, TypeError, AttributeError)
+
+
+def readable_plans(plans):
+    """
+    normalizes each plan as it is exported.
+
+    The checks that can be made before an export starts are made by the route; a plan that still cannot
+    be read, i.e. one planned from a profile as the export is sent, is reported in the export instead of
+    ending the response half-way.
+
+    Yields
+    ----------
+    tuple
+                the plan number, and the normalized plan or None, and the error or None
+    """
+    iterator = iter(plans)
+    index = 0
+    while True:
+        try:
+            plan = next(iterator)
+            yield index + 1, normalize_plan(plan, index), None
+        except StopIteration:
+            return
+        except PLAN_ERRORS as error:
+            yield index + 1, None, f"{type(error).__name__}: {error}"
+        index += 1
+
+
+def chunked(pieces):
+    # joins many small strings into pieces of about `CHUNK_SIZE` characters
+    buffer = []
+    size = 0
+    for piece in pieces:
+        buffer.append(piece)
+        size += len(piece)
+        if size >= CHUNK_SIZE:
+            yield "".join(buffer)
+            buffer = []
+            size = 0
+    if buffer:
+        yield "".join(buffer)
+
+
+def csv_lines(plans):
+    out = io.StringIO()
+    writer = csv.DictWriter(out, fieldnames=CSV_FIELDS)
+    writer.writeheader()
+    for number, plan, error in readable_plans(plans):
+        # a plan that cannot be read is one row, with the error as its name
+        semesters = plan["semesters"] if error is None else []
+        if error:
+            writer.writerow({"plan": number, "name": error, "category": "error"})
+        for semester in semesters:
+            for course in semester["courses"]:
+                writer.writerow({
+                    "plan": plan["plan"],
+                    "user_name": plan["user_name"],
+                    "degree_choice": plan["degree_choice"],
+                    "term": semester["term"],
+                    "semester_number": semester["semester_number"],
+                    **course
+                })
+        yield out.getvalue()
+        out.seek(0)
+        out.truncate()
+
+
+def jsonl_lines(plans):
+    for number, plan, error in readable_plans(plans):
+        yield json.dumps(plan if error is None else {"plan": str(number), "error": error}) + "\n"
+
+
+def ics_escape(text) -> str:
+    return str(text).replace("\\", "\\\\").replace(";", "\\;").replace(",", "\\,").replace("\n", "\\n")
+
+
+def ics_line(line: str) -> str:
+    # folds a content line so no physical line is longer than `ICS_LINE_OCTETS` octets
+    folded = []
+    current = ""
+    current_octets = 0
+    limit = ICS_LINE_OCTETS
+    for character in line:
+        octets = len(character.encode())
+        if current_octets + octets > limit:
+            folded.append(current)
+            current = " "
+            current_octets = 1
+        current += character
+        current_octets += octets
+    folded.append(current)
+    return "\r\n".join(folded) + "\r\n"
+
+
+def term_dates(term: str) -> tuple:
+    season, year = term.rsplit(" ", 1)
+    (start_month, start_day), (end_month, end_day) = TERM_DATES[season]
+    return f"{year}{start_month:02}{start_day:02}", f"{year}{end_month:02}{end_day:02}"
+
+
+def ics_lines(plans):
+    stamp = time.strftime("%Y%m%dT%H%M%SZ", time.gmtime())
+    yield ics_line("BEGIN:VCALENDAR") + ics_line("VERSION:2.0") + ics_line(f"PRODID:{ICS_PRODID}") \
+        + ics_line("CALSCALE:GREGORIAN")
+    for number, plan, error in readable_plans(plans):
+        if error:
+            # a journal entry rather than an event, since the plan has no dates
+            yield "".join(ics_line(line) for line in [
+                "BEGIN:VJOURNAL",
+                f"UID:error-{number}@course-scheduler",
+                f"DTSTAMP:{stamp}",
+                f"SUMMARY:{ics_escape(f'Plan {number} not exported')}",
+                f"DESCRIPTION:{ics_escape(error)}",
+                "END:VJOURNAL"
+            ])
+            continue
+        events = []
+        for semester in plan["semesters"]:
+            start, end = term_dates(semester["term"])
+            for position, course in enumerate(semester["courses"]):
+                # one all-day event spanning the term, per term and course; electives repeat, so the position keeps UIDs unique
+                uid = f"{plan['plan']}-{semester['term']}-{position}-{course['course']}".replace(" ", "-")
+                summary = f"{course['course']} {course['name']}".strip()
+                description = f"{course['credits']} credits, {semester['term']}"
+                if plan["user_name"]:
+                    description += f", {plan['user_name']}"
+                events.extend([
+                    "BEGIN:VEVENT",
+                    f"UID:{ics_escape(uid)}@course-scheduler",
+                    f"DTSTAMP:{stamp}",
+                    f"DTSTART;VALUE=DATE:{start}",
+                    f"DTEND;VALUE=DATE:{end}",
+                    f"SUMMARY:{ics_escape(summary)}",
+                    f"DESCRIPTION:{ics_escape(description)}",
+                    "TRANSP:TRANSPARENT",
+                    "END:VEVENT"
+                ])
+                if course.get("category"):
+                    events.insert(-2, f"CATEGORIES:{ics_escape(course['category'])}")
+        yield "".join(ics_line(line) for line in events)
+    yield ics_line("END:VCALENDAR")
+
+
+def export_plans(plans, export_format: str):
+    """
+    streams plans out as CSV (one row per course placement), JSONL (one plan per line) or iCalendar
+    (one event per term and course).
+
+    Plans are read one at a time, so `plans` may be a generator that plans students as the export is sent.
+
+    Parameters
+    ----------
+    plans:          iterable
+                    plans in any shape `normalize_plan` reads
+    export_format:  str
+                    one of `EXPORT_FORMATS`
+    Yields
+    ----------
+    str
+                    pieces of the export, about `CHUNK_SIZE` characters each
+    """
+    if export_format not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown export format: {export_format}, expected one of {', '.join(EXPORT_FORMATS)}")
+    lines = {"csv": csv_lines, "jsonl": jsonl_lines, "ics": ics_lines}[export_format]
+    return chunked(lines(plans))
+
+
+def read_plans(fd):
+    # streams plans from a JSONL file, such as the output of `flask plan`
+    for line in fd:
+        if line.strip():
+            yield json.loads(line)
@@ -0,0 +1,199 @@
+import copy
+
+ELECTIVE_NAME = '[User Selects]'
+ENGLISH_3130_MIN_CREDITS = 48
+
+# courses the client pins to early semesters, see `drop` in drag_drop_utils.js
+FIXED_SEMESTER_COURSES = {
+    "INTDSC 1003": (0, "INTDSC 1003 must be taken in the first semester!"),
+    "CMP SCI 1000": (1, "CMP SCI 1000 must be taken in the first or second semester!")
+}
+
+
+def apply_moves(course_schedule: list, moves: list) -> list:
+    """
+    moves courses between semesters the same way a drop does in drag_drop_utils.js.
+
+    Parameters
+    ----------
+    course_schedule:    list
+                        the plan, with one dict per semester
+    moves:              list
+                        dicts with the `course` to move and the `to_semester` number to move it to
+    Returns
+    ----------
+    list
+                        a copy of the plan with the moves applied
+    """
+    course_schedule = copy.deepcopy(course_schedule)
+    semesters = {semester["semester_number"]: semester for semester in course_schedule}
+    for move in moves:
+        course_num = move["course"]
+        to_semester = semesters.get(int(move["to_semester"]))
+        if to_semester is None:
+            raise ValueError(f"Semester {move['to_semester']} is not in the plan")
+
+        from_semester = next((semester for semester in course_schedule
+                              if any(course["course"] == course_num for course in semester["schedule"])), None)
+        if from_semester is None:
+            raise ValueError(f"{course_num} is not in the plan")
+        if from_semester is to_semester:
+            continue
+
+        index = next(i for i, course in enumerate(from_semester["schedule"]) if course["course"] == course_num)
+        course = from_semester["schedule"].pop(index)
+        from_semester["credits"] = int(from_semester["credits"]) - int(course["credits"])
+        to_semester["schedule"].append(course)
+        to_semester["credits"] = int(to_semester["credits"]) + int(course["credits"])
+    return course_schedule
+
+
+def check_prerequisites(course_num, prerequisites, concurrent, taken_before, current_courses, credits_through_semester, required_courses) -> tuple:
+    """
+    checks a course's prerequisites, following `prereqVerification` in drag_drop_utils.js.
+
+    Returns
+    ----------
+    tuple
+                the passed_validation flag and the failure message
+    """
+    required_courses_taken = False
+    failed_message = ""
+
+    def is_satisfied(prereq):
+        return prereq in taken_before or (prereq in current_courses and prereq == concurrent)
+
+    def failed(prereq):
+        return f"{course_num} prerequisite ({prereq}) has to be completed prior to the selected semester!"
+
+    for prereqs in prerequisites:
+        if isinstance(prereqs, tuple):
+            if len(prereqs) == 1:
+                if is_satisfied(prereqs[0]):
+                    required_courses_taken = True
+                    break
+                if prereqs[0] in required_courses:
+                    failed_message = failed(prereqs[0])
+                required_courses_taken = False
+            else:
+                # every course in the option must be satisfied
+                required_courses_taken = False
+                for prereq in prereqs:
+                    required_courses_taken = is_satisfied(prereq)
+                    if not required_courses_taken:
+                        if prereq in required_courses:
+                            failed_message = failed(prereq)
+                        break
+                if required_courses_taken:
+                    break
+        elif course_num == "ENGLISH 3130":
+            if credits_through_semester < ENGLISH_3130_MIN_CREDITS:
+                failed_message = (f"ENGLISH 3130 does not meet it's criteria of a minimum of {ENGLISH_3130_MIN_CREDITS} credit hours "
+                                  f"for the selected semester! Currently at {credits_through_semester} credits.")
+                required_courses_taken = False
+            elif prereqs not in taken_before:
+                if prereqs in required_courses:
+                    failed_message = failed(prereqs)
+                required_courses_taken = False
+            else:
+                required_courses_taken = True
+                break
+        elif is_satisfied(prereqs):
+            # the client keeps checking the remaining string entries, so the last one decides
+            required_courses_taken = True
+        else:
+            if prereqs in required_courses:
+                failed_message = failed(prereqs)
+            required_courses_taken = False
+
+    return required_courses_taken, failed_message
+
+
+def validate_plan(course_schedule: list, courses_taken: list, catalog: dict, required_courses=None, moves=None) -> dict:
+    """
+    validates every course in a plan in one pass over its semesters.
+
+    The result matches the `passed_validation` and `validation_msg` the client sets when a course is
+    dropped into its semester, using the compiled catalog instead of the hidden form fields.
+
+    Parameters
+    ----------
+    course_schedule:    list
+                        the plan, as posted in the `course_schedule` form field
+    courses_taken:      list
+                        courses the student has already completed
+    catalog:            dict
+                        the compiled catalog, see `catalog.get_catalog`
+    required_courses:   list
+                        courses a failed prerequisite is reported for, defaults to the courses in the plan
+    moves:              list
+                        proposed moves applied before validating, see `apply_moves`
+    Returns
+    ----------
+    dict
+                        valid:              whether every course passed
+                        courses:            one dict per course with its semester and validation result
+                        course_schedule:    the plan with the validation results set on each course
+    """
+    if moves:
+        course_schedule = apply_moves(course_schedule, moves)
+    else:
+        course_schedule = copy.deepcopy(course_schedule)
+    semesters = sorted(course_schedule, key=lambda semester: semester["semester_number"])
+
+    scheduled = set()
+    for semester in semesters:
+        scheduled.update(course["course"] for course in semester["schedule"] if course["name"] != ELECTIVE_NAME)
+    if required_courses is None:
+        required_courses = scheduled
+    required_courses = set(required_courses)
+
+    # courses taken before the plan count as taken before every semester
+    taken_before = set(course for course in courses_taken if course not in scheduled)
+    credits_through_semester = 0
+    results = []
+
+    for semester in semesters:
+        semester_number = semester["semester_number"]
+        current_courses = set(course["course"] for course in semester["schedule"] if course["name"] != ELECTIVE_NAME)
+        credits_through_semester += int(semester["credits"])
+
+        for course in semester["schedule"]:
+            course_num = course["course"]
+            record = catalog["records"].get(course_num)
+            if course["name"] == ELECTIVE_NAME or record is None:
+                continue
+
+            passed_validation = True
+            validation_msg = ""
+            if course_num in FIXED_SEMESTER_COURSES:
+                latest_semester, message = FIXED_SEMESTER_COURSES[course_num]
+                if semester_number > latest_semester:
+                    passed_validation = False
+                    validation_msg = message
+            elif semester["semester"] not in record.offered:
+                passed_validation = False
+                validation_msg = f"{course_num} is not offered during the {semester['semester']} semester!"
+            elif record.prerequisites:
+                passed_validation, failed_message = check_prerequisites(
+                    course_num, record.prerequisites, record.concurrent,
+                    taken_before, current_courses, credits_through_semester, required_courses)
+                if not passed_validation:
+                    validation_msg = f"{course_num} failed prerequisite validation. {failed_message}"
+
+            course["passed_validation"] = passed_validation
+            course["validation_msg"] = validation_msg
+            results.append({
+                "course": course_num,
+                "semester_number": semester_number,
+                "passed_validation": passed_validation,
+                "validation_msg": validation_msg
+            })
+
+        taken_before.update(current_courses)
+
+    return {
+        "valid": all(result["passed_validation"] for result in results),
+        "courses": results,
+        "course_schedule": course_schedule
+    }
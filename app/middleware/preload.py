@@ -0,0 +1,196 @@
+import contextlib
+import gc
+import io
+import multiprocessing
+import os
+import time
+from app.middleware import course_parsing
+from app.middleware.catalog import get_catalog
+from app.middleware.load_test import TestClientTransport, synthesize_sessions, run_session
+
+# (name, function) pairs run by `preload_app`, in order; each takes the Flask app
+PRELOAD_STEPS = []
+
+
+def preload_step(name):
+    # registers a function that builds shared data before the server forks its workers
+    def register(function):
+        PRELOAD_STEPS.append((name, function))
+        return function
+    return register
+
+
+@preload_step("catalog")
+def preload_catalog(app) -> None:
+    # the compiled catalog, its prerequisite graph, and the decoded copy the scheduler reads the home page's catalog into
+    catalog = get_catalog()
+    course_parsing.decode_courses_dict(catalog["courses_json"])
+
+
+@preload_step("offering filters")
+def preload_offering_filters(app) -> None:
+    for term in course_parsing.OFFERING_TERMS:
+        course_parsing.build_offering_filter(term, course_parsing.DELIVERY_MODES)
+
+
+@preload_step("requirements")
+def preload_requirements(app) -> None:
+    # every degree with every subset of certificates
+    course_parsing.requirement_table(get_catalog()["courses_json"])
+
+
+@preload_step("templates")
+def preload_templates(app) -> None:
+    for name in app.jinja_env.list_templates():
+        app.jinja_env.get_template(name)
+
+
+def preload_app(app) -> dict:
+    """
+    builds everything requests share before the server forks, then freezes it for copy-on-write.
+
+    Garbage collection is paused while building, so freed objects do not leave holes between the shared
+    ones, and `gc.freeze` moves everything built so far out of the collector's reach. The collector then
+    no longer writes to those objects, so their pages stay shared with the forked workers.
+
+    Parameters
+    ----------
+    app:        Flask
+                the app whose templates are compiled
+    Returns
+    ----------
+    dict
+                steps:          seconds spent in each step
+                frozen_objects: objects moved to the permanent generation
+    """
+    steps = {}
+    gc.disable()
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            for name, function in PRELOAD_STEPS:
+                start = time.perf_counter()
+                function(app)
+                steps[name] = time.perf_counter() - start
+        gc.freeze()
+    finally:
+        gc.enable()
+    return {"steps": steps, "frozen_objects": gc.get_freeze_count()}
+
+
+def process_memory(pid="self") -> dict:
+    """
+    reads a process's memory from /proc, in kB.
+
+    Returns
+    ----------
+    dict
+                rss:    resident pages, shared or not
+                pss:    resident pages, with each shared page split between the processes sharing it
+                uss:    pages only this process has, which is what each extra worker costs
+    """
+    fields = {}
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as fd:
+            lines = fd.readlines()
+    except FileNotFoundError:
+        raise RuntimeError("Memory is read from /proc/<pid>/smaps_rollup, which needs Linux 4.14 or later")
+    for line in lines:
+        parts = line.split()
+        if len(parts) == 3 and parts[2] == "kB":
+            fields[parts[0].rstrip(":")] = int(parts[1])
+    return {
+        "rss": fields.get("Rss", 0),
+        "pss": fields.get("Pss", 0),
+        "uss": fields.get("Private_Clean", 0) + fields.get("Private_Dirty", 0)
+    }
+
+
+def benchmark_worker(app, sessions, barrier, results) -> None:
+    # replay the sessions, then measure once every worker is done so shared pages are split between all of them
+    with open(os.devnull, "w") as output, contextlib.redirect_stdout(output):
+        transport = TestClientTransport(app)
+        for session in sessions:
+            run_session(transport, session)
+    barrier.wait()
+    results.put(process_memory())
+    barrier.wait()
+
+
+def benchmark_server(app, preload, num_workers, sessions, results) -> None:
+    # stands in for the server's master process: optionally preloads, then forks the workers
+    context = multiprocessing.get_context("fork")
+    if preload:
+        preload_app(app)
+    barrier = context.Barrier(num_workers)
+    worker_results = context.Queue()
+    workers = [context.Process(target=benchmark_worker, args=(app, sessions, barrier, worker_results))
+               for _ in range(num_workers)]
+    for worker in workers:
+        worker.start()
+    memory = [worker_results.get() for _ in workers]
+    master = process_memory()
+    for worker in workers:
+        worker.join()
+    results.put({"workers": memory, "master": master})
+
+
+def summarize_memory(memory: dict) -> dict:
+    workers = memory["workers"]
+    return {
+        "workers": len(workers),
+        "worker_uss_kb": sum(worker["uss"] for worker in workers) / len(workers),
+        "worker_pss_kb": sum(worker["pss"] for worker in workers) / len(workers),
+        "worker_rss_kb": sum(worker["rss"] for worker in workers) / len(workers),
+        "max_worker_uss_kb": max(worker["uss"] for worker in workers),
+        "master_pss_kb": memory["master"]["pss"],
+        "total_pss_kb": sum(worker["pss"] for worker in workers) + memory["master"]["pss"]
+    }
+
+
+def run_memory_benchmark(app, num_workers=4, num_sessions=4, next_semesters=4, seed=0) -> dict:
+    """
+    measures per-worker memory with and without `preload_app`, after each worker replays the same sessions.
+
+    Each mode runs in a fresh fork of this process, so neither mode sees what the other built.
+
+    Parameters
+    ----------
+    app:                Flask
+                        the app the workers serve
+    num_workers:        int
+                        workers forked per mode
+    num_sessions:       int
+                        sessions each worker replays, see `load_test.synthesize_sessions`
+    next_semesters:     int
+                        "Continue Schedule" posts per session
+    seed:               int
+                        seed for the sessions
+    Returns
+    ----------
+    dict
+                        "lazy" and "preload" summaries, see `summarize_memory`
+    """
+    context = multiprocessing.get_context("fork")
+    sessions = synthesize_sessions(num_sessions, next_semesters, seed)
+    report = {}
+    for mode, preload in (("lazy", False), ("preload", True)):
+        results = context.Queue()
+        server = context.Process(target=benchmark_server, args=(app, preload, num_workers, sessions, results))
+        server.start()
+        report[mode] = summarize_memory(results.get())
+        server.join()
+    return report
+
+
+def format_memory_report(report: dict) -> str:
+    out = io.StringIO()
+    out.write(f"{'Mode':<10}{'Workers':>8}{'USS/worker':>13}{'PSS/worker':>13}{'RSS/worker':>13}"
+              f"{'Master PSS':>13}{'Total PSS':>13}\n")
+    for mode, summary in report.items():
+        out.write(f"{mode:<10}{summary['workers']:>8}{summary['worker_uss_kb'] / 1024:>10.1f} MB"
+                  f"{summary['worker_pss_kb'] / 1024:>10.1f} MB{summary['worker_rss_kb'] / 1024:>10.1f} MB"
+                  f"{summary['master_pss_kb'] / 1024:>10.1f} MB{summary['total_pss_kb'] / 1024:>10.1f} MB\n")
+    if "lazy" in report and "preload" in report:
+        saved = report["lazy"]["worker_uss_kb"] - report["preload"]["worker_uss_kb"]
+        out.write(f"\nPreloading saves {saved / 1024:.1f} MB of unique memory per worker.\n")
+    return out.getvalue()
@@ -0,0 +1,106 @@
+import contextlib
+import io
+import os
+import random
+import statistics
+import time
+from app.middleware import course_parsing
+from app.middleware.catalog import get_catalog
+from app.middleware.forecast import DEFAULT_MAX_TERMS
+from app.middleware.student_profiles import DEGREES, build_first_semester_form, elective_heavy_profile, random_profile
+
+# "elective-heavy" plans are mostly placeholders, "random" plans are mostly catalog courses
+PROFILE_KINDS = ("elective-heavy", "random")
+# placeholders added when no catalog course can be placed have no course name of their own
+PLACEHOLDER_NAME = "[User Selects]"
+
+
+def benchmark_forms(kind: str, num_students: int, seed: int, required_courses_dict: str) -> list:
+    # the first-semester forms of `num_students` profiles of one kind, see `PROFILE_KINDS`
+    rng = random.Random(seed)
+    required_courses = {degree: course_parsing.program_requirements(required_courses_dict, degree, [], [])["required"]
+                        for degree in DEGREES}
+    forms = []
+    for index in range(num_students):
+        if kind == "elective-heavy":
+            profile = elective_heavy_profile(rng, index, required_courses)
+        else:
+            profile = random_profile(rng, index)
+        forms.append(build_first_semester_form(profile, required_courses_dict, True))
+    return forms
+
+
+def plan_form(form, seed, max_terms=DEFAULT_MAX_TERMS) -> tuple:
+    # generates the full greedy plan of one form, returning (semesters, courses, placeholders)
+    random.seed(seed)
+    state = course_parsing.read_scheduler_state(form)
+    semesters = courses = placeholders = 0
+    if not state["is_graduated"]:
+        for semester_info in course_parsing.semester_generator(state):
+            semesters += 1
+            courses += len(semester_info["schedule"])
+            placeholders += sum(course["name"] == PLACEHOLDER_NAME for course in semester_info["schedule"])
+            if semesters >= max_terms:
+                break
+    return semesters, courses, placeholders
+
+
+def run_schedule_benchmark(num_students=200, seed=0, runs=3, max_terms=DEFAULT_MAX_TERMS) -> dict:
+    """
+    times full greedy plans of elective-heavy and random profiles.
+
+    Every run plans the same students with the same seeds, so the plans (and the counts reported) are
+    the same in each run; only the times differ. The fastest run is reported for each student.
+
+    Parameters
+    ----------
+    num_students:   int
+                    students planned per profile kind
+    seed:           int
+                    seed for the profiles and the scheduler's choices
+    runs:           int
+                    times each plan is generated
+    max_terms:      int
+                    terms after which a plan is cut off
+    Returns
+    ----------
+    dict
+                    per profile kind: students, semesters, courses and placeholders per plan, the median,
+                    95th percentile and mean milliseconds per plan, and plans per second
+    """
+    with contextlib.redirect_stdout(io.StringIO()):
+        required_courses_dict = get_catalog()["courses_json"]
+    report = {"students": num_students, "seed": seed, "runs": runs, "kinds": {}}
+    for kind in PROFILE_KINDS:
+        forms = benchmark_forms(kind, num_students, seed, required_courses_dict)
+        timings = [float("inf")] * len(forms)
+        with open(os.devnull, "w") as output, contextlib.redirect_stdout(output):
+            for _ in range(runs):
+                counts = []
+                for index, form in enumerate(forms):
+                    start_time = time.perf_counter()
+                    counts.append(plan_form(form, f"{seed}:{index}", max_terms))
+                    timings[index] = min(timings[index], (time.perf_counter() - start_time) * 1000)
+        ordered = sorted(timings)
+        report["kinds"][kind] = {
+            "semesters_per_plan": statistics.mean(semesters for semesters, _, _ in counts),
+            "courses_per_plan": statistics.mean(courses for _, courses, _ in counts),
+            "placeholders_per_plan": statistics.mean(placeholders for _, _, placeholders in counts),
+            "median_ms": statistics.median(ordered),
+            "p95_ms": ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))],
+            "mean_ms": statistics.mean(ordered),
+            "plans_per_s": 1000 / statistics.mean(ordered)
+        }
+    return report
+
+
+def format_schedule_benchmark(report: dict) -> str:
+    out = io.StringIO()
+    out.write(f"{report['students']} students per kind, fastest of {report['runs']} runs\n\n")
+    out.write(f"{'Profiles':<16}{'Terms':>8}{'Courses':>9}{'Electives':>11}{'Median ms':>11}{'p95 ms':>9}"
+              f"{'Plans/s':>9}\n")
+    for kind, result in report["kinds"].items():
+        out.write(f"{kind:<16}{result['semesters_per_plan']:>8.1f}{result['courses_per_plan']:>9.1f}"
+                  f"{result['placeholders_per_plan']:>11.1f}{result['median_ms']:>11.2f}{result['p95_ms']:>9.2f}"
+                  f"{result['plans_per_s']:>9.0f}\n")
+    return out.getvalue()
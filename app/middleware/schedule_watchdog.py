@@ -0,0 +1,73 @@
+import multiprocessing
+import os
+from app.middleware import course_parsing
+
+# full schedules are generated in a separate worker process when set, i.e. SCHEDULER_WATCHDOG=1
+WATCHDOG_ENV = "SCHEDULER_WATCHDOG"
+# seconds the watchdog waits past the scheduler's own timeout before killing the worker
+WATCHDOG_GRACE_SECONDS = 5
+
+
+def is_enabled() -> bool:
+    return bool(os.environ.get(WATCHDOG_ENV))
+
+
+def full_schedule_worker(connection, state: dict) -> None:
+    # runs in the worker process, sending back the scheduled state or the error that stopped it
+    try:
+        course_parsing.run_scheduler(state)
+        connection.send(("done", state))
+    except Exception as error:
+        connection.send(("error", f"{type(error).__name__}: {error}"))
+    finally:
+        connection.close()
+
+
+def run_isolated(state: dict, timeout=None) -> dict:
+    """
+    generates a full schedule in a forked worker process, killing the worker if it runs too long.
+
+    The worker starts from a copy of the request's process, so it shares the compiled catalog and the
+    random state, and plans exactly what `course_parsing.run_scheduler` would. The scheduler stops
+    itself at `MAX_SCHEDULE_TERMS` or its timeout; the watchdog only fires if a single semester hangs.
+
+    Parameters
+    ----------
+    state:      dict
+                the scheduler variables, see `course_parsing.read_scheduler_state`
+    timeout:    float
+                seconds before the worker is killed, defaults to the scheduler's timeout plus
+                `WATCHDOG_GRACE_SECONDS`
+    Returns
+    ----------
+    dict
+                the scheduled state, or `state` unchanged except for `unschedulable` if the worker was killed
+    """
+    if timeout is None:
+        timeout = course_parsing.schedule_timeout(state) + WATCHDOG_GRACE_SECONDS
+    context = multiprocessing.get_context("fork")
+    receiver, sender = context.Pipe(duplex=False)
+    worker = context.Process(target=full_schedule_worker, args=(sender, state), daemon=True)
+    worker.start()
+    sender.close()
+    try:
+        result = receiver.recv() if receiver.poll(timeout) else None
+    except EOFError:
+        # the worker exited without sending anything, i.e. it was killed by the OS
+        result = ("exited", None)
+    finally:
+        if worker.is_alive():
+            worker.kill()
+        worker.join()
+        receiver.close()
+
+    if result == ("exited", None):
+        raise RuntimeError(f"Schedule worker exited with code {worker.exitcode}")
+    if result is None:
+        print(f"Schedule watchdog: killed the worker after {timeout:g}s")
+        state["unschedulable"] = course_parsing.unschedulable_result(state, f"stopped by the watchdog after {timeout:g}s")
+        return state
+    status, value = result
+    if status == "error":
+        raise RuntimeError(value)
+    return value
@@ -0,0 +1,184 @@
+import contextlib
+import io
+import importlib
+import json
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+
+# modules the views import on first use, imported up front by `warmup`
+WARMUP_MODULES = [
+    "app.middleware.course_parsing",
+    "app.middleware.catalog",
+    "app.middleware.plan_validation",
+    "app.middleware.critical_path",
+    "app.middleware.constraint_scheduler",
+    "app.middleware.what_if"
+]
+
+# requests that load the catalog and every template a student sees first
+WARMUP_PATHS = ["/healthz", "/index"]
+
+# run in a fresh interpreter to time each phase of a cold start
+COLD_START_SCRIPT = """
+import json, time
+start = time.perf_counter()
+from app import app
+imported = time.perf_counter()
+client = app.test_client()
+client.get("/healthz")
+healthz = time.perf_counter()
+client.get("/index")
+index = time.perf_counter()
+print(json.dumps({"import_ms": (imported - start) * 1000, "healthz_ms": (healthz - imported) * 1000,
+                  "index_ms": (index - healthz) * 1000}))
+"""
+
+
+def warmup(app, url=None, requests_per_path=1) -> dict:
+    """
+    loads the scheduler modules, the catalog and the templates before the first student request.
+
+    Parameters
+    ----------
+    app:                Flask
+                        the app to warm in this process
+    url:                str
+                        warms a running server instead, i.e. http://127.0.0.1:5000, by requesting `WARMUP_PATHS`
+    requests_per_path:  int
+                        requests sent to each path of a running server, so each of its workers is reached
+    Returns
+    ----------
+    dict
+                        step -> milliseconds
+    """
+    timings = {}
+    if url:
+        for path in WARMUP_PATHS:
+            start = time.perf_counter()
+            for _ in range(requests_per_path):
+                with urllib.request.urlopen(url.rstrip("/") + path) as response:
+                    response.read()
+            timings[path] = (time.perf_counter() - start) * 1000
+        return timings
+
+    from app.middleware.preload import PRELOAD_STEPS
+    with contextlib.redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        for module in WARMUP_MODULES:
+            importlib.import_module(module)
+        timings["imports"] = (time.perf_counter() - start) * 1000
+        for name, function in PRELOAD_STEPS:
+            start = time.perf_counter()
+            function(app)
+            timings[name] = (time.perf_counter() - start) * 1000
+        client = app.test_client()
+        for path in WARMUP_PATHS:
+            start = time.perf_counter()
+            status = client.get(path).status_code
+            if status != 200:
+                raise RuntimeError(f"{path} returned {status}")
+            timings[path] = (time.perf_counter() - start) * 1000
+    return timings
+
+
+def parse_importtime(output: str) -> list:
+    """
+    parses the report `python -X importtime` writes to stderr.
+
+    Returns
+    ----------
+    list
+                one (module, self_us, cumulative_us, depth) tuple per import, in the order they finished
+    """
+    imports = []
+    for line in output.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        fields = line[len("import time:"):].split("|")
+        if len(fields) != 3 or not fields[0].strip().isdigit():
+            continue
+        name = fields[2].rstrip()
+        module = name.lstrip()
+        depth = (len(name) - len(module) - 1) // 2
+        imports.append((module, int(fields[0]), int(fields[1]), depth))
+    return imports
+
+
+def run_import_benchmark(module="app", runs=5, top=10, cwd=None) -> dict:
+    """
+    measures the cold-start time of fresh interpreters, as a short-lived worker would see it.
+
+    Parameters
+    ----------
+    module:     str
+                the module imported with `-X importtime`
+    runs:       int
+                fresh interpreters started for each measurement; medians are reported
+    top:        int
+                number of slowest imports listed
+    cwd:        str
+                directory the interpreters start in, defaults to the current one
+    Returns
+    ----------
+    dict
+                import_ms:      median cumulative import time of `module`
+                cold_start:     median milliseconds to import the app, serve `/healthz`, then serve `/index`
+                slowest:        the imports with the longest cumulative time below `module`
+                app_modules:    the app's own modules, with their self and cumulative times
+    """
+    totals = []
+    by_module = {}
+    for _ in range(runs):
+        result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                                capture_output=True, text=True, cwd=cwd)
+        if result.returncode != 0:
+            raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr.strip() else "import failed")
+        imports = parse_importtime(result.stderr)
+        totals.append(next(cumulative for name, _, cumulative, _ in imports if name == module))
+        for name, self_us, cumulative, depth in imports:
+            by_module.setdefault(name, []).append((self_us, cumulative, depth))
+
+    cold_starts = []
+    for _ in range(runs):
+        result = subprocess.run([sys.executable, "-c", COLD_START_SCRIPT], capture_output=True, text=True, cwd=cwd)
+        if result.returncode != 0:
+            raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr.strip() else "cold start failed")
+        cold_starts.append(json.loads(result.stdout.strip().splitlines()[-1]))
+
+    def median_times(samples):
+        return {
+            "self_ms": statistics.median(sample[0] for sample in samples) / 1000,
+            "cumulative_ms": statistics.median(sample[1] for sample in samples) / 1000,
+            "depth": samples[0][2]
+        }
+
+    modules = {name: median_times(samples) for name, samples in by_module.items() if name != module}
+    slowest = sorted(modules.items(), key=lambda item: -item[1]["cumulative_ms"])
+    return {
+        "module": module,
+        "runs": runs,
+        "import_ms": statistics.median(totals) / 1000,
+        "cold_start": {phase: statistics.median(sample[phase] for sample in cold_starts)
+                       for phase in ("import_ms", "healthz_ms", "index_ms")},
+        "slowest": [dict(module=name, **times) for name, times in slowest if times["depth"] == 1][:top],
+        "app_modules": [dict(module=name, **times) for name, times in sorted(modules.items())
+                        if name.startswith(module + ".")]
+    }
+
+
+def format_import_report(report: dict) -> str:
+    out = io.StringIO()
+    cold_start = report["cold_start"]
+    out.write(f"{'Import ' + report['module'] + ':':<20}{report['import_ms']:.1f} ms (median of {report['runs']})\n")
+    out.write(f"{'Cold start:':<20}{cold_start['import_ms']:.1f} ms import, {cold_start['healthz_ms']:.1f} ms /healthz, "
+              f"{cold_start['index_ms']:.1f} ms first /index\n\n")
+    out.write(f"{'Slowest imports':<40}{'Self ms':>10}{'Total ms':>10}\n")
+    for entry in report["slowest"]:
+        out.write(f"{entry['module']:<40}{entry['self_ms']:>10.1f}{entry['cumulative_ms']:>10.1f}\n")
+    out.write(f"\n{'App modules':<40}{'Self ms':>10}{'Total ms':>10}\n")
+    for entry in report["app_modules"]:
+        out.write(f"{entry['module']:<40}{entry['self_ms']:>10.1f}{entry['cumulative_ms']:>10.1f}\n")
+    return out.getvalue()
@@ -0,0 +1,185 @@
+import json
+import random
+from werkzeug.datastructures import MultiDict
+
+DEGREES = [
+    "BSComputerScience",
+    "BSComputingTechnology",
+    "BSCyberSecurity",
+    "BSDataScience"
+]
+
+CERTIFICATES = [
+    ("Artificial Intelligence", "AICERTReq"),
+    ("Cybersecurity", "CYBERCERTReq"),
+    ("Data Science", "DATACERTReq"),
+    ("Mobile Apps and Computing", "MOBILECERTReq"),
+    ("Internet and Web", "WEBCERTReq")
+]
+
+# courses commonly transferred in by incoming students
+COMMON_TRANSFER_COURSES = [
+    "ENGLISH 1100",
+    "MATH 1030",
+    "MATH 1035",
+    "MATH 1045",
+    "MATH 1100",
+    "MATH 1320",
+    "MATH 1800",
+    "CMP SCI 1250"
+]
+
+
+def requires_summer(profile: dict) -> bool:
+    """
+    determines if a profile must include summer semesters.
+
+    The B.S. in Cybersecurity and the Mobile Apps and Computing certificate both require a
+    course only offered in Summer (mirrors `cyber_degree_check` and `mobile_cert_check` in
+    `initial_page_utils.js`).
+
+    Parameters
+    ----------
+    profile:    dict
+                a student profile, see `random_profile`
+    Returns
+    ----------
+    bool
+    """
+    if profile["degree_choice"] == "BSCyberSecurity":
+        return True
+    return any(cert.endswith("MOBILECERTReq") for cert in profile["certificates"])
+
+
+def random_profile(rng: random.Random, index: int = 0) -> dict:
+    """
+    creates a plausible student profile for synthetic sessions and simulations.
+
+    Parameters
+    ----------
+    rng:        random.Random
+                the random number generator, seeded by the caller for reproducibility
+    index:      int
+                used to give each student a distinct name
+    Returns
+    ----------
+    dict
+                holds the same choices a student makes on the home page
+    """
+    certificates = []
+    if rng.random() < 0.4:
+        name, tag = rng.choice(CERTIFICATES)
+        certificates.append(f"{name},{tag}")
+
+    courses_taken = []
+    if rng.random() < 0.3:
+        courses_taken = rng.sample(COMMON_TRANSFER_COURSES, rng.randint(1, 3))
+
+    profile = {
+        "user_name": f"Student {index}",
+        "degree_choice": rng.choice(DEGREES),
+        "certificates": certificates,
+        "current_semester": rng.choice(["Fall", "Spring"]),
+        "include_summer": rng.random() < 0.3,
+        "minimum_semester_credits": rng.choice([12, 12, 15, 15, 15, 18]),
+        "minimum_summer_credits": rng.choice([3, 6, 6, 9]),
+        "courses_taken": courses_taken,
+        "waived_courses": [],
+        "ge_taken": rng.choice([0, 0, 0, 3, 6, 9]),
+        "fe_taken": rng.choice([0, 0, 0, 3]),
+        # the home page will not allow fewer credits than the completed courses are worth
+        "total_credits": 3 * len(courses_taken),
+        "aleks_check": rng.random() < 0.2
+    }
+    if requires_summer(profile):
+        profile["include_summer"] = True
+    return profile
+
+
+def elective_heavy_profile(rng: random.Random, index: int, required_courses: dict) -> dict:
+    """
+    creates a profile whose plan is mostly elective placeholders: a transfer student who has already
+    taken most of the degree's required courses and takes a heavy load.
+
+    Parameters
+    ----------
+    rng:                random.Random
+                        the random number generator, seeded by the caller for reproducibility
+    index:              int
+                        used to give each student a distinct name
+    required_courses:   dict
+                        degree -> the courses it requires, i.e. from `course_parsing.program_requirements`
+    Returns
+    ----------
+    dict
+                        see `random_profile`
+    """
+    profile = random_profile(rng, index)
+    required = sorted(set(required_courses[profile["degree_choice"]]))
+    profile["courses_taken"] = rng.sample(required, int(len(required) * rng.uniform(0.6, 0.9)))
+    profile["total_credits"] = 3 * len(profile["courses_taken"])
+    profile["minimum_semester_credits"] = rng.choice([15, 18, 18, 21])
+    profile["ge_taken"] = 0
+    profile["fe_taken"] = 0
+    return profile
+
+
+def build_first_semester_form(profile: dict, required_courses_dict: str,
+                              generate_complete_schedule: bool = False) -> MultiDict:
+    """
+    builds the form the home page posts to `/schedule` for a given profile.
+
+    Parameters
+    ----------
+    profile:                    dict
+                                a student profile, see `random_profile`
+    required_courses_dict:      str
+                                the JSON catalog embedded in the home page
+    generate_complete_schedule: bool
+                                True for "Generate Full Schedule", False for "Start Schedule by Semester"
+    Returns
+    ----------
+    MultiDict
+                                the posted form, with repeated keys for multi-selects
+    """
+    total_credits = int(profile.get("total_credits", 0))
+    form = MultiDict([
+        ("user_name", profile.get("user_name", "Student")),
+        ("degree_choice", profile["degree_choice"]),
+        ("current_semester", profile["current_semester"]),
+        ("minimum_semester_credits", str(profile["minimum_semester_credits"])),
+        ("minimum_summer_credits", str(profile["minimum_summer_credits"])),
+        ("ge_taken", str(profile.get("ge_taken", 0))),
+        ("fe_taken", str(profile.get("fe_taken", 0))),
+        ("total_credits", str(total_credits)),
+        # hidden variables from the home page
+        ("course_schedule", "[]"),
+        ("semester_number", "0"),
+        ("min_3000_course", "5"),
+        ("num_3000_replaced_by_cert_core", "0"),
+        ("cert_elective_courses_still_needed", "0"),
+        ("gen_ed_credits_still_needed", "27"),
+        ("first_semester", ""),
+        ("semester_years", "{}"),
+        ("required_courses_tuple", "[]"),
+        ("selected_certificates", json.dumps(profile["certificates"])),
+        ("required_courses_dict", required_courses_dict)
+    ])
+    if profile.get("include_summer"):
+        form.add("include_summer", "on")
+    else:
+        form.add("include_summer", "False")
+    for course in profile.get("courses_taken", []):
+        form.add("courses_taken", course)
+    for course in profile.get("waived_courses", []):
+        form.add("waived_courses", course)
+    if profile.get("aleks_check"):
+        form.add("aleks_check", "on")
+    if profile.get("catalog_year"):
+        form.add("catalog_year", profile["catalog_year"])
+    if generate_complete_schedule:
+        form.add("generate_complete_schedule", "Generate Full Schedule")
+    else:
+        form.add("single_semester", "Start Schedule by Semester")
+    return form
+
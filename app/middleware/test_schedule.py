@@ -312,7 +312,7 @@ def checkData(cert, user_courses):
             print(f"\t\tChose{intersection}")
 
 
-def test_schedule(degree, user_courses_raw, certificate = ""):
+def test_schedule(degree, user_courses_raw, *certificates):
     print()
     print("#################")
     print("#### TESTING ####")
@@ -329,7 +329,7 @@ def test_schedule(degree, user_courses_raw, certificate = ""):
         check_BS_DataScience(degree, user_courses)
     else:
         print("DEGREE ERROR!")
-    if certificate:
+    for certificate in certificates:
         if certificate == "Artificial Intelligence":
             checkAI(certificate, user_courses)
         elif certificate == "Cybersecurity":
@@ -0,0 +1,417 @@
+import bisect
+import random
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from app.middleware import course_parsing
+from app.middleware.catalog import get_catalog
+from app.middleware.forecast import DEFAULT_MAX_TERMS, LIST_FIELDS, BOOL_FIELDS, INT_FIELDS, TEXT_FIELDS, \
+    parse_cohort_field, term_sort_key
+from app.middleware.plan_validation import ELECTIVE_NAME
+from app.middleware.student_profiles import build_first_semester_form, requires_summer
+
+# plans are kept in memory by the worker that generated them, like checkpoints
+PLAN_TTL_SECONDS = 30 * 60
+MAX_PLANS = 256
+
+WHAT_IF_CHANGES = ("credits", "summer", "failed", "certificate")
+# a sweep generates the plan again for every combination of options, so a request tries a handful of each
+MAX_SWEEP_OPTIONS = 6
+# the minimum Fall/Spring credits a sweep may try, the home page's choices
+MIN_SWEEP_CREDITS = 3
+MAX_SWEEP_CREDITS = 21
+
+# home page choices a profile falls back to when a request leaves them out
+DEFAULT_PROFILE = {
+    "user_name": "Student",
+    "certificates": [],
+    "current_semester": "Fall",
+    "include_summer": False,
+    "minimum_semester_credits": 15,
+    "minimum_summer_credits": 6,
+    "courses_taken": [],
+    "waived_courses": [],
+    "ge_taken": 0,
+    "fe_taken": 0,
+    "total_credits": 0,
+    "aleks_check": False
+}
+
+_plans = OrderedDict()
+_lock = threading.Lock()
+
+
+def read_profile(data: dict) -> dict:
+    """
+    reads the home page choices for a what-if plan from a JSON request.
+
+    Parameters
+    ----------
+    data:       dict
+                the choices, with the same keys as `student_profiles.random_profile`; only `degree_choice` is required
+    Returns
+    ----------
+    dict
+                a complete profile
+    """
+    if not isinstance(data, dict):
+        raise TypeError("profile must be a JSON object")
+    if "degree_choice" not in data:
+        raise KeyError("degree_choice is required")
+    profile = dict(DEFAULT_PROFILE)
+    for field, value in data.items():
+        if field in LIST_FIELDS + BOOL_FIELDS + INT_FIELDS + TEXT_FIELDS and value is not None:
+            profile[field] = parse_cohort_field(field, value)
+    if data.get("delivery_modes"):
+        profile["delivery_modes"] = "".join(data["delivery_modes"])
+    if data.get("catalog_year"):
+        profile["catalog_year"] = str(data["catalog_year"])
+    if "total_credits" not in data:
+        profile["total_credits"] = 3 * len(profile["courses_taken"])
+    if requires_summer(profile):
+        profile["include_summer"] = True
+    return profile
+
+
+def save_plan(plan: dict) -> str:
+    plan_id = uuid.uuid4().hex
+    plan["saved_at"] = time.monotonic()
+    with _lock:
+        _plans[plan_id] = plan
+        # drop the oldest plans once over capacity or expired
+        while _plans:
+            oldest = next(iter(_plans.values()))
+            if len(_plans) <= MAX_PLANS and plan["saved_at"] - oldest["saved_at"] <= PLAN_TTL_SECONDS:
+                break
+            _plans.popitem(last=False)
+    return plan_id
+
+
+def get_plan(plan_id: str) -> dict:
+    # returns None when the plan was never generated here or has expired
+    with _lock:
+        plan = _plans.get(plan_id)
+    if plan is None or time.monotonic() - plan["saved_at"] > PLAN_TTL_SECONDS:
+        return None
+    return plan
+
+
+def clear_plans() -> None:
+    with _lock:
+        _plans.clear()
+
+
+def start_state(profile: dict, seed=0, scheduler_engine="greedy") -> dict:
+    """
+    reads the scheduler state for the first semester of a profile, as `/schedule` does for the home page.
+
+    The course choices the scheduler draws at random are seeded, so the same profile and seed always
+    give the same plan.
+    """
+    form = build_first_semester_form(profile, get_catalog(profile.get("catalog_year"))["courses_json"], True)
+    for mode in profile.get("delivery_modes", ""):
+        form.add("delivery_modes", mode)
+    form.add("scheduler_engine", scheduler_engine)
+    # a generator of its own, so the request leaves the process-wide random state to other requests
+    return course_parsing.read_scheduler_state(form, rng=random.Random(f"{seed}"))
+
+
+def run_semesters(state: dict, max_terms=DEFAULT_MAX_TERMS) -> tuple:
+    """
+    generates the remaining semesters from a state, copying the state before each one.
+
+    Returns
+    ----------
+    tuple
+                the semesters, and one state per semester plus the final state, so any later
+                semester can be generated again without repeating the ones before it
+    """
+    semesters = []
+    snapshots = [course_parsing.copy_state(state)]
+    if not state["is_graduated"]:
+        for semester_info in course_parsing.semester_generator(state):
+            semesters.append(semester_info)
+            state["course_schedule"].clear()
+            snapshots.append(course_parsing.copy_state(state))
+            if len(semesters) >= max_terms:
+                break
+    return semesters, snapshots
+
+
+def generate_plan(profile: dict, seed=0, scheduler_engine="greedy") -> dict:
+    """
+    generates the full plan for a profile and caches its per-semester states for what-if changes.
+
+    Returns
+    ----------
+    dict
+                the plan, with its `plan_id`
+    """
+    if scheduler_engine not in course_parsing.SCHEDULER_ENGINES:
+        raise ValueError(f"Unknown scheduler engine: {scheduler_engine}")
+    semesters, snapshots = run_semesters(start_state(profile, seed, scheduler_engine))
+    plan = {
+        "profile": profile,
+        "seed": seed,
+        "scheduler_engine": scheduler_engine,
+        "course_schedule": semesters,
+        "snapshots": snapshots
+    }
+    plan["plan_id"] = save_plan(plan)
+    return plan
+
+
+def check_semester(plan: dict, semester_index) -> int:
+    semester_index = int(semester_index)
+    if not 0 <= semester_index < len(plan["course_schedule"]):
+        raise ValueError(f"Semester {semester_index} is not in the plan")
+    return semester_index
+
+
+def set_summer(state: dict, plan: dict, semester_index: int, include_summer: bool) -> None:
+    # turn summer semesters on or off from a semester, which changes its season if it follows a Spring or Summer
+    state["include_summer"] = include_summer
+    if semester_index == 0:
+        return
+    previous = plan["course_schedule"][semester_index - 1]["semester"]
+    current_semester = course_parsing.update_semester(previous, include_summer)
+    semester_years = plan["snapshots"][semester_index - 1]["semester_years"]
+    if current_semester == state["first_semester"]:
+        semester_years = {key: value + 1 for key, value in semester_years.items()}
+    state["current_semester"] = current_semester
+    state["semester_years"] = dict(semester_years)
+    if current_semester == "Summer":
+        state["min_credits_per_semester"] = state["summer_credit_count"]
+    else:
+        state["min_credits_per_semester"] = state["temp_min_credits_per_semester"]
+
+
+def set_credits(state: dict, minimum_semester_credits=None, minimum_summer_credits=None) -> None:
+    # the generator switches between the Fall/Spring and Summer minimums after each semester
+    if minimum_semester_credits is not None:
+        state["temp_min_credits_per_semester"] = int(minimum_semester_credits)
+        if state["current_semester"] != "Summer":
+            state["min_credits_per_semester"] = int(minimum_semester_credits)
+    if minimum_summer_credits is not None:
+        state["summer_credit_count"] = int(minimum_summer_credits)
+        if state["current_semester"] == "Summer":
+            state["min_credits_per_semester"] = int(minimum_summer_credits)
+
+
+def apply_change(plan: dict, change: dict) -> tuple:
+    """
+    finds the first semester a change affects and the scheduler state to regenerate it from.
+
+    Parameters
+    ----------
+    plan:       dict
+                the plan being changed, see `generate_plan`
+    change:     dict
+                `type` is one of:
+                    credits:        `minimum_semester_credits` and/or `minimum_summer_credits` from `from_semester`
+                    summer:         `include_summer` from `from_semester`
+                    failed:         `course` is failed in the semester it is planned in and must be taken again
+                    certificate:    `certificates` replace the plan's certificates, which changes the required courses
+    Returns
+    ----------
+    tuple
+                the first affected semester, the state to generate it from, the kept semesters, and the profile
+    """
+    if not isinstance(change, dict):
+        raise TypeError("change must be a JSON object")
+    change_type = change.get("type")
+    profile = plan["profile"]
+    if change_type == "credits":
+        semester_index = check_semester(plan, change.get("from_semester", 0))
+        state = course_parsing.copy_state(plan["snapshots"][semester_index])
+        set_credits(state, change.get("minimum_semester_credits"), change.get("minimum_summer_credits"))
+    elif change_type == "summer":
+        semester_index = check_semester(plan, change.get("from_semester", 0))
+        state = course_parsing.copy_state(plan["snapshots"][semester_index])
+        set_summer(state, plan, semester_index, bool(change["include_summer"]))
+    elif change_type == "failed":
+        course = change["course"]
+        failed_index = next((index for index, semester in enumerate(plan["course_schedule"])
+                             if any(entry["course"] == course and entry["name"] != ELECTIVE_NAME and not entry.get("failed")
+                                    for entry in semester["schedule"])), None)
+        if failed_index is None:
+            raise ValueError(f"{course} is not in the plan")
+        # the failed semester keeps its courses; the course is taken again in a later one
+        semester_index = failed_index + 1
+        state = course_parsing.copy_state(plan["snapshots"][semester_index])
+        course_entry = next(entry for entry in state["courses_dict_list_unchanged"] if entry[0] == course)
+        state["courses_taken"].remove(course)
+        state["total_credits_accumulated"] -= course_parsing.course_credits(
+            course, course_entry[1], get_catalog(state["catalog_year"])["records"])
+        bisect.insort(state["required_courses_dict_list"], tuple(course_entry), key=lambda entry: entry[1]["course_number"])
+        state["is_graduated"] = False
+        failed_semester = dict(plan["course_schedule"][failed_index])
+        failed_semester["schedule"] = [dict(entry, failed=True) if entry["course"] == course else entry
+                                       for entry in failed_semester["schedule"]]
+        kept = plan["course_schedule"][:failed_index] + [failed_semester]
+        return semester_index, state, kept, profile
+    elif change_type == "certificate":
+        # the required courses are chosen before the first semester, so the whole plan is generated again
+        profile = read_profile(dict(profile, certificates=change.get("certificates", [])))
+        semester_index = 0
+        state = start_state(profile, plan["seed"], plan["scheduler_engine"])
+    else:
+        raise ValueError(f"Unknown change: {change_type}, expected one of {', '.join(WHAT_IF_CHANGES)}")
+    return semester_index, state, plan["course_schedule"][:semester_index], profile
+
+
+def plan_summary(course_schedule: list, final_state: dict) -> dict:
+    last = course_schedule[-1] if course_schedule else None
+    return {
+        "semesters": len(course_schedule),
+        "is_graduated": final_state["is_graduated"],
+        "graduation_term": f"{last['semester']} {last['year']}" if last and final_state["is_graduated"] else None,
+        "total_credits": final_state["total_credits_accumulated"]
+    }
+
+
+def diff_plans(base: list, other: list) -> dict:
+    """
+    compares two plans semester by semester.
+
+    Returns
+    ----------
+    dict
+                first_changed_semester: the first semester whose term or courses differ, or None
+                semesters:              one entry per changed semester, with the courses added and removed
+    """
+    changes = []
+    for index in range(max(len(base), len(other))):
+        before = base[index] if index < len(base) else None
+        after = other[index] if index < len(other) else None
+        before_courses = [entry["course"] for entry in before["schedule"]] if before else []
+        after_courses = [entry["course"] for entry in after["schedule"]] if after else []
+        before_term = f"{before['semester']} {before['year']}" if before else None
+        after_term = f"{after['semester']} {after['year']}" if after else None
+        failed = [entry["course"] for entry in after["schedule"] if entry.get("failed")] if after else []
+        if before_term == after_term and before_courses == after_courses and not failed:
+            continue
+        # placeholders such as GEN ED can repeat, so count them instead of comparing sets
+        remaining = list(after_courses)
+        removed = []
+        for course in before_courses:
+            if course in remaining:
+                remaining.remove(course)
+            else:
+                removed.append(course)
+        changes.append({
+            "semester_number": index,
+            "base_term": before_term,
+            "what_if_term": after_term,
+            "added": remaining,
+            "removed": removed,
+            "failed": failed
+        })
+    return {
+        "first_changed_semester": changes[0]["semester_number"] if changes else None,
+        "semesters": changes
+    }
+
+
+def what_if(plan: dict, change: dict) -> dict:
+    """
+    applies a change to a plan, regenerating only the semesters from the first one it affects.
+
+    Parameters
+    ----------
+    plan:       dict
+                the plan being changed, see `generate_plan`
+    change:     dict
+                see `apply_change`
+    Returns
+    ----------
+    dict
+                plan_id:                    the changed plan, which can be changed again
+                base_plan_id:               the plan that was changed
+                first_affected_semester:    the first semester regenerated
+                reused_semesters:           semesters kept from the plan
+                recomputed_semesters:       semesters regenerated
+                base:                       summary of the plan
+                what_if:                    summary of the changed plan, with its `course_schedule`
+                diff:                       see `diff_plans`
+    """
+    semester_index, state, kept, profile = apply_change(plan, change)
+    semesters, snapshots = run_semesters(state, DEFAULT_MAX_TERMS - len(kept))
+    changed = {
+        "profile": profile,
+        "seed": plan["seed"],
+        "scheduler_engine": plan["scheduler_engine"],
+        "course_schedule": kept + semesters,
+        "snapshots": plan["snapshots"][:semester_index] + snapshots
+    }
+    changed["plan_id"] = save_plan(changed)
+    return {
+        "plan_id": changed["plan_id"],
+        "base_plan_id": plan.get("plan_id"),
+        "first_affected_semester": semester_index,
+        "reused_semesters": len(kept),
+        "recomputed_semesters": len(semesters),
+        "base": plan_summary(plan["course_schedule"], plan["snapshots"][-1]),
+        "what_if": dict(plan_summary(changed["course_schedule"], changed["snapshots"][-1]),
+                        course_schedule=changed["course_schedule"]),
+        "diff": diff_plans(plan["course_schedule"], changed["course_schedule"])
+    }
+
+
+def sweep(plan: dict, from_semester=0, credit_options=None, summer_options=None) -> list:
+    """
+    evaluates every combination of credit load and summer semesters from a semester of a plan.
+
+    Every combination starts from the plan's state at `from_semester`, so the semesters before it are
+    generated once, and a combination that matches the plan reuses it without generating anything.
+
+    Parameters
+    ----------
+    plan:               dict
+                        see `generate_plan`
+    from_semester:      int
+                        the first semester the combinations apply to
+    credit_options:     list
+                        at most `MAX_SWEEP_OPTIONS` minimum Fall/Spring credits to try, from `MIN_SWEEP_CREDITS`
+                        to `MAX_SWEEP_CREDITS`, defaults to the plan's
+    summer_options:     list
+                        at most `MAX_SWEEP_OPTIONS` include_summer values to try, defaults to the plan's
+    Returns
+    ----------
+    list
+                        one summary per combination, see `plan_summary`, earliest graduation first
+    """
+    for name, options in (("minimum_semester_credits", credit_options), ("include_summer", summer_options)):
+        if options is not None and not isinstance(options, list):
+            raise TypeError(f"{name} must be a list")
+        if options and len(options) > MAX_SWEEP_OPTIONS:
+            raise ValueError(f"At most {MAX_SWEEP_OPTIONS} {name} options per sweep")
+    semester_index = check_semester(plan, from_semester)
+    snapshot = plan["snapshots"][semester_index]
+    if credit_options:
+        credit_options = list(dict.fromkeys(int(option) for option in credit_options))
+        for credits in credit_options:
+            if not MIN_SWEEP_CREDITS <= credits <= MAX_SWEEP_CREDITS:
+                raise ValueError(f"minimum_semester_credits must be from {MIN_SWEEP_CREDITS} "
+                                 f"to {MAX_SWEEP_CREDITS}, not {credits}")
+    else:
+        credit_options = [snapshot["temp_min_credits_per_semester"]]
+    summer_options = summer_options if summer_options else [snapshot["include_summer"]]
+
+    results = []
+    for include_summer in dict.fromkeys(bool(option) for option in summer_options):
+        for credits in credit_options:
+            if include_summer == snapshot["include_summer"] and credits == snapshot["temp_min_credits_per_semester"]:
+                summary = plan_summary(plan["course_schedule"], plan["snapshots"][-1])
+            else:
+                state = course_parsing.copy_state(snapshot)
+                if include_summer != snapshot["include_summer"]:
+                    set_summer(state, plan, semester_index, include_summer)
+                set_credits(state, credits)
+                semesters, snapshots = run_semesters(state, DEFAULT_MAX_TERMS - semester_index)
+                summary = plan_summary(plan["course_schedule"][:semester_index] + semesters, snapshots[-1])
+            results.append(dict(summary, minimum_semester_credits=credits, include_summer=include_summer))
+    return sorted(results, key=lambda result: (not result["is_graduated"],
+                                               term_sort_key(result["graduation_term"]) if result["graduation_term"] else (),
+                                               result["semesters"], result["minimum_semester_credits"]))
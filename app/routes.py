@@ -1,10 +1,57 @@
-from flask import render_template, request, json
+import time
+from flask import render_template, request, json, jsonify, Response, abort, g
 from app import app
-from app.middleware.course_parsing import parse_courses, generate_semester
+
+# the scheduler modules are imported by the views that use them, so starting a worker or a CLI command
+# does not load them, and the catalog is only built on the first request that needs it
+
+@app.route('/healthz')
+def healthz():
+    return jsonify({"status": "ok"})
+
+@app.before_request
+def start_alloc_profile():
+    # allocations are only traced with SCHEDULER_ALLOC_PROFILE set, or for a request with the X-Alloc-Profile header
+    # when SCHEDULER_ALLOC_PROFILE_HEADER allows it
+    from app.middleware.alloc_profile import is_requested, start_profile
+    if is_requested(request.headers):
+        start_profile()
+
+@app.after_request
+def finish_alloc_profile(response):
+    from app.middleware.alloc_profile import PROFILE_HEADER, finish_profile, format_profile, profile_header
+    report = finish_profile()
+    if report is not None:
+        print(format_profile(report, request.path))
+        response.headers[PROFILE_HEADER] = profile_header(report)
+    return response
+
+@app.before_request
+def start_analytics():
+    # generations are only logged with SCHEDULER_ANALYTICS_DB set
+    from app.middleware import analytics
+    from app.middleware.alloc_profile import start_timings
+    if request.endpoint == "schedule_generator" and analytics.is_enabled():
+        start_timings()
+        g.analytics_start_time = time.perf_counter()
+
+@app.after_request
+def finish_analytics(response):
+    from app.middleware.analytics import record_generation
+    from app.middleware.alloc_profile import finish_timings
+    start_time = g.pop("analytics_start_time", None)
+    if start_time is not None:
+        timings = finish_timings()
+        # set by the view when it generated a schedule, rather than printing or uploading one
+        render_info = g.pop("render_info", None)
+        if render_info is not None:
+            record_generation(render_info, timings, (time.perf_counter() - start_time) * 1000)
+    return response
 
 @app.route('/')
 @app.route('/index')
 def index():
+    from app.middleware.catalog import get_catalog, catalog_years
     # set up defaults
     semesters = ["Fall", "Spring"]
     certificates = [
@@ -15,8 +62,12 @@ def index():
         ("Internet and Web", "WEBCERTReq")
     ]
 
-    # create a list of all courses
-    all_courses = parse_courses()
+    # create a list of all courses, from the catalog of the year the student entered
+    try:
+        catalog = get_catalog(request.args.get("catalog_year"))
+    except ValueError:
+        abort(404)
+    all_courses = catalog["courses"]
     all_courses_list = []
     for course in all_courses.items():
         prerequisite_description = ""
@@ -34,7 +85,9 @@ def index():
     return render_template('index.html',
                            initial_load=True,
                            required_courses=all_courses_list,
-                           required_courses_dict=json.dumps(all_courses),
+                           required_courses_dict=catalog["courses_json"],
+                           catalog_year=catalog["year"],
+                           catalog_years=catalog_years(),
                            json_required_courses=json.dumps(all_courses_list),
                            semesters=semesters,
                            certificates=certificates,
@@ -63,6 +116,11 @@ def index():
 
 @app.route('/schedule', methods=["POST"])
 def schedule_generator():
+    from app.middleware.course_parsing import generate_semester
+    from app.middleware.alloc_profile import phase
+    # the form carries the whole catalog as JSON, so parsing it is one of the larger allocations of a request
+    with phase("parse_form"):
+        request.form
     if request.form.get('Print'):
         course_schedule_display = json.loads(request.form["course_schedule"])
         total_credits = int(request.form["total_credits"])
@@ -74,7 +132,10 @@ def schedule_generator():
         degree_choice = str(request.form["degree_choice"])
         c = json.loads(request.form["certificate_choice"])
         user_name = request.form["user_name"]
-        if(c != ""):
+        # every selected certificate, or only the last one for schedules saved before several were kept
+        if request.form.get("certificate_choices"):
+            certificate = ", ".join(name for name, _ in json.loads(request.form["certificate_choices"]))
+        elif(c != ""):
             certificate = c[0]
         else:
             certificate = ""
@@ -98,48 +159,274 @@ def schedule_generator():
                 render_info = get_render_info_from_upload(request)
             else:
                 render_info = generate_semester(request)
-            return render_template('index.html',
-                                required_courses_dict_list=render_info["required_courses_dict_list"],
-                                required_courses_dict_list_unchanged=render_info["required_courses_dict_list_unchanged"],
-                                semesters=render_info["semesters"],
-                                total_credits=render_info["total_credits"],
-                                course_schedule=render_info["course_schedule"],
-                                course_schedule_display=render_info["course_schedule_display"],
-                                courses_taken=render_info["courses_taken"],
-                                list_of_required_courses_taken_display = render_info["list_of_required_courses_taken_display"],
-                                semester_number=render_info["semester_number"],
-                                waived_courses=render_info["waived_courses"],
-                                current_semester=render_info["current_semester"],
-                                minimum_semester_credits=render_info["minimum_semester_credits"],
-                                min_3000_course=render_info["min_3000_course"],
-                                include_summer=render_info["include_summer"],
-                                certificates=render_info["certificate_choice"],
-                                certificates_display = render_info["certificates_display"],
-                                num_3000_replaced_by_cert_core=render_info["num_3000_replaced_by_cert_core"],
-                                cert_elective_courses_still_needed=render_info["cert_elective_courses_still_needed"],
-                                TOTAL_CREDITS_FOR_CERTIFICATE_ELECTIVES=render_info["TOTAL_CREDITS_FOR_CERTIFICATE_ELECTIVES"],
-                                saved_minimum_credits_selection=render_info["saved_minimum_credits_selection"],
-                                gen_ed_credits_still_needed=render_info['gen_ed_credits_still_needed'],
-                                full_schedule_generation=render_info['full_schedule_generation'],
-                                minimum_summer_credits=render_info['minimum_summer_credits'],
-                                first_semester = render_info['first_semester'],
-                                semester_years = render_info['semester_years'],
-                                semester_years_display = render_info["semester_years_display"],
-                                course_prereqs_for = render_info['course_prereqs_for'],
-                                user_name = render_info['user_name'],
-                                ge_taken = render_info['ge_taken'],
-                                fe_taken = render_info['fe_taken'],
-                                degree_choice = render_info['degree_choice'],
-                                is_graduated = render_info['is_graduated'],
-                                required_courses_tuple = render_info['required_courses_tuple'],
-                                required_courses_tuple_display = render_info["required_courses_tuple_display"],
-                                total_elective_credits = render_info["TOTAL_CREDITS_FOR_CERTIFICATE_ELECTIVES"],
-                                render_info=json.dumps(render_info)
-            )
+            with phase("render"):
+                page = render_template('index.html',
+                                    required_courses_dict_list=render_info["required_courses_dict_list"],
+                                    required_courses_dict_list_unchanged=render_info["required_courses_dict_list_unchanged"],
+                                    semesters=render_info["semesters"],
+                                    total_credits=render_info["total_credits"],
+                                    course_schedule=render_info["course_schedule"],
+                                    course_schedule_display=render_info["course_schedule_display"],
+                                    courses_taken=render_info["courses_taken"],
+                                    list_of_required_courses_taken_display = render_info["list_of_required_courses_taken_display"],
+                                    semester_number=render_info["semester_number"],
+                                    waived_courses=render_info["waived_courses"],
+                                    current_semester=render_info["current_semester"],
+                                    minimum_semester_credits=render_info["minimum_semester_credits"],
+                                    min_3000_course=render_info["min_3000_course"],
+                                    include_summer=render_info["include_summer"],
+                                    delivery_modes=render_info.get("delivery_modes", ""),
+                                    scheduler_engine=render_info.get("scheduler_engine", ""),
+                                    scheduler_time_budget=render_info.get("scheduler_time_budget", ""),
+                                    certificates=render_info["certificate_choice"],
+                                    certificate_choices=render_info.get("certificate_choices", "[]"),
+                                    certificates_display = render_info["certificates_display"],
+                                    num_3000_replaced_by_cert_core=render_info["num_3000_replaced_by_cert_core"],
+                                    cert_elective_courses_still_needed=render_info["cert_elective_courses_still_needed"],
+                                    TOTAL_CREDITS_FOR_CERTIFICATE_ELECTIVES=render_info["TOTAL_CREDITS_FOR_CERTIFICATE_ELECTIVES"],
+                                    saved_minimum_credits_selection=render_info["saved_minimum_credits_selection"],
+                                    gen_ed_credits_still_needed=render_info['gen_ed_credits_still_needed'],
+                                    full_schedule_generation=render_info['full_schedule_generation'],
+                                    minimum_summer_credits=render_info['minimum_summer_credits'],
+                                    first_semester = render_info['first_semester'],
+                                    semester_years = render_info['semester_years'],
+                                    semester_years_display = render_info["semester_years_display"],
+                                    course_prereqs_for = render_info['course_prereqs_for'],
+                                    user_name = render_info['user_name'],
+                                    ge_taken = render_info['ge_taken'],
+                                    fe_taken = render_info['fe_taken'],
+                                    degree_choice = render_info['degree_choice'],
+                                    is_graduated = render_info['is_graduated'],
+                                    required_courses_tuple = render_info['required_courses_tuple'],
+                                    required_courses_tuple_display = render_info["required_courses_tuple_display"],
+                                    total_elective_credits = render_info["TOTAL_CREDITS_FOR_CERTIFICATE_ELECTIVES"],
+                                    checkpoint_id = render_info.get("checkpoint_id", ""),
+                                    unschedulable = render_info.get("unschedulable"),
+                                    catalog_year = render_info.get("catalog_year", ""),
+                                    render_info=json.dumps(render_info)
+                )
+            if not request.form.get('upload'):
+                # logged once the response is ready, see `finish_analytics`
+                g.render_info = render_info
+            return page
         except Exception as e:
             print(e)
             return index()
 
+@app.route('/schedule/stream', methods=["POST"])
+def schedule_stream():
+    from app.middleware.course_parsing import generate_schedule_events
+    # stream each semester as NDJSON, or as Server-Sent Events if requested
+    use_sse = request.args.get("format") == "sse" or \
+        request.accept_mimetypes.best_match(["application/x-ndjson", "text/event-stream"]) == "text/event-stream"
+    form = request.form.copy()
+
+    def generate():
+        try:
+            for event in generate_schedule_events(form):
+                if use_sse:
+                    yield f"event: {event['event']}\ndata: {json.dumps(event)}\n\n"
+                else:
+                    yield json.dumps(event) + "\n"
+        except Exception as e:
+            print(e)
+            error = {"event": "error", "message": str(e)}
+            yield f"event: error\ndata: {json.dumps(error)}\n\n" if use_sse else json.dumps(error) + "\n"
+
+    mimetype = "text/event-stream" if use_sse else "application/x-ndjson"
+    return Response(generate(), mimetype=mimetype, headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.route('/api/plan/validate', methods=["POST"])
+def plan_validate():
+    from app.middleware.catalog import get_catalog
+    from app.middleware.plan_validation import validate_plan
+    # the plan fields may be posted as JSON values or as the JSON strings held in the hidden form fields
+    data = request.get_json(silent=True) or {}
+    if not isinstance(data, dict):
+        return jsonify({"error": "the request body must be a JSON object"}), 400
+
+    def field(name, default=None):
+        value = data.get(name, default)
+        return json.loads(value) if isinstance(value, str) else value
+
+    try:
+        course_schedule = field("course_schedule")
+        if course_schedule is None:
+            return jsonify({"error": "course_schedule is required"}), 400
+        required_courses = field("required_courses")
+        if required_courses is None and "required_courses_dict_list_unchanged" in data:
+            required_courses = [course[0] for course in field("required_courses_dict_list_unchanged")]
+        result = validate_plan(course_schedule, field("courses_taken", []), get_catalog(data.get("catalog_year")),
+                               required_courses=required_courses, moves=field("moves"))
+    except (ValueError, KeyError, TypeError) as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify(result)
+
+@app.route('/api/plan/earliest-graduation', methods=["POST"])
+def plan_earliest_graduation():
+    from app.middleware.catalog import get_catalog
+    from app.middleware.critical_path import earliest_graduation
+    # lower bound on the terms left, for instant feedback while a student fills in the home page
+    data = request.get_json(silent=True) or {}
+    if not isinstance(data, dict):
+        return jsonify({"error": "the request body must be a JSON object"}), 400
+
+    def field(name, default=None):
+        value = data.get(name, default)
+        return json.loads(value) if isinstance(value, str) and name != "current_semester" else value
+
+    try:
+        required_courses = field("required_courses")
+        if required_courses is None and "required_courses_dict_list" in data:
+            required_courses = [course[0] for course in field("required_courses_dict_list")]
+        if required_courses is None:
+            return jsonify({"error": "required_courses is required"}), 400
+        credits_per_semester = field("maximum_semester_credits")
+        result = earliest_graduation(get_catalog(data.get("catalog_year")), required_courses, field("courses_taken", []),
+                                     data.get("current_semester", "Fall"), bool(field("include_summer", False)),
+                                     int(field("total_credits", 0)),
+                                     int(credits_per_semester) if credits_per_semester is not None else None,
+                                     int(field("maximum_summer_credits", 0)))
+    except (ValueError, KeyError, TypeError) as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify(result)
+
+def what_if_plan(data):
+    from app.middleware.what_if import read_profile, generate_plan, get_plan
+    # the plan to change, cached from an earlier what-if request or generated from the home page choices
+    if data.get("plan_id"):
+        return get_plan(data["plan_id"])
+    if "profile" not in data:
+        raise KeyError("plan_id or profile is required")
+    return generate_plan(read_profile(data["profile"]), data.get("seed", 0), data.get("scheduler_engine", "greedy"))
+
+@app.route('/api/plan/what-if', methods=["POST"])
+def plan_what_if():
+    from app.middleware.what_if import what_if
+    # regenerates a plan from the first semester a change affects and returns the difference
+    data = request.get_json(silent=True) or {}
+    if not isinstance(data, dict):
+        return jsonify({"error": "the request body must be a JSON object"}), 400
+    try:
+        plan = what_if_plan(data)
+        if plan is None:
+            return jsonify({"error": "plan not found or expired"}), 404
+        if not data.get("change"):
+            return jsonify({"plan_id": plan["plan_id"], "course_schedule": plan["course_schedule"]})
+        result = what_if(plan, data["change"])
+    except (ValueError, KeyError, TypeError) as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify(result)
+
+@app.route('/api/plan/what-if/sweep', methods=["POST"])
+def plan_what_if_sweep():
+    from app.middleware.what_if import sweep
+    # compares credit loads and summer semesters from one semester of a plan
+    data = request.get_json(silent=True) or {}
+    if not isinstance(data, dict):
+        return jsonify({"error": "the request body must be a JSON object"}), 400
+    try:
+        plan = what_if_plan(data)
+        if plan is None:
+            return jsonify({"error": "plan not found or expired"}), 404
+        results = sweep(plan, data.get("from_semester", 0), data.get("minimum_semester_credits"), data.get("include_summer"))
+    except (ValueError, KeyError, TypeError) as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify({"plan_id": plan["plan_id"], "results": results})
+
+@app.route('/api/courses/search')
+def courses_search():
+    from app.middleware.catalog import get_catalog
+    from app.middleware.course_search import DEFAULT_LIMIT, search_courses
+    # facets may be repeated, i.e. ?subject=CMP SCI&subject=MATH, and match any of their values
+    try:
+        limit = int(request.args.get("limit", DEFAULT_LIMIT))
+        catalog = get_catalog(request.args.get("catalog_year"))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    result = search_courses(catalog, request.args.get("q", ""),
+                            subjects=request.args.getlist("subject"),
+                            levels=request.args.getlist("level"),
+                            terms=request.args.getlist("term"),
+                            programs=request.args.getlist("certificate") + request.args.getlist("degree"),
+                            limit=limit)
+    return jsonify(result)
+
+def export_source(data):
+    from app.middleware.bulk_planner import plan_row
+    from app.middleware.catalog import get_catalog
+    from app.middleware.course_parsing import MAX_SCHEDULE_TERMS
+    from app.middleware.forecast import DEFAULT_MAX_TERMS
+    from app.middleware.plan_export import MAX_EXPORT_PROFILES, check_list
+    from app.middleware.what_if import get_plan
+    # the plans to export: posted plans, cached what-if plans, or profiles planned one at a time as the export is sent
+    if "plans" in data:
+        return check_list(data["plans"], "plans")
+    if "plan_ids" in data:
+        plans = [get_plan(plan_id) for plan_id in data["plan_ids"]]
+        return None if None in plans else plans
+    if "profiles" in data:
+        # profiles are planned on the request's thread, so a request plans a handful; cohorts go through flask plan
+        profiles = check_list(data["profiles"], "profiles")
+        if len(profiles) > MAX_EXPORT_PROFILES:
+            raise ValueError(f"At most {MAX_EXPORT_PROFILES} profiles per export, "
+                             f"plan larger cohorts with flask plan and flask export")
+        settings = {
+            "seed": data.get("seed", 0),
+            "max_terms": min(max(int(data.get("max_terms", DEFAULT_MAX_TERMS)), 1), MAX_SCHEDULE_TERMS),
+            "scheduler_engine": data.get("scheduler_engine", "greedy"),
+            "catalog_year": data.get("catalog_year"),
+            "required_courses_dict": get_catalog(data.get("catalog_year"))["courses_json"]
+        }
+        return (plan_row(number, profile, settings=settings) for number, profile in enumerate(profiles, 1))
+    if "course_schedule" in data:
+        return [{"user_name": data.get("user_name", ""), "degree_choice": data.get("degree_choice", ""),
+                 "course_schedule": data["course_schedule"]}]
+    raise KeyError("plans, plan_ids, profiles or course_schedule is required")
+
+@app.route('/api/plan/export', methods=["POST"])
+def plan_export():
+    from app.middleware.plan_export import EXPORT_MIMETYPES, PLAN_ERRORS, export_plans, normalize_plan
+    # streams plans as CSV, JSONL or iCalendar in chunks; the schedule page posts its form, other clients post JSON
+    data = request.get_json(silent=True) or request.form.to_dict()
+    if not isinstance(data, dict):
+        return jsonify({"error": "the request body must be a JSON object"}), 400
+    export_format = request.args.get("format") or data.get("format", "csv")
+    try:
+        plans = export_source(data)
+        if plans is None:
+            return jsonify({"error": "plan not found or expired"}), 404
+        # plans already at hand are checked before the response starts, so a bad one is a 400, not a cut-off export
+        if isinstance(plans, list):
+            plans = [normalize_plan(plan, index) for index, plan in enumerate(plans)]
+        chunks = export_plans(plans, export_format)
+    except PLAN_ERRORS as e:
+        return jsonify({"error": str(e)}), 400
+    headers = {"Content-Disposition": f"attachment; filename=plans.{export_format}", "X-Accel-Buffering": "no"}
+    return Response(chunks, mimetype=EXPORT_MIMETYPES[export_format], headers=headers)
+
+@app.route('/admin/analytics')
+def admin_analytics():
+    import hmac
+    import os
+    from app.middleware.analytics import ADMIN_TOKEN_ENV, ADMIN_TOKEN_HEADER, analytics_report, database_path
+    # the report is hidden unless an admin token is configured, and then needs that token
+    token = os.environ.get(ADMIN_TOKEN_ENV, "")
+    if not token or not database_path():
+        abort(404)
+    # compared as bytes, since compare_digest rejects non-ASCII strings
+    if not hmac.compare_digest(request.headers.get(ADMIN_TOKEN_HEADER, "").encode(), token.encode()):
+        return jsonify({"error": "admin token required"}), 403
+    try:
+        days = request.args.get("days")
+        report = analytics_report(database_path(), int(request.args.get("top", 10)),
+                                  int(days) if days is not None else None)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except FileNotFoundError as e:
+        return jsonify({"error": str(e)}), 404
+    return jsonify(report)
+
 def allowed_file(filename):
     return '.' in filename and \
            filename.rsplit('.', 1)[1].lower() == 'txt'
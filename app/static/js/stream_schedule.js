@@ -0,0 +1,87 @@
+// Build a semester box with the same markup as schedule_display_page.html
+function buildSemesterElement(semester) {
+    const grid_item = document.createElement("div");
+    grid_item.classList.add("grid-item");
+    grid_item.setAttribute("semesterNum", semester.semester_number);
+
+    const title = document.createElement("p");
+    title.innerHTML = "<label>Semester</label>";
+    title.append(`${semester.semester} ${semester.year}`);
+    grid_item.appendChild(title);
+
+    const credits = document.createElement("p");
+    credits.id = `semester-${semester.semester_number}-credits`;
+    credits.innerHTML = "<label>Credits</label>";
+    credits.append(`${semester.credits}`);
+    grid_item.appendChild(credits);
+
+    const ul = document.createElement("ul");
+    ul.id = `semester-${semester.semester_number}-ul`;
+    semester.schedule.forEach((course) => {
+        const li = document.createElement("li");
+        li.title = `${course.prerequisite_description || ""} ${course.description}`;
+        li.setAttribute("courseNum", course.course);
+        li.setAttribute("courseName", course.name);
+        li.setAttribute("courseCredits", course.credits);
+
+        const div = document.createElement("div");
+        div.classList.add("course-name-and-num");
+        [["course-number", course.course], ["course-name", course.name],
+         ["course-credits", `(${course.credits})`], ["course-category", course.category]].forEach(([css_class, text]) => {
+            const p = document.createElement("p");
+            p.classList.add(css_class);
+            p.textContent = text;
+            div.appendChild(p);
+        });
+        li.appendChild(div);
+        ul.appendChild(li);
+    });
+    grid_item.appendChild(ul);
+    return grid_item;
+}
+
+// Post the home page form to /schedule/stream and render each semester as soon as it arrives
+async function streamSchedule() {
+    const form = document.getElementById("form");
+    const container = document.getElementById("streamed-schedule");
+    const summary_element = document.getElementById("streamed-schedule-summary");
+    const form_data = new FormData(form);
+    form_data.append("generate_complete_schedule", "Generate Full Schedule");
+
+    container.replaceChildren();
+    summary_element.textContent = "";
+
+    const response = await fetch("/schedule/stream", { method: "POST", body: form_data });
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffered = "";
+
+    while (true) {
+        const { done, value } = await reader.read();
+        if (done) {
+            break;
+        }
+        buffered += decoder.decode(value, { stream: true });
+
+        // each complete line is one event
+        let newline_index;
+        while ((newline_index = buffered.indexOf("\n")) >= 0) {
+            const line = buffered.slice(0, newline_index).trim();
+            buffered = buffered.slice(newline_index + 1);
+            if (!line) {
+                continue;
+            }
+            const event = JSON.parse(line);
+            if (event.event === "semester") {
+                container.appendChild(buildSemesterElement(event.semester));
+            } else if (event.event === "summary") {
+                const summary = event.summary;
+                summary_element.textContent = `${summary.semesters} semesters, ` +
+                    `${summary.total_credits}/${summary.total_credits_for_graduation} credits` +
+                    (summary.is_graduated ? ", all requirements met" : "");
+            } else if (event.event === "error") {
+                summary_element.textContent = `Schedule could not be generated: ${event.message}`;
+            }
+        }
+    }
+}
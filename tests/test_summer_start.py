@@ -0,0 +1,15 @@
+import pytest
+from app.middleware import course_parsing, what_if
+
+
+@pytest.mark.parametrize("scheduler_engine", course_parsing.SCHEDULER_ENGINES)
+def test_summer_start_with_summer_terms_off(scheduler_engine):
+    # the first Summer is scheduled, then only Fall and Spring, until the student graduates
+    profile = what_if.read_profile({"degree_choice": "BSComputerScience", "current_semester": "Summer",
+                                    "include_summer": False})
+    state = what_if.start_state(profile, scheduler_engine=scheduler_engine)
+    semesters, snapshots = what_if.run_semesters(state)
+    terms = [semester["semester"] for semester in semesters]
+    assert terms[0] == "Summer"
+    assert "Summer" not in terms[1:]
+    assert snapshots[-1]["is_graduated"]